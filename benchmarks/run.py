@@ -0,0 +1,282 @@
+"""
+Benchmarks of the pyticdb query paths against a synthetic catalog.
+
+A TIC-like ``ticentries`` table is created from ``pyticdb.models.TICEntry``
+and filled with uniformly distributed sources. By default the table lives in
+a temporary SQLite database where ``q3c_radial_query`` is provided by a
+Python function behind a declination box pre-filter. Pass ``--url`` to
+benchmark a scratch PostgreSQL database with q3c installed instead, an
+existing ``ticentries`` table is never modified and is only used with
+``--reuse``.
+
+Results are written as JSON so runs of different releases can be compared
+with ``--compare``.
+
+Usage
+-----
+$ nox -s benchmarks -- --rows 1000000 --output bench.json
+$ nox -s benchmarks -- --compare bench.json --output bench_new.json
+"""
+
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+import typing
+
+import click
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+import pyticdb
+from pyticdb.models import TICEntry
+from pyticdb.query import id_statements, query_by_id, query_by_loc
+from pyticdb.schema import LazyMetaData
+
+TABLE = TICEntry.__table__
+INSERT_BATCH = 50_000
+ID_COUNTS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+RADII = (0.01, 0.1, 1.0, 5.0)
+FIELDS = ("id", "ra", "dec", "tmag")
+
+
+def _q3c_radial_query(ra, dec, ra0, dec0, radius) -> bool:
+    if ra is None or dec is None:
+        return False
+    ra, dec, ra0, dec0 = map(math.radians, (ra, dec, ra0, dec0))
+    a = (
+        math.sin((dec - dec0) / 2) ** 2
+        + math.cos(dec) * math.cos(dec0) * math.sin((ra - ra0) / 2) ** 2
+    )
+    return math.degrees(2 * math.asin(min(math.sqrt(a), 1.0))) <= radius
+
+
+def _register_q3c(dbapi_connection, connection_record):
+    dbapi_connection.create_function(
+        "q3c_radial_query", 5, _q3c_radial_query, deterministic=True
+    )
+
+
+def synthetic_rows(n_rows: int, seed: int = 0):
+    rng = random.Random(seed)
+    for id_ in range(1, n_rows + 1):
+        yield {
+            "id": id_,
+            "ra": rng.uniform(0, 360),
+            "dec": math.degrees(math.asin(rng.uniform(-1, 1))),
+            "tmag": rng.uniform(4, 20),
+            "jmag": rng.uniform(4, 20),
+            "teff": rng.uniform(3000, 10000),
+            "gaia": str(rng.getrandbits(60)),
+            "twomass": f"{rng.getrandbits(30):016d}",
+        }
+
+
+def create_catalog(engine: sa.Engine, n_rows: int, reuse: bool) -> int:
+    """
+    Create and fill the synthetic catalog, returning its row count.
+    """
+    if sa.inspect(engine).has_table(TABLE.name):
+        if not reuse:
+            raise click.UsageError(
+                f"{TABLE.name} already exists in {engine.url!r}, pass "
+                "--reuse to benchmark the existing table"
+            )
+        with engine.connect() as conn:
+            return conn.execute(
+                sa.select(sa.func.count()).select_from(TABLE)
+            ).scalar_one()
+
+    t0 = time.perf_counter()
+    TABLE.create(engine)
+    batch = []
+    with engine.begin() as conn:
+        for row in synthetic_rows(n_rows):
+            batch.append(row)
+            if len(batch) == INSERT_BATCH:
+                conn.execute(sa.insert(TABLE), batch)
+                batch = []
+        if batch:
+            conn.execute(sa.insert(TABLE), batch)
+        sa.Index(f"ix_{TABLE.name}_dec", TABLE.c.dec).create(conn)
+        if engine.dialect.name == "postgresql":
+            sa.Index(
+                f"ix_{TABLE.name}_q3c",
+                sa.func.q3c_ang2ipix(TABLE.c.ra, TABLE.c.dec),
+            ).create(conn)
+            conn.execute(sa.text(f"ANALYZE {TABLE.name}"))
+    click.echo(
+        f"Created {n_rows} rows in {time.perf_counter() - t0:.1f}s",
+        err=True,
+    )
+    return n_rows
+
+
+def box_filter(dec: float, radius: float) -> list:
+    """
+    The declination band enclosing a cone, used on SQLite so only rows
+    within the band are tested by the Python ``q3c_radial_query``.
+    """
+    return [TABLE.c.dec.between(dec - radius, dec + radius)]
+
+
+class Runner:
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results: list[dict[str, typing.Any]] = []
+
+    def time(self, name: str, func: typing.Callable, **params):
+        seconds = []
+        n_rows = None
+        for _ in range(self.repeat):
+            t0 = time.perf_counter()
+            result = func()
+            seconds.append(time.perf_counter() - t0)
+            if isinstance(result, typing.Sized):
+                n_rows = len(result)
+        entry = {
+            "name": name,
+            "params": params,
+            "rows": n_rows,
+            "seconds": seconds,
+            "min": min(seconds),
+            "median": statistics.median(seconds),
+        }
+        self.results.append(entry)
+        click.echo(
+            f"{name:<24} {json.dumps(params):<40} "
+            f"median {entry['median']:.4f}s",
+            err=True,
+        )
+
+
+def run(
+    engine: sa.Engine,
+    n_rows: int,
+    max_ids: int,
+    repeat: int,
+    seed: int,
+) -> list[dict[str, typing.Any]]:
+    sessionmaker = orm.sessionmaker(bind=engine)
+    runner = Runner(repeat)
+    rng = random.Random(seed)
+    is_postgres = engine.dialect.name == "postgresql"
+
+    for n_ids in [n for n in ID_COUNTS if n <= max_ids]:
+        ids = rng.sample(range(1, 2 * n_rows + 1), min(n_ids, 2 * n_rows))
+        runner.time(
+            "query_by_id",
+            lambda: query_by_id(
+                ids, *FIELDS, database=sessionmaker(), table=TABLE
+            ),
+            n_ids=len(ids),
+        )
+        if is_postgres and len(ids) > pyticdb.query.BULK_ID_THRESHOLD:
+            runner.time(
+                "query_by_id_chunked",
+                lambda: query_by_id(
+                    ids,
+                    *FIELDS,
+                    database=sessionmaker(),
+                    table=TABLE,
+                    bulk_threshold=None,
+                ),
+                n_ids=len(ids),
+            )
+        runner.time(
+            "id_statements",
+            lambda: list(id_statements(ids, *FIELDS, table=TABLE)),
+            n_ids=len(ids),
+        )
+
+    for radius in RADII:
+        ra, dec = rng.uniform(0, 360), rng.uniform(-60, 60)
+        filters = None if is_postgres else box_filter(dec, radius)
+        runner.time(
+            "query_by_loc",
+            lambda: query_by_loc(
+                ra,
+                dec,
+                radius,
+                *FIELDS,
+                database=sessionmaker(),
+                table=TABLE,
+                expression_filters=filters,
+            ),
+            radius=radius,
+        )
+
+    runner.time(
+        "reflect_full",
+        lambda: sa.MetaData().reflect(bind=engine),
+    )
+    runner.time(
+        "reflect_lazy_table",
+        lambda: [LazyMetaData(engine).tables[TABLE.name]],
+    )
+    return runner.results
+
+
+def compare(previous: dict, current: dict):
+    """
+    Print the ratio of median timings between two benchmark runs.
+    """
+    before = {
+        (r["name"], json.dumps(r["params"], sort_keys=True)): r["median"]
+        for r in previous["results"]
+    }
+    for r in current["results"]:
+        key = (r["name"], json.dumps(r["params"], sort_keys=True))
+        if key not in before:
+            continue
+        ratio = r["median"] / before[key] if before[key] else math.inf
+        click.echo(f"{r['name']:<24} {key[1]:<40} x{ratio:.2f}", err=True)
+
+
+@click.command()
+@click.option("--url", help="A scratch database to benchmark against.")
+@click.option("--rows", type=int, default=200_000, show_default=True)
+@click.option("--max-ids", type=int, default=1_000_000, show_default=True)
+@click.option("--repeat", type=int, default=3, show_default=True)
+@click.option("--seed", type=int, default=0, show_default=True)
+@click.option("--reuse", is_flag=True, help="Use an existing ticentries.")
+@click.option("--output", type=click.Path(dir_okay=False))
+@click.option("--compare", "previous", type=click.File())
+def main(url, rows, max_ids, repeat, seed, reuse, output, previous):
+    """Benchmark pyticdb query paths against a synthetic catalog."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if url is None:
+            url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        engine = sa.create_engine(url, poolclass=sa.pool.NullPool)
+        if engine.dialect.name == "sqlite":
+            sa.event.listen(engine, "connect", _register_q3c)
+
+        n_rows = create_catalog(engine, rows, reuse)
+        report = {
+            "meta": {
+                "pyticdb": pyticdb.__version__,
+                "sqlalchemy": sa.__version__,
+                "python": platform.python_version(),
+                "dialect": engine.dialect.name,
+                "rows": n_rows,
+                "repeat": repeat,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            },
+            "results": run(engine, n_rows, max_ids, repeat, seed),
+        }
+
+    if previous is not None:
+        compare(json.load(previous), report)
+    if output is None:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        with open(output, "w") as fout:
+            json.dump(report, fout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,18 @@ def tests(session: nox.Session):
     session.run("pytest")
 
 
+@nox.session
+def benchmarks(session: nox.Session):
+    # Arguments after "--" are passed to the benchmark runner, such as
+    # --url, --rows, --output and --compare
+    session.install(
+        ".",
+        "--extra-index-url",
+        "https://mit-kavli-institute.github.io/MIT-Kavli-PyPi/",
+    )
+    session.run("python", "benchmarks/run.py", *session.posargs)
+
+
 @nox.session
 def docs(session: nox.Session):
     # Install docs requirements
@@ -1,14 +1,32 @@
 """Top-level package for PyTICDB."""
 
 from .conn import Databases, reflected_session
-from .query import query_by_id, query_by_loc, query_raw
+from .federated import query_federated
+from .query import (
+    iter_by_id,
+    iter_by_loc,
+    iter_raw,
+    query_by_id,
+    query_by_loc,
+    query_raw,
+)
+from .scan import scan_table
+from .spatial import crossmatch, crossmatch_nearest, iter_crossmatch
 
 __all__ = [
     "Databases",
+    "crossmatch",
+    "crossmatch_nearest",
+    "iter_by_id",
+    "iter_by_loc",
+    "iter_crossmatch",
+    "iter_raw",
     "query_by_id",
     "query_by_loc",
+    "query_federated",
     "query_raw",
     "reflected_session",
+    "scan_table",
 ]
 __author__ = """William Fong"""
 __email__ = "willfong@mit.edu"
@@ -0,0 +1,307 @@
+"""
+asyncio counterparts of the query interface.
+
+Statements are built exactly as in :mod:`pyticdb.query` and executed over
+``sqlalchemy.ext.asyncio`` engines, by default using psycopg's async driver.
+Async engines pool their connections so many concurrent lookups share a
+handful of connections instead of a thread each.
+
+Requires the ``asyncio`` extra, ``pip install pyticdb[asyncio]``.
+"""
+
+import asyncio
+import typing
+from functools import wraps
+
+import configurables as conf
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+)
+from sqlalchemy.ext.asyncio import create_async_engine as _create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from pyticdb import arrays, arrow
+from pyticdb.conn import (
+    Databases,
+    TableReflectionCache,
+    _as_bool,
+    register_engine_guards,
+)
+from pyticdb.query import (
+    _CMPR,
+    BULK_ID_THRESHOLD,
+    INT_SCALAR_OR_LIST,
+    bulk_threshold_for,
+    id_statements,
+    loc_statement,
+)
+from pyticdb.schema import LazyMetaData
+
+ASYNC_POOL_CLASSES = {"null": NullPool, "queue": AsyncAdaptedQueuePool}
+RT = typing.TypeVar("RT")
+
+
+def create_async_engine(
+    url: str,
+    poolclass: str = "queue",
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_pre_ping: bool = True,
+    pool_recycle: int = -1,
+) -> AsyncEngine:
+    """
+    Create an async engine wrapped with the multiprocess guards. Unlike
+    :func:`pyticdb.conn.create_engine` connections are pooled by default.
+    """
+    try:
+        pool = ASYNC_POOL_CLASSES[poolclass]
+    except KeyError:
+        raise ValueError(
+            f"Unknown poolclass {poolclass!r}, expected one of "
+            f"{tuple(ASYNC_POOL_CLASSES)}"
+        )
+
+    if pool is NullPool:
+        engine = _create_async_engine(url, poolclass=NullPool)
+    else:
+        engine = _create_async_engine(
+            url,
+            poolclass=pool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=pool_pre_ping,
+            pool_recycle=pool_recycle,
+        )
+    register_engine_guards(engine.sync_engine)
+    return engine
+
+
+@conf.configurable()
+@conf.param("username")
+@conf.param("password")
+@conf.param("database")
+@conf.option("host", default="localhost")
+@conf.option("port", type=int, default=5432)
+@conf.option("dialect", default="postgresql+psycopg")
+@conf.option("poolclass", default="queue")
+@conf.option("pool_size", type=int, default=5)
+@conf.option("max_overflow", type=int, default=10)
+@conf.option("pool_pre_ping", type=_as_bool, default=True)
+@conf.option("pool_recycle", type=int, default=-1)
+def configured_async_engine(**configuration) -> AsyncEngine:
+    """
+    Create a guarded async engine for the specified database. Accepts the
+    same configuration as ``reflected_session`` except that connections
+    are pooled unless the section specifies ``poolclass=null``.
+    """
+    url = "{dialect}://{username}:{password}@{host}:{port}/{database}"
+    url = url.format(**configuration)
+    return create_async_engine(
+        url,
+        poolclass=configuration["poolclass"],
+        pool_size=configuration["pool_size"],
+        max_overflow=configuration["max_overflow"],
+        pool_pre_ping=configuration["pool_pre_ping"],
+        pool_recycle=configuration["pool_recycle"],
+    )
+
+
+class AsyncTableReflectionCache:
+    """
+    The async counterpart of ``TableReflectionCache``. Schemas are reflected
+    by the wrapped synchronous cache, sharing its in-memory and on-disk
+    schema caches, within a worker thread so the event loop is never
+    blocked. Queries are executed over an async engine per database.
+
+    Parameters
+    ----------
+    reflection_cache: TableReflectionCache
+        The cache used to reflect schemas, ``pyticdb.Databases`` by default.
+    """
+
+    def __init__(self, reflection_cache: TableReflectionCache = Databases):
+        self.reflection_cache = reflection_cache
+        self._cache: dict[str, tuple[LazyMetaData, async_sessionmaker]] = {}
+        # Serializes engine creation per key, created within the event loop
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def _create(self, key: str) -> tuple[LazyMetaData, async_sessionmaker]:
+        metadata, _ = self.reflection_cache.get(key)
+        engine = configured_async_engine(
+            _filepath=self.reflection_cache.configuration_path,
+            _section=key,
+        )
+        return metadata, async_sessionmaker(engine, expire_on_commit=False)
+
+    async def get(
+        self, key: str, only: typing.Optional[typing.Sequence[str]] = None
+    ) -> tuple[LazyMetaData, async_sessionmaker]:
+        """
+        Return the metadata and async sessionmaker for the configuration
+        section ``key``, reflecting the tables in ``only`` if they have not
+        been reflected yet.
+        """
+        if key not in self._cache:
+            async with self._locks.setdefault(key, asyncio.Lock()):
+                if key not in self._cache:
+                    self._cache[key] = await asyncio.to_thread(
+                        self._create, key
+                    )
+        metadata, sessionmaker = self._cache[key]
+
+        if only is not None and not set(only).issubset(
+            metadata.metadata.tables
+        ):
+            await asyncio.to_thread(metadata.reflect, only)
+        return metadata, sessionmaker
+
+    async def dispose(self, key: typing.Optional[str] = None):
+        """
+        Close the pooled connections of ``key``, or of every database if no
+        key is given. Keys which were never loaded are ignored.
+        """
+        keys = list(self._cache) if key is None else [key]
+        for k in keys:
+            self._locks.pop(k, None)
+            entry = self._cache.pop(k, None)
+            if entry is not None:
+                await entry[1].kw["bind"].dispose()
+
+
+AsyncDatabases = AsyncTableReflectionCache()
+
+
+def resolve_async_database(
+    func: typing.Callable[..., typing.Awaitable[RT]],
+) -> typing.Callable[..., typing.Awaitable[RT]]:
+    """
+    Async counterpart of :func:`pyticdb.query.resolve_database`, database
+    names are resolved through ``AsyncDatabases``.
+    """
+
+    @wraps(func)
+    async def wrapper(*args, database=None, table=None, **kwargs):
+        if database is None:
+            database = "tic_82"
+        if table is None:
+            table = "ticentries"
+
+        if isinstance(database, str):
+            only = [table] if isinstance(table, str) else None
+            meta, sessionmaker = await AsyncDatabases.get(database, only=only)
+            if isinstance(table, str):
+                table = meta.tables[table]
+            kwargs["database"] = sessionmaker()
+        else:
+            kwargs["database"] = database
+
+        kwargs["table"] = table
+        return await func(*args, **kwargs)
+
+    return wrapper
+
+
+async def aexecute_query(
+    database: AsyncSession,
+    q,
+    output: str = arrays.ROWS,
+    params: typing.Optional[dict] = None,
+):
+    """
+    Execute the statement and return its results in the requested output
+    format.
+    """
+    async with database as db:
+        result = await db.execute(q, params)
+        rows = result.fetchall()
+    if output == arrays.ROWS:
+        return list(rows)
+    if output == arrays.ARROW:
+        schema = arrow.arrow_schema(q.selected_columns)
+        return arrow.from_batches([rows], schema)
+    return arrays.batch_decoder(q.selected_columns, output)(rows)
+
+
+@resolve_async_database
+async def aquery_by_id(
+    id: INT_SCALAR_OR_LIST,
+    *fields: str,
+    database: AsyncSession,
+    table: sa.Table,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    output: str = arrays.ROWS,
+    bulk_threshold: typing.Optional[int] = BULK_ID_THRESHOLD,
+    **keyword_filters,
+):
+    """
+    Async counterpart of :func:`pyticdb.query_by_id`.
+
+    Examples
+    --------
+    >>> rows = await aquery_by_id(ids, "ra", "dec", "tmag")
+    """
+    arrays.validate_output(output)
+    statements = id_statements(
+        id,
+        *fields,
+        table=table,
+        expression_filters=expression_filters,
+        bulk_threshold=bulk_threshold_for(
+            database.sync_session, bulk_threshold
+        ),
+        **keyword_filters,
+    )
+    part_output = arrays.part_format(output)
+    parts = [
+        await aexecute_query(database, q, output=part_output, params=params)
+        for q, params, _ in statements
+    ]
+    return arrays.merge(parts, output)
+
+
+@resolve_async_database
+async def aquery_by_loc(
+    ra: float,
+    dec: float,
+    radius: float,
+    *fields: str,
+    database: AsyncSession,
+    table: sa.Table,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    output: str = arrays.ROWS,
+    **keyword_filters,
+):
+    """
+    Async counterpart of :func:`pyticdb.query_by_loc`.
+
+    Examples
+    --------
+    >>> rows = await aquery_by_loc(120.0, -45.0, 0.2, "id", "tmag")
+    """
+    arrays.validate_output(output)
+    q, params = loc_statement(
+        ra,
+        dec,
+        radius,
+        *fields,
+        table=table,
+        expression_filters=expression_filters,
+        **keyword_filters,
+    )
+    return await aexecute_query(database, q, output=output, params=params)
+
+
+@resolve_async_database
+async def aquery_raw(
+    sql, database: AsyncSession, table: sa.Table
+) -> typing.List[typing.Tuple]:
+    """
+    Async counterpart of :func:`pyticdb.query_raw`. The provided text is
+    assumed to be safe and no sanitization is performed!
+    """
+    async with database as db:
+        result = await db.execute(sa.text(sql))
+        return list(result.fetchall())
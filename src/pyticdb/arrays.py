@@ -0,0 +1,314 @@
+"""
+Columnar decoding of query results into NumPy arrays and Arrow tables.
+
+NumPy is an optional dependency of pyticdb, it is only required when one of
+the array output formats is requested. Likewise pyarrow is only required for
+the ``"arrow"`` output format, see :mod:`pyticdb.arrow`.
+"""
+
+import datetime
+import decimal
+import os
+import shutil
+import tempfile
+import typing
+
+import sqlalchemy as sa
+
+from pyticdb import arrow
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+ROWS = "rows"
+STRUCTURED = "structured"
+COLUMNS = "columns"
+ARROW = "arrow"
+OUTPUT_FORMATS = (ROWS, STRUCTURED, COLUMNS, ARROW)
+
+DEFAULT_BATCH_SIZE = 10_000
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError(
+            "Array output requires numpy. Install it with "
+            "`pip install pyticdb[numpy]`."
+        )
+
+
+def validate_output(output: str) -> str:
+    if output not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unknown output format {output!r}, expected one of "
+            f"{OUTPUT_FORMATS}"
+        )
+    if output == ARROW:
+        arrow.require_pyarrow()
+    elif output != ROWS:
+        require_numpy()
+    return output
+
+
+def column_dtype(column: sa.ColumnElement) -> "np.dtype":
+    """
+    Determine the NumPy dtype a selected column should be decoded into.
+
+    Integer columns which may contain NULL values are decoded as ``float64``
+    so that NULL can be represented as ``NaN``. Types without a well defined
+    Python counterpart (such as the results of untyped SQL functions) fall
+    back to ``object``.
+    """
+    sql_type = column.type
+    try:
+        python_type = sql_type.python_type
+    except NotImplementedError:
+        return np.dtype(object)
+
+    nullable = getattr(column, "nullable", True) and not getattr(
+        column, "primary_key", False
+    )
+
+    if python_type is bool:
+        return np.dtype(object) if nullable else np.dtype(np.bool_)
+    if issubclass(python_type, int):
+        return np.dtype(np.float64) if nullable else np.dtype(np.int64)
+    if isinstance(sql_type, sa.REAL):
+        return np.dtype(np.float32)
+    if issubclass(python_type, (float, decimal.Decimal)):
+        return np.dtype(np.float64)
+    if issubclass(python_type, datetime.datetime):
+        return np.dtype("datetime64[us]")
+    if issubclass(python_type, datetime.date):
+        return np.dtype("datetime64[D]")
+    return np.dtype(object)
+
+
+def structured_dtype(columns: typing.Iterable[sa.ColumnElement]) -> "np.dtype":
+    """
+    Build a structured dtype from selected columns, preserving their order.
+    """
+    require_numpy()
+    return np.dtype([(column.key, column_dtype(column)) for column in columns])
+
+
+def fill_structured(
+    batches: typing.Iterable[typing.Sequence[tuple]],
+    dtype: "np.dtype",
+    size_hint: typing.Optional[int] = None,
+) -> "np.ndarray":
+    """
+    Decode batches of row tuples into a single preallocated structured array.
+
+    Parameters
+    ----------
+    batches: iterable of row tuple sequences
+        Typically obtained from ``cursor.fetchmany``.
+    dtype: np.dtype
+        The structured dtype to decode into.
+    size_hint: int, optional
+        Expected upper bound of rows. If provided the array is allocated once
+        with this size, otherwise it grows geometrically.
+    """
+    if size_hint is None:
+        size_hint = DEFAULT_BATCH_SIZE
+    out = np.empty(size_hint, dtype=dtype)
+    n_rows = 0
+    for rows in batches:
+        stop = n_rows + len(rows)
+        if stop > out.shape[0]:
+            grown = np.empty(max(stop, 2 * out.shape[0]), dtype=dtype)
+            grown[:n_rows] = out[:n_rows]
+            out = grown
+        out[n_rows:stop] = rows
+        n_rows = stop
+
+    if n_rows == out.shape[0]:
+        return out
+    return out[:n_rows].copy()
+
+
+def iter_cursor(
+    cursor, batch_size: int = DEFAULT_BATCH_SIZE
+) -> typing.Generator[list[tuple], None, None]:
+    """
+    Yield raw DBAPI row batches from a cursor until exhaustion.
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def decode_result(
+    result: sa.CursorResult,
+    columns: typing.Iterable[sa.ColumnElement],
+    output: str,
+    size_hint: typing.Optional[int] = None,
+):
+    """
+    Decode an executed, non-streaming, result into the requested array
+    output format. Rows are read directly from the underlying DBAPI cursor
+    so SQLAlchemy ``Row`` objects are never constructed.
+    """
+    if output == ARROW:
+        table = arrow.from_batches(
+            iter_cursor(result.cursor), arrow.arrow_schema(columns)
+        )
+        result.close()
+        return table
+
+    array = fill_structured(
+        iter_cursor(result.cursor),
+        structured_dtype(columns),
+        size_hint=size_hint,
+    )
+    result.close()
+    return convert(array, output)
+
+
+def decode_rows(rows: typing.Sequence[sa.Row], dtype: "np.dtype", output: str):
+    """
+    Decode an already fetched batch of SQLAlchemy rows into the requested
+    array output format.
+    """
+    array = fill_structured(
+        [[tuple(row) for row in rows]], dtype, size_hint=len(rows)
+    )
+    return convert(array, output)
+
+
+def batch_decoder(
+    columns: typing.Iterable[sa.ColumnElement], output: str
+) -> typing.Callable[[typing.Sequence[sa.Row]], typing.Any]:
+    """
+    Return a function decoding fetched batches of SQLAlchemy rows into the
+    requested output format, such as the partitions of a streamed result.
+    Arrow output is decoded into record batches.
+    """
+    if output == ROWS:
+        return lambda rows: rows
+    if output == ARROW:
+        return arrow.batch_decoder(arrow.arrow_schema(columns))
+    dtype = structured_dtype(columns)
+    return lambda rows: decode_rows(rows, dtype, output)
+
+
+def empty(columns: typing.Iterable[sa.ColumnElement], output: str):
+    """
+    An empty result of the requested output format.
+    """
+    if output == ROWS:
+        return []
+    if output == ARROW:
+        return arrow.arrow_schema(columns).empty_table()
+    return convert(np.empty(0, dtype=structured_dtype(columns)), output)
+
+
+def convert(array: "np.ndarray", output: str):
+    """
+    Convert a structured array into the requested output format.
+    """
+    if output == COLUMNS:
+        return {name: array[name] for name in array.dtype.names or ()}
+    if output == ARROW:
+        return arrow.from_structured(array)
+    return array
+
+
+def part_format(output: str) -> str:
+    """
+    The format partial results should be gathered in before being merged
+    into ``output``.
+    """
+    return STRUCTURED if output == COLUMNS else output
+
+
+def merge(parts: typing.Sequence, output: str):
+    """
+    Merge partial results, gathered in ``part_format(output)``, into a
+    single result of the requested output format.
+    """
+    if output == ROWS:
+        merged = []
+        for part in parts:
+            merged.extend(part)
+        return merged
+    if output == ARROW:
+        if len(parts) == 1:
+            return parts[0]
+        return arrow.pa.concat_tables(parts)
+    if len(parts) == 1:
+        return convert(parts[0], output)
+    return convert(np.concatenate(parts), output)
+
+
+def row_count(result) -> int:
+    """
+    The number of rows in a result of any output format.
+    """
+    if isinstance(result, dict):
+        return len(next(iter(result.values()), ()))
+    if hasattr(result, "num_rows"):
+        return result.num_rows
+    return len(result)
+
+
+def to_npy(
+    batches: typing.Iterable["np.ndarray"],
+    path: typing.Union[str, os.PathLike],
+    dtype: typing.Optional["np.dtype"] = None,
+) -> int:
+    """
+    Stream structured array batches, such as those yielded by the ``iter_*``
+    functions with ``output="structured"``, into a single ``.npy`` file.
+    Batches are spooled to a temporary file next to ``path`` as they arrive
+    so only one batch is held in memory.
+
+    Parameters
+    ----------
+    batches: iterable of np.ndarray
+        Structured arrays sharing the same dtype.
+    path: str or os.PathLike
+        The ``.npy`` file to write.
+    dtype: np.dtype, optional
+        The dtype of the file, required if there may be no batches.
+
+    Returns
+    -------
+    int
+        The number of rows written.
+    """
+    require_numpy()
+    directory = os.path.dirname(os.path.abspath(path))
+    n_rows = 0
+    with tempfile.TemporaryFile(dir=directory) as body:
+        for batch in batches:
+            if dtype is None:
+                dtype = batch.dtype
+            if batch.dtype != dtype:
+                raise ValueError(
+                    f"Batch dtype {batch.dtype} does not match {dtype}"
+                )
+            if dtype.hasobject:
+                raise ValueError(
+                    f"Cannot write columns of dtype {dtype} to a .npy file"
+                )
+            body.write(batch.tobytes())
+            n_rows += len(batch)
+
+        if dtype is None:
+            raise ValueError("No batches were given and dtype is unknown")
+        header = {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": (n_rows,),
+        }
+        body.seek(0)
+        with open(path, "wb") as fout:
+            np.lib.format.write_array_header_2_0(fout, header)
+            shutil.copyfileobj(body, fout)
+    return n_rows
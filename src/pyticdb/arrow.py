@@ -0,0 +1,236 @@
+"""
+Decoding of query results into Apache Arrow record batches and streaming
+Parquet output.
+
+pyarrow is an optional dependency of pyticdb, it is only required when the
+``"arrow"`` output format is requested.
+"""
+
+import datetime
+import decimal
+import os
+import typing
+
+import sqlalchemy as sa
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+    pq = None
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError(
+            "Arrow output requires pyarrow. Install it with "
+            "`pip install pyticdb[arrow]`."
+        )
+
+
+def arrow_type(column: sa.ColumnElement) -> typing.Optional["pa.DataType"]:
+    """
+    Determine the Arrow type a selected column should be decoded into, or
+    None if the type should be inferred from the values. Unlike NumPy,
+    Arrow represents NULL natively so integer columns remain integers.
+    """
+    sql_type = column.type
+    try:
+        python_type = sql_type.python_type
+    except NotImplementedError:
+        return None
+
+    if python_type is bool:
+        return pa.bool_()
+    if issubclass(python_type, int):
+        if isinstance(sql_type, sa.SmallInteger):
+            return pa.int16()
+        if isinstance(sql_type, sa.BigInteger):
+            return pa.int64()
+        return pa.int32() if isinstance(sql_type, sa.Integer) else pa.int64()
+    if isinstance(sql_type, sa.REAL):
+        return pa.float32()
+    if issubclass(python_type, float):
+        return pa.float64()
+    if issubclass(python_type, decimal.Decimal):
+        numeric = typing.cast(sa.Numeric, sql_type)
+        if numeric.precision is None:
+            # Unbounded numerics have no fixed decimal type
+            return pa.float64()
+        return pa.decimal128(numeric.precision, numeric.scale or 0)
+    if issubclass(python_type, datetime.datetime):
+        return pa.timestamp("us")
+    if issubclass(python_type, datetime.date):
+        return pa.date32()
+    if issubclass(python_type, str):
+        return pa.string()
+    if issubclass(python_type, bytes):
+        return pa.binary()
+    return None
+
+
+def arrow_schema(
+    columns: typing.Iterable[sa.ColumnElement],
+) -> "pa.Schema":
+    """
+    Build an Arrow schema from selected columns, preserving their order.
+    Columns whose type cannot be determined are typed as null and are
+    inferred from their values when decoded.
+    """
+    require_pyarrow()
+    return pa.schema(
+        [
+            pa.field(column.key, arrow_type(column) or pa.null())
+            for column in columns
+        ]
+    )
+
+
+def record_batch(
+    rows: typing.Sequence[typing.Sequence], schema: "pa.Schema"
+) -> "pa.RecordBatch":
+    """
+    Decode a batch of row tuples into a record batch of the given schema.
+    """
+    if not rows:
+        return pa.RecordBatch.from_pylist([], schema=schema)
+    arrays = []
+    fields = []
+    for field, values in zip(schema, zip(*rows)):
+        if pa.types.is_null(field.type):
+            array = pa.array(values)
+            field = field.with_type(array.type)
+        else:
+            array = pa.array(values, type=field.type)
+        arrays.append(array)
+        fields.append(field)
+    return pa.RecordBatch.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def batch_decoder(
+    schema: "pa.Schema",
+) -> typing.Callable[[typing.Sequence[typing.Sequence]], "pa.RecordBatch"]:
+    """
+    Return a function decoding successive batches of row tuples of one
+    result into record batches. Null typed fields take the type first
+    inferred from their values, which later batches are then decoded into,
+    so the batches of a result share a single schema.
+    """
+    fields = list(schema)
+
+    def decode(rows: typing.Sequence[typing.Sequence]) -> "pa.RecordBatch":
+        batch = record_batch(rows, pa.schema(fields))
+        for i, field in enumerate(batch.schema):
+            if pa.types.is_null(fields[i].type):
+                fields[i] = field
+        return batch
+
+    return decode
+
+
+def iter_batches(
+    batches: typing.Iterable[typing.Sequence[typing.Sequence]],
+    schema: "pa.Schema",
+) -> typing.Generator["pa.RecordBatch", None, None]:
+    decode = batch_decoder(schema)
+    for rows in batches:
+        if rows:
+            yield decode(rows)
+
+
+def from_batches(
+    batches: typing.Iterable[typing.Sequence[typing.Sequence]],
+    schema: "pa.Schema",
+) -> "pa.Table":
+    """
+    Decode batches of row tuples into a single table.
+    """
+    record_batches = list(iter_batches(batches, schema))
+    if not record_batches:
+        return schema.empty_table()
+    # Leading batches may predate the inference of a null typed field
+    schema = record_batches[-1].schema
+    return pa.concat_tables(
+        [
+            pa.Table.from_batches([batch]).cast(schema)
+            for batch in record_batches
+        ]
+    )
+
+
+def from_structured(array) -> "pa.Table":
+    """
+    Convert a NumPy structured array into a table.
+    """
+    require_pyarrow()
+    return pa.Table.from_arrays(
+        [array[name] for name in array.dtype.names],
+        names=list(array.dtype.names),
+    )
+
+
+def to_parquet(
+    batches: typing.Iterable["pa.RecordBatch"],
+    path: typing.Union[str, os.PathLike],
+    schema: typing.Optional["pa.Schema"] = None,
+    **writer_options,
+) -> int:
+    """
+    Stream record batches into a Parquet file. Only one batch is held in
+    memory at a time, so combined with the ``iter_*`` query functions
+    arbitrarily large results can be written within a fixed memory budget.
+
+    Parameters
+    ----------
+    batches: iterable of pa.RecordBatch
+        For example ``iter_by_loc(..., output="arrow")``.
+    path: str or os.PathLike
+        The Parquet file to write.
+    schema: pa.Schema, optional
+        The schema of the file, such as ``arrow_schema(columns)`` of the
+        selected columns. Batches are cast to it, so null typed fields of
+        batches holding only NULLs are written as the declared type. By
+        default the schema of the first batch is used. Required if there
+        may be no batches, in which case an empty file is written.
+    **writer_options:
+        Passed to ``pyarrow.parquet.ParquetWriter``, such as
+        ``compression="zstd"``.
+
+    Returns
+    -------
+    int
+        The number of rows written.
+
+    Examples
+    --------
+    >>> batches = iter_by_loc(
+    ...     120.0, -45.0, 10.0, "id", "ra", "dec", "tmag", output="arrow"
+    ... )
+    >>> to_parquet(batches, "cone.parquet", compression="zstd")
+
+    >>> columns = [table.c.id, table.c.ra, table.c.dec, table.c.tmag]
+    >>> to_parquet(batches, "cone.parquet", schema=arrow_schema(columns))
+    """
+    require_pyarrow()
+    writer = None
+    if schema is not None:
+        writer = pq.ParquetWriter(path, schema, **writer_options)
+    n_rows = 0
+    try:
+        for batch in batches:
+            if writer is None:
+                schema = batch.schema
+                writer = pq.ParquetWriter(path, schema, **writer_options)
+            if batch.schema == schema:
+                writer.write_batch(batch)
+            else:
+                # RecordBatch.cast requires pyarrow 16
+                writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+            n_rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError("No batches were given and schema is unknown")
+    return n_rows
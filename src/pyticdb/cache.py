@@ -0,0 +1,195 @@
+"""
+In-process caching of primary key lookups.
+
+Catalogs served by pyticdb are static, so rows fetched by primary key can be
+reused for the lifetime of a process.
+"""
+
+import collections
+import threading
+import typing
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from pyticdb import arrays, arrow
+from pyticdb.conn import bound_engine
+
+# Marks ids known to have no row for a given lookup
+MISSING = object()
+
+CACHE_KEY = tuple[typing.Hashable, ...]
+
+
+class ResultCache:
+    """
+    A bounded least-recently-used cache of rows keyed by
+    (database, table, fields, filters, id).
+
+    Parameters
+    ----------
+    maxsize: int
+        The maximum number of cached ids. Once full the least recently used
+        ids are evicted.
+
+    Examples
+    --------
+    >>> cache = ResultCache(maxsize=1_000_000)
+    >>> rows = query_by_id(ids, "tmag", "ra", "dec", cache=cache)
+    >>> cache.stats()
+    {'hits': 0, 'misses': 52311, 'evictions': 0, 'size': 52311}
+    """
+
+    def __init__(self, maxsize: int = 1_000_000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: collections.OrderedDict[CACHE_KEY, typing.Any] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(
+        self, prefix: CACHE_KEY, ids: typing.Iterable[typing.Hashable]
+    ) -> tuple[dict[typing.Hashable, typing.Any], list[typing.Hashable]]:
+        """
+        Look up ids under a key prefix.
+
+        Returns
+        -------
+        tuple[dict, list]
+            The cached values by id (possibly ``MISSING``) and the ids which
+            are not cached.
+        """
+        found: dict[typing.Hashable, typing.Any] = {}
+        missing: list[typing.Hashable] = []
+        with self._lock:
+            for id_ in ids:
+                key = (*prefix, id_)
+                try:
+                    found[id_] = self._entries[key]
+                except KeyError:
+                    missing.append(id_)
+                else:
+                    self._entries.move_to_end(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(
+        self,
+        prefix: CACHE_KEY,
+        values: typing.Mapping[typing.Hashable, typing.Any],
+    ):
+        with self._lock:
+            for id_, value in values.items():
+                key = (*prefix, id_)
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+
+def cache_prefix(
+    database: Session,
+    table: sa.Table,
+    fields: typing.Sequence[str],
+    keyword_filters: dict[str, typing.Any],
+) -> typing.Optional[CACHE_KEY]:
+    """
+    The key prefix shared by all ids of a lookup, or None if the lookup
+    cannot be cached.
+    """
+    filters = tuple(sorted(keyword_filters.items()))
+    try:
+        hash(filters)
+    except TypeError:
+        return None
+    url = bound_engine(database).url.render_as_string(hide_password=True)
+    return (url, table.fullname, tuple(fields), filters)
+
+
+_ROW_TYPES: dict[tuple[str, ...], type[typing.NamedTuple]] = {}
+
+
+def row_type(fields: typing.Sequence[str]) -> type[typing.NamedTuple]:
+    """
+    The named tuple type used for rows served through a ``ResultCache``.
+    """
+    fields = tuple(fields)
+    try:
+        return _ROW_TYPES[fields]
+    except KeyError:
+        # Field names are only known at runtime
+        row_cls = collections.namedtuple(  # type: ignore[misc]
+            "Row", fields, rename=True
+        )
+        _ROW_TYPES[fields] = row_cls
+        return row_cls
+
+
+def cached_lookup(
+    cache: ResultCache,
+    prefix: CACHE_KEY,
+    ids: typing.Sequence[typing.Hashable],
+    columns: typing.Sequence[sa.ColumnElement],
+    fetch: typing.Callable[[list], typing.Iterable[typing.Sequence]],
+    output: str,
+    key_length: int = 1,
+):
+    """
+    Serve a primary key lookup through the cache, fetching only ids that
+    are not cached.
+
+    Parameters
+    ----------
+    ids: list of int
+        The unique ids requested, or key tuples for composite keys.
+    columns: sequence of ColumnElement
+        The selected columns, used to build array outputs.
+    fetch: callable
+        Given missing ids, return rows of ``(*key, *fields)``.
+    key_length: int
+        The number of key columns leading each fetched row.
+    """
+    found, missing = cache.get_many(prefix, ids)
+    if missing:
+        fetched: dict[typing.Hashable, typing.Any] = dict.fromkeys(
+            missing, MISSING
+        )
+        for row in fetch(missing):
+            key = row[0] if key_length == 1 else tuple(row[:key_length])
+            fetched[key] = tuple(row[key_length:])
+        cache.put_many(prefix, fetched)
+        found.update(fetched)
+
+    values = [found[id_] for id_ in ids if found[id_] is not MISSING]
+    if output == arrays.ROWS:
+        make_row = row_type([str(column.key) for column in columns])._make
+        return [make_row(value) for value in values]
+
+    if output == arrays.ARROW:
+        return arrow.from_batches([values], arrow.arrow_schema(columns))
+
+    array = arrays.fill_structured(
+        [values], arrays.structured_dtype(columns), size_hint=len(values)
+    )
+    return arrays.convert(array, output)
@@ -1,16 +1,482 @@
 """Console script for pyticdb."""
+import contextlib
+import csv
 import sys
+import time
+import typing
+from functools import wraps
 
 import click
 
+CSV = "csv"
+PARQUET = "parquet"
+NPY = "npy"
+FORMATS = (CSV, PARQUET, NPY)
+SUFFIXES = {".parquet": PARQUET, ".pq": PARQUET, ".npy": NPY}
+DEFAULT_FIELDS = "id,ra,dec,tmag"
 
-@click.command()
-def main(args=None):
+
+def _parse_value(value: str):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _parse_filters(filters) -> dict:
+    keyword_filters = {}
+    for expression in filters:
+        kwarg, sep, value = expression.partition("=")
+        if not sep or "__" not in kwarg:
+            raise click.BadParameter(
+                f"{expression!r} is not of the form column__operator=value",
+                param_hint="--filter",
+            )
+        keyword_filters[kwarg] = _parse_value(value)
+    return keyword_filters
+
+
+def export_options(func):
+    """
+    Options shared by the commands writing query results.
+    """
+
+    @click.option(
+        "-o",
+        "--output",
+        default="-",
+        show_default=True,
+        help="File to write, or - for stdout.",
+    )
+    @click.option(
+        "--format",
+        "fmt",
+        type=click.Choice(FORMATS),
+        help="Output format, inferred from the output suffix by default.",
+    )
+    @click.option("--batch-size", type=int, default=50_000, show_default=True)
+    @click.option("-q", "--quiet", is_flag=True, help="Hide progress.")
+    @wraps(func)
+    def wrapper(*args, output, fmt, **kwargs):
+        if fmt is None:
+            fmt = next(
+                (f for s, f in SUFFIXES.items() if output.endswith(s)), CSV
+            )
+        if fmt != CSV and output == "-":
+            raise click.UsageError(f"{fmt} output requires --output")
+        return func(*args, output=output, fmt=fmt, **kwargs)
+
+    return wrapper
+
+
+def query_options(func):
+    """
+    Options shared by the commands querying a table.
+    """
+
+    @click.option("--database", default="tic_82", show_default=True)
+    @click.option("--table", default="ticentries", show_default=True)
+    @click.option(
+        "--fields",
+        default=DEFAULT_FIELDS,
+        show_default=True,
+        help="Comma separated columns to return.",
+    )
+    @click.option(
+        "--filter",
+        "filters",
+        multiple=True,
+        help="A filter such as tmag__lt=12, may be repeated.",
+    )
+    @export_options
+    @wraps(func)
+    def wrapper(*args, fields, filters, **kwargs):
+        fields = [field.strip() for field in fields.split(",") if field]
+        return func(
+            *args,
+            fields=fields,
+            keyword_filters=_parse_filters(filters),
+            **kwargs,
+        )
+
+    return wrapper
+
+
+def output_format(fmt: str) -> str:
+    """
+    The query output format batches are requested in for a file format.
+    """
+    from pyticdb import arrays
+
+    formats = {CSV: arrays.ROWS, PARQUET: arrays.ARROW, NPY: arrays.STRUCTURED}
+    return formats[fmt]
+
+
+def progress(batches, quiet: bool):
+    """
+    Pass batches through while reporting row counts and throughput on
+    stderr.
+    """
+    t0 = time.perf_counter()
+    n_rows = 0
+
+    def report(nl: bool):
+        elapsed = time.perf_counter() - t0
+        click.echo(
+            f"\r{n_rows:,} rows in {elapsed:.1f}s "
+            f"({n_rows / max(elapsed, 1e-9):,.0f} rows/s)",
+            err=True,
+            nl=nl,
+        )
+
+    for batch in batches:
+        n_rows += len(batch)
+        if not quiet:
+            report(nl=False)
+        yield batch
+    if not quiet:
+        report(nl=True)
+
+
+def selected_columns(database, table, fields, leading=()) -> list:
+    """
+    The columns of ``table`` selected by ``fields``, after the ``leading``
+    columns, used to type files written without any batch.
+    """
+    from pyticdb.loader import resolve_table
+
+    _, table = resolve_table(database, table)
+    return [*leading, *(getattr(table.c, field) for field in fields)]
+
+
+def write_batches(
+    batches, output: str, fmt: str, header=None, columns=None
+) -> int:
+    """
+    Stream batches, in the query output format of ``fmt``, to ``output``.
+    CSV headers default to the fields of the first row. Parquet and npy
+    files are typed by the selected ``columns`` if given, so an empty file
+    is written when there are no batches.
+    """
+    if fmt == PARQUET:
+        from pyticdb.arrow import arrow_schema, to_parquet
+
+        schema = None if columns is None else arrow_schema(columns)
+        return to_parquet(batches, output, schema=schema)
+    if fmt == NPY:
+        from pyticdb.arrays import structured_dtype, to_npy
+
+        dtype = None if columns is None else structured_dtype(columns)
+        return to_npy(batches, output, dtype=dtype)
+
+    n_rows = 0
+    if output == "-":
+        stream: typing.ContextManager[typing.TextIO] = contextlib.nullcontext(
+            sys.stdout
+        )
+    else:
+        stream = open(output, "w", newline="")
+    with stream as fout:
+        writer = csv.writer(fout)
+        if header is not None:
+            writer.writerow(header)
+        for batch in batches:
+            if header is None and batch:
+                header = batch[0]._fields
+                writer.writerow(header)
+            writer.writerows(batch)
+            n_rows += len(batch)
+    return n_rows
+
+
+def export(batches, header, output, fmt, batch_size, quiet, columns=None):
+    write_batches(
+        progress(batches, quiet), output, fmt, header=header, columns=columns
+    )
+
+
+@click.group()
+def main():
     """Console script for pyticdb."""
-    click.echo(
-        "Replace this message by putting your code into " "pyticdb.cli.main"
+
+
+@main.command()
+@click.argument("ids", type=click.File(), default="-")
+@query_options
+def ids(ids, database, table, fields, keyword_filters, **options):
+    """
+    Query rows by primary key. IDS is a file, or - for stdin, of whitespace
+    separated ids.
+    """
+    from pyticdb.query import iter_by_id
+
+    values = [int(token) for line in ids for token in line.split()]
+    batches = iter_by_id(
+        values,
+        *fields,
+        database=database,
+        table=table,
+        batch_size=options["batch_size"],
+        output=output_format(options["fmt"]),
+        **keyword_filters,
+    )
+    columns = selected_columns(database, table, fields)
+    export(batches, fields, columns=columns, **options)
+
+
+@main.command()
+@click.argument("ra", type=float)
+@click.argument("dec", type=float)
+@click.argument("radius", type=float)
+@query_options
+def cone(ra, dec, radius, database, table, fields, keyword_filters, **options):
+    """
+    Query rows within RADIUS degrees of RA and DEC.
+    """
+    from pyticdb.query import iter_by_loc
+
+    batches = iter_by_loc(
+        ra,
+        dec,
+        radius,
+        *fields,
+        database=database,
+        table=table,
+        batch_size=options["batch_size"],
+        output=output_format(options["fmt"]),
+        **keyword_filters,
+    )
+    columns = selected_columns(database, table, fields)
+    export(batches, fields, columns=columns, **options)
+
+
+@main.command()
+@click.argument("targets", type=click.File(), default="-")
+@click.option("--radius", type=float, help="Match radius in degrees.")
+@click.option("--ra-column", default="ra", show_default=True)
+@click.option("--dec-column", default="dec", show_default=True)
+@click.option(
+    "--radius-column",
+    help="Column of per target radii, used instead of --radius.",
+)
+@query_options
+def crossmatch(
+    targets,
+    radius,
+    ra_column,
+    dec_column,
+    radius_column,
+    database,
+    table,
+    fields,
+    keyword_filters,
+    **options,
+):
+    """
+    Match catalog rows to the positions of the TARGETS CSV file, or - for
+    stdin. Rows are prefixed by the zero based index of their target.
+    """
+    from pyticdb.spatial import TARGET_INDEX, index_column, iter_crossmatch
+
+    if (radius is None) == (radius_column is None):
+        raise click.UsageError("Pass one of --radius or --radius-column")
+    ras, decs, radii = [], [], []
+    for row in csv.DictReader(targets):
+        ras.append(float(row[ra_column]))
+        decs.append(float(row[dec_column]))
+        if radius_column is not None:
+            radii.append(float(row[radius_column]))
+
+    batches = iter_crossmatch(
+        ras,
+        decs,
+        radius if radius_column is None else radii,
+        *fields,
+        database=database,
+        table=table,
+        batch_size=options["batch_size"],
+        output=output_format(options["fmt"]),
+        **keyword_filters,
+    )
+    columns = selected_columns(
+        database, table, fields, leading=[index_column()]
+    )
+    export(batches, [TARGET_INDEX, *fields], columns=columns, **options)
+
+
+@main.command()
+@click.argument("directory", type=click.Path(file_okay=False))
+@click.option("--database", default="tic_82", show_default=True)
+@click.option("--table", default="ticentries", show_default=True)
+@click.option("--fields", default=DEFAULT_FIELDS, show_default=True)
+@click.option("--filter", "filters", multiple=True)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(FORMATS),
+    default=PARQUET,
+    show_default=True,
+)
+@click.option(
+    "--tile-size",
+    type=float,
+    default=5.0,
+    show_default=True,
+    help="Approximate side of each tile in degrees.",
+)
+@click.option("--workers", type=int, default=4, show_default=True)
+@click.option("--retries", type=int, default=2, show_default=True)
+@click.option(
+    "--no-spatial-index",
+    is_flag=True,
+    help="Select tiles by ra and dec ranges only, for tables without Q3C.",
+)
+@click.option("-q", "--quiet", is_flag=True, help="Hide progress.")
+def extract(
+    directory,
+    database,
+    table,
+    fields,
+    filters,
+    fmt,
+    tile_size,
+    workers,
+    retries,
+    no_spatial_index,
+    quiet,
+):
+    """
+    Extract the whole sky tile by tile into one file per tile in DIRECTORY.
+    Completed tiles are recorded in DIRECTORY so an interrupted extraction
+    resumes where it stopped when run again.
+    """
+    import os
+
+    from pyticdb.extract import ExtractionError, extract_tiles
+
+    os.makedirs(directory, exist_ok=True)
+    fields = [field.strip() for field in fields.split(",") if field]
+    tiles = extract_tiles(
+        *fields,
+        database=database,
+        table=table,
+        tile_size=tile_size,
+        output=output_format(fmt),
+        workers=workers,
+        checkpoint=os.path.join(directory, "checkpoint.jsonl"),
+        retries=retries,
+        spatial_index=not no_spatial_index,
+        **_parse_filters(filters),
+    )
+    columns = selected_columns(database, table, fields)
+    n_rows = 0
+    try:
+        for tile, result in tiles:
+            name = f"dec{tile.dec_min:+08.3f}_ra{tile.ra_min:07.3f}.{fmt}"
+            batches = result.to_batches() if fmt == PARQUET else [result]
+            n_rows += write_batches(
+                batches,
+                os.path.join(directory, name),
+                fmt,
+                header=fields,
+                columns=columns,
+            )
+            if not quiet:
+                click.echo(f"\r{n_rows:,} rows", err=True, nl=False)
+    except ExtractionError as e:
+        raise click.ClickException(
+            f"{e}. Run the command again to retry the failed tiles."
+        )
+    finally:
+        if not quiet:
+            click.echo(err=True)
+
+
+@main.command()
+@click.argument("sql")
+@click.option("--database", default="tic_82", show_default=True)
+@export_options
+def raw(sql, database, output, fmt, batch_size, quiet):
+    """
+    Execute the SQL text, or - to read it from stdin. The text is not
+    sanitized in any way.
+    """
+    from pyticdb.query import iter_raw
+
+    if sql == "-":
+        sql = sys.stdin.read()
+    if fmt == NPY:
+        raise click.UsageError("Raw query results cannot be written as npy")
+
+    batches = iter_raw(sql, database=database, batch_size=batch_size)
+    if fmt == PARQUET:
+        from pyticdb import arrow
+
+        def to_arrow(batches):
+            # Result columns are untyped, Arrow types are inferred
+            decode = None
+            for batch in batches:
+                if decode is None:
+                    names = batch[0]._fields
+                    schema = arrow.pa.schema(
+                        [(n, arrow.pa.null()) for n in names]
+                    )
+                    decode = arrow.batch_decoder(schema)
+                yield decode(batch)
+
+        batches = to_arrow(batches)
+    export(batches, None, output, fmt, batch_size, quiet)
+
+
+@main.command()
+@click.option("--database", default="tic_82", show_default=True)
+@click.option("--table", default="ticentries", show_default=True)
+def schema(database, table):
+    """
+    Print the reflected columns of a table.
+    """
+    from pyticdb.conn import Databases
+
+    meta, _ = Databases.get(database, only=[table])
+    writer = csv.writer(sys.stdout, delimiter="\t")
+    writer.writerow(["column", "type", "nullable", "primary_key"])
+    for column in meta.tables[table].columns:
+        writer.writerow(
+            [column.name, column.type, column.nullable, column.primary_key]
+        )
+
+
+@main.command()
+@click.argument("path", type=click.Path(file_okay=False))
+@click.argument("fields", nargs=-1)
+@click.option("--database", default="tic_82", show_default=True)
+@click.option("--table", default="ticentries", show_default=True)
+@click.option(
+    "--zone-height",
+    type=float,
+    default=0.1,
+    show_default=True,
+    help="Height, in degrees, of the declination zones of the index.",
+)
+@click.option("--batch-size", type=int, default=10_000, show_default=True)
+def snapshot(path, fields, database, table, zone_height, batch_size):
+    """
+    Export FIELDS of a table to a local snapshot at PATH. The primary key,
+    ra and dec are always exported.
+    """
+    from pyticdb.snapshot import export_snapshot
+
+    result = export_snapshot(
+        path,
+        *fields,
+        database=database,
+        table=table,
+        zone_height=zone_height,
+        batch_size=batch_size,
     )
-    click.echo("See click documentation at https://click.palletsprojects.com/")
+    click.echo(f"Exported {len(result)} rows to {result.path}")
     return 0
 
 
@@ -1,16 +1,24 @@
 import os
 import pathlib
+import time
 import typing
+from functools import partial
 
 import configurables as conf
 import sqlalchemy as sa
 from loguru import logger
 from sqlalchemy import MetaData, orm
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool
+
+from pyticdb import instrument
+from pyticdb.schema import COMPLETE_SCHEMA, LazyMetaData, SchemaCache
 
 CONFIG_DIR = pathlib.Path.home() / ".config" / "tic"
 CONFIG_NAME = "db.conf"
 CONFIG_PATH = CONFIG_DIR / CONFIG_NAME
+SCHEMA_CACHE_DIR = CONFIG_DIR / "schema_cache"
+
+POOL_CLASSES = {"null": NullPool, "queue": QueuePool}
 
 
 class TableReflectionCache:
@@ -19,27 +27,140 @@ class TableReflectionCache:
     Reflected schemas are served by request and then cached within a simple
     dictionary.
 
+    Tables are reflected lazily as they are accessed. Reflected schemas are
+    additionally persisted to ``schema_cache_dir`` so that new processes can
+    skip reflection as long as the remote schema fingerprint is unchanged.
+    Pass ``schema_cache_dir=None`` to disable the on-disk cache.
+
     If more control is needed then this class may be modified or switched
     to dedicated caching libraries.
     """
 
-    def __init__(self, configuration_path: typing.Optional[pathlib.Path] = CONFIG_PATH):
+    def __init__(
+        self,
+        configuration_path: typing.Optional[pathlib.Path] = CONFIG_PATH,
+        schema_cache_dir: typing.Optional[pathlib.Path] = SCHEMA_CACHE_DIR,
+        schema_cache_ttl: typing.Optional[float] = None,
+    ):
         self.configuration_path = configuration_path
-        self._cache: dict[str, tuple[sa.MetaData, orm.sessionmaker]] = {}
+        self._cache: dict[str, tuple[LazyMetaData, orm.sessionmaker]] = {}
+        self.schema_cache = (
+            None
+            if schema_cache_dir is None
+            else SchemaCache(schema_cache_dir, ttl=schema_cache_ttl)
+        )
 
-    def __setitem__(self, key: str, value: tuple[sa.MetaData, orm.sessionmaker]):
+    def __setitem__(
+        self, key: str, value: tuple[LazyMetaData, orm.sessionmaker]
+    ):
         self._cache[key] = value
 
     def __getitem__(self, key: str):
+        return self.get(key)
+
+    def _schema_cache_name(self, key: str) -> str:
+        return f"{self.configuration_path}:{key}"
+
+    def get(
+        self, key: str, only: typing.Optional[typing.Sequence[str]] = None
+    ) -> tuple[LazyMetaData, orm.sessionmaker]:
+        """
+        Return the metadata and sessionmaker for the configuration section
+        ``key``.
+
+        Tables are reflected lazily, the first time they are accessed via
+        ``metadata.tables[name]``, and added to the cached metadata.
+
+        Parameters
+        ----------
+        key: str
+            The configuration section of the database.
+        only: sequence of str, optional
+            Tables to reflect eagerly.
+        """
         try:
-            return self._cache[key]
+            metadata, sessionmaker = self._cache[key]
         except KeyError:
-            metadata, sessionmaker = reflected_session(
+            engine = configured_engine(
                 _filepath=self.configuration_path,
                 _section=key,
             )
+            metadata = self._load_schema(key, engine)
+            sessionmaker = orm.sessionmaker(bind=engine)
             self[key] = metadata, sessionmaker
-            return metadata, sessionmaker
+
+        if only is not None:
+            metadata.reflect(only=only)
+        return metadata, sessionmaker
+
+    def _load_schema(self, key: str, engine: sa.Engine) -> LazyMetaData:
+        t0 = time.perf_counter()
+        cached = None
+        if self.schema_cache is not None:
+            cached = self.schema_cache.load(
+                self._schema_cache_name(key), engine, only=[]
+            )
+
+        metadata = LazyMetaData(
+            engine,
+            metadata=cached,
+            complete=cached is not None and cached.info[COMPLETE_SCHEMA],
+            on_reflect=partial(self._save_schema, key),
+        )
+        instrument.record(instrument.REFLECT, time.perf_counter() - t0)
+        if cached is not None:
+            logger.debug(
+                f"Loaded cached schema of {key} in "
+                f"{time.perf_counter() - t0:.3f}s"
+            )
+        return metadata
+
+    def _save_schema(self, key: str, metadata: LazyMetaData):
+        if self.schema_cache is None:
+            return
+        try:
+            self.schema_cache.save(
+                self._schema_cache_name(key),
+                metadata.engine,
+                metadata.metadata,
+                metadata.complete,
+            )
+        except OSError as e:
+            logger.warning(f"Unable to write schema cache for {key}: {e}")
+
+    def reflection_times(self) -> dict[str, float]:
+        """
+        Return the total seconds spent reflecting each cached database.
+        """
+        return {
+            key: metadata.reflection_time
+            for key, (metadata, _) in self._cache.items()
+        }
+
+    def invalidate(self, key: typing.Optional[str] = None):
+        """
+        Forget the reflected schema of ``key``, or of every database if no
+        key is given, both in memory and on disk.
+        """
+        keys = list(self._cache) if key is None else [key]
+        for k in keys:
+            self._cache.pop(k, None)
+        if self.schema_cache is None:
+            return
+        if key is None:
+            self.schema_cache.invalidate()
+        else:
+            self.schema_cache.invalidate(self._schema_cache_name(key))
+
+    def dispose_after_fork(self):
+        """
+        Discard, without closing, all pooled connections of every cached
+        database. Call this within a freshly forked child process (such as
+        a multiprocessing pool initializer) so the child never touches
+        connections owned by its parent.
+        """
+        for _, sessionmaker in self._cache.values():
+            dispose_after_fork(sessionmaker.kw["bind"])
 
 
 Databases = TableReflectionCache()
@@ -84,6 +205,79 @@ def register_engine_guards(engine: sa.Engine) -> sa.Engine:
     return engine
 
 
+def dispose_after_fork(engine: sa.Engine) -> sa.Engine:
+    """
+    Replace the engine's connection pool without closing the connections it
+    holds, as they belong to the parent process. The pid guards in
+    ``_checkout`` remain as a fallback should this hook not be called.
+    """
+    engine.dispose(close=False)
+    return engine
+
+
+def bound_engine(database: orm.Session) -> sa.Engine:
+    """
+    The engine a session is bound to, including sessions bound to one of
+    its connections.
+    """
+    bind = database.get_bind()
+    return bind if isinstance(bind, sa.Engine) else bind.engine
+
+
+def _as_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def create_engine(
+    url: str,
+    poolclass: str = "null",
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_pre_ping: bool = True,
+    pool_recycle: int = -1,
+) -> sa.Engine:
+    """
+    Create an engine wrapped with the multiprocess guards. By default
+    connections are not pooled, with ``poolclass="queue"`` connections are
+    kept open and reused between sessions.
+    """
+    try:
+        pool = POOL_CLASSES[poolclass]
+    except KeyError:
+        raise ValueError(
+            f"Unknown poolclass {poolclass!r}, expected one of "
+            f"{tuple(POOL_CLASSES)}"
+        )
+
+    if pool is NullPool:
+        engine = sa.create_engine(url, poolclass=NullPool)
+    else:
+        engine = sa.create_engine(
+            url,
+            poolclass=pool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=pool_pre_ping,
+            pool_recycle=pool_recycle,
+        )
+    return register_engine_guards(engine)
+
+
+def _engine_from_configuration(configuration: dict) -> sa.Engine:
+    url = "{dialect}://{username}:{password}@{host}:{port}/{database}"
+    url = url.format(**configuration)
+    return create_engine(
+        url,
+        poolclass=configuration["poolclass"],
+        pool_size=configuration["pool_size"],
+        max_overflow=configuration["max_overflow"],
+        pool_pre_ping=configuration["pool_pre_ping"],
+        pool_recycle=configuration["pool_recycle"],
+    )
+
+
 @conf.configurable()
 @conf.param("username")
 @conf.param("password")
@@ -91,6 +285,31 @@ def register_engine_guards(engine: sa.Engine) -> sa.Engine:
 @conf.option("host", default="localhost")
 @conf.option("port", type=int, default=5432)
 @conf.option("dialect", default="postgresql+psycopg")
+@conf.option("poolclass", default="null")
+@conf.option("pool_size", type=int, default=5)
+@conf.option("max_overflow", type=int, default=10)
+@conf.option("pool_pre_ping", type=_as_bool, default=True)
+@conf.option("pool_recycle", type=int, default=-1)
+def configured_engine(**configuration) -> sa.Engine:
+    """
+    Create a guarded engine for the specified database without reflecting
+    its schema. Accepts the same configuration as ``reflected_session``.
+    """
+    return _engine_from_configuration(configuration)
+
+
+@conf.configurable()
+@conf.param("username")
+@conf.param("password")
+@conf.param("database")
+@conf.option("host", default="localhost")
+@conf.option("port", type=int, default=5432)
+@conf.option("dialect", default="postgresql+psycopg")
+@conf.option("poolclass", default="null")
+@conf.option("pool_size", type=int, default=5)
+@conf.option("max_overflow", type=int, default=10)
+@conf.option("pool_pre_ping", type=_as_bool, default=True)
+@conf.option("pool_recycle", type=int, default=-1)
 def reflected_session(**configuration) -> tuple[sa.MetaData, orm.sessionmaker]:
     """
     Reflect the specified database. The configuration header has been left
@@ -99,6 +318,12 @@ def reflected_session(**configuration) -> tuple[sa.MetaData, orm.sessionmaker]:
 
     This function also allows non-postgresql dialects to be used.
 
+    Connections are not pooled unless the section specifies
+    ``poolclass=queue``, in which case ``pool_size``, ``max_overflow``,
+    ``pool_pre_ping`` and ``pool_recycle`` are also read from the section.
+    Pooled engines remain guarded against use across forks, but children
+    should call ``Databases.dispose_after_fork()`` after forking.
+
     Returns
     -------
     tuple[MetaData, sessionmaker]
@@ -117,9 +342,7 @@ def reflected_session(**configuration) -> tuple[sa.MetaData, orm.sessionmaker]:
     >>>     table = meta.tables["some_table"]
     >>>     print(db.query(table.c.some_column).all())
     """
-    url = "{dialect}://{username}:{password}@{host}:{port}/{database}"
-    url = url.format(**configuration)
-    engine = register_engine_guards(sa.create_engine(url, poolclass=NullPool))
+    engine = _engine_from_configuration(configuration)
     reflected_metadata = MetaData()
     reflected_metadata.reflect(bind=engine)  # Load the remote schema
 
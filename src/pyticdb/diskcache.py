@@ -0,0 +1,298 @@
+"""
+Persistent caching of query results shared across processes.
+
+Catalogs served by pyticdb are static, so pipelines re-running the same
+statements across restarts, or across the worker processes of a node, can
+reuse results fetched once. A :class:`DiskCache` stores results in a SQLite
+database within a directory, keyed by a hash of the database URL, the
+compiled statement, its bound parameters and the requested output format.
+
+SQLite in write-ahead logging mode lets many processes read concurrently
+while writes are serialized by its file locks. Rows are stored as pickled
+tuples, array outputs as pickled NumPy arrays and Arrow tables in the Arrow
+IPC format. Once the stored results exceed ``max_bytes`` the least recently
+used are evicted.
+"""
+
+import functools
+import hashlib
+import os
+import pathlib
+import pickle
+import sqlite3
+import threading
+import time
+import typing
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from pyticdb import arrays, arrow
+from pyticdb.cache import row_type
+from pyticdb.conn import CONFIG_DIR, bound_engine
+
+DEFAULT_DIRECTORY = CONFIG_DIR / "result_cache"
+DEFAULT_MAX_BYTES = 1 << 30
+
+ROWS_FORMAT = "rows"
+PICKLE_FORMAT = "pickle"
+ARROW_FORMAT = "arrow"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    format TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+)
+"""
+
+
+def dumps(result) -> tuple[str, bytes]:
+    """
+    Serialize a query result, returning its storage format and payload.
+    """
+    if isinstance(result, list):
+        fields = getattr(result[0], "_fields", ()) if result else ()
+        rows = [tuple(row) for row in result]
+        return ROWS_FORMAT, pickle.dumps((tuple(fields), rows), protocol=5)
+    if arrow.pa is not None and isinstance(result, arrow.pa.Table):
+        sink = arrow.pa.BufferOutputStream()
+        with arrow.pa.ipc.new_stream(sink, result.schema) as writer:
+            writer.write_table(result)
+        return ARROW_FORMAT, sink.getvalue().to_pybytes()
+    return PICKLE_FORMAT, pickle.dumps(result, protocol=5)
+
+
+def loads(fmt: str, value: bytes):
+    """
+    Deserialize a query result stored by :func:`dumps`. Rows with field
+    names are returned as named tuples.
+    """
+    if fmt == ROWS_FORMAT:
+        fields, rows = pickle.loads(value)
+        if not fields:
+            return rows
+        make_row = row_type(fields)._make
+        return [make_row(row) for row in rows]
+    if fmt == ARROW_FORMAT:
+        arrow.require_pyarrow()
+        return arrow.pa.ipc.open_stream(value).read_all()
+    return pickle.loads(value)
+
+
+class DiskCache:
+    """
+    A size bounded, least-recently-used cache of query results persisted in
+    a directory and shared by every process using it.
+
+    Parameters
+    ----------
+    directory: pathlib.Path
+        Where the cache database is written, created if needed.
+    max_bytes: int
+        The maximum total size of stored results. Once exceeded the least
+        recently used results are evicted. Results larger than this are
+        never stored.
+    timeout: float
+        Seconds to wait for other processes holding the cache locked.
+
+    Examples
+    --------
+    >>> cache = DiskCache(max_bytes=10 * 2**30)
+    >>> rows = query_by_loc(ra, dec, 0.5, "id", "tmag", disk_cache=cache)
+    >>> cache.stats()
+    {'hits': 0, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': 20713}
+    """
+
+    def __init__(
+        self,
+        directory: pathlib.Path = DEFAULT_DIRECTORY,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        timeout: float = 60.0,
+    ):
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connection: typing.Optional[sqlite3.Connection] = None
+        self._pid: typing.Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Connections are opened again by each process
+        state = self.__dict__.copy()
+        state["_connection"] = state["_pid"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self.directory / "results.sqlite"
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(SCHEMA)
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_accessed "
+                "ON results (accessed)"
+            )
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def key(
+        self,
+        database: Session,
+        q,
+        output: str = arrays.ROWS,
+        params: typing.Optional[dict] = None,
+    ) -> str:
+        """
+        The cache key of a statement executed against a database.
+        """
+        engine = bound_engine(database)
+        compiled = q.compile(dialect=engine.dialect)
+        parameters = {**compiled.params, **(params or {})}
+        digest = hashlib.sha256()
+        for part in (
+            engine.url.render_as_string(hide_password=True),
+            str(compiled),
+            repr(sorted(parameters.items())),
+            output,
+        ):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """
+        Return the result cached under ``key``, or None.
+        """
+        with self._lock:
+            connection = self._connect()
+            entry = connection.execute(
+                "SELECT format, value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if entry is None:
+                self.misses += 1
+                return None
+            connection.execute(
+                "UPDATE results SET accessed = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self.hits += 1
+        return loads(*entry)
+
+    def put(self, key: str, result):
+        """
+        Store a result under ``key``, evicting the least recently used
+        results if the cache grows above ``max_bytes``.
+        """
+        fmt, value = dumps(result)
+        if len(value) > self.max_bytes:
+            logger.debug(
+                f"Not caching a {len(value)} byte result above max_bytes"
+            )
+            return
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                    (key, fmt, value, len(value), time.time()),
+                )
+                self._evict(connection)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _evict(self, connection: sqlite3.Connection):
+        (total,) = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in connection.execute(
+            "SELECT key, size FROM results ORDER BY accessed"
+        ):
+            evicted.append((key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def execute(
+        self,
+        execute: typing.Callable,
+        database: Session,
+        q,
+        output: str = arrays.ROWS,
+        size_hint: typing.Optional[int] = None,
+        params: typing.Optional[dict] = None,
+    ):
+        """
+        Serve a statement from the cache, running it with ``execute``, such
+        as :func:`pyticdb.query.execute_query`, only if it is not cached.
+        """
+        key = self.key(database, q, output=output, params=params)
+        result = self.get(key)
+        if result is None:
+            result = execute(
+                database, q, output=output, size_hint=size_hint, params=params
+            )
+            self.put(key, result)
+        return result
+
+    def wrap(self, execute: typing.Callable) -> typing.Callable:
+        """
+        Wrap an execute function so its statements are served through the
+        cache. The wrapper may be sent to process pools.
+        """
+        return functools.partial(self.execute, execute)
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM results")
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, int]:
+        """
+        Counters of this process along with the number and total size of
+        results stored by all processes.
+        """
+        with self._lock:
+            entries, size = (
+                self._connect()
+                .execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+                )
+                .fetchone()
+            )
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
@@ -0,0 +1,328 @@
+"""
+Parallel extraction of large regions of the sky, split into tiles.
+
+The sky is partitioned into ra/dec boxes of roughly equal area. Each tile
+is extracted by its own statement, which selects the rows inside the box
+using exact range predicates. On catalogs indexed by Q3C a
+``q3c_radial_query`` circumscribing the tile is added so every tile is
+answered from the spatial index rather than by scanning the table.
+
+Tiles are executed concurrently and their results are yielded as they
+complete. Completed tiles may be recorded in a checkpoint file so an
+interrupted or partially failed extraction only re-runs the missing tiles.
+"""
+
+import dataclasses
+import json
+import math
+import os
+import typing
+from functools import partial
+
+import sqlalchemy as sa
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from pyticdb import arrays, instrument, parallel
+from pyticdb.query import (
+    _CMPR,
+    DEFAULT_RETRIES,
+    apply_filters,
+    execute_retrying,
+    resolve_database,
+)
+
+DEFAULT_TILE_SIZE = 5.0
+
+
+@dataclasses.dataclass(frozen=True)
+class Tile:
+    """
+    A box of the sky bounded by declination and right ascension, in degrees.
+    Upper bounds are exclusive except at dec 90 and ra 360, so the tiles of
+    :func:`sky_tiles` assign every position to exactly one tile.
+    """
+
+    dec_min: float
+    dec_max: float
+    ra_min: float
+    ra_max: float
+
+    @property
+    def key(self) -> tuple[float, float, float, float]:
+        return (self.dec_min, self.dec_max, self.ra_min, self.ra_max)
+
+    def predicates(self, table: sa.Table) -> list[_CMPR]:
+        """
+        The range predicates selecting rows of ``table`` inside the tile.
+        """
+        dec_upper = (
+            table.c.dec <= self.dec_max
+            if self.dec_max >= 90
+            else table.c.dec < self.dec_max
+        )
+        ra_upper = (
+            table.c.ra <= self.ra_max
+            if self.ra_max >= 360
+            else table.c.ra < self.ra_max
+        )
+        return [
+            table.c.dec >= self.dec_min,
+            dec_upper,
+            table.c.ra >= self.ra_min,
+            ra_upper,
+        ]
+
+    def cone(self) -> tuple[float, float, float]:
+        """
+        The (ra, dec, radius) of a cone containing the whole tile.
+        """
+        full_ra = self.ra_max - self.ra_min >= 360
+        if full_ra and self.dec_max >= 90:
+            ra, dec = 0.0, 90.0
+        elif full_ra and self.dec_min <= -90:
+            ra, dec = 0.0, -90.0
+        else:
+            ra = (self.ra_min + self.ra_max) / 2
+            dec = (self.dec_min + self.dec_max) / 2
+        # Separations along the edges of a box grow towards its corners
+        radius = max(
+            _separation(ra, dec, corner_ra, corner_dec)
+            for corner_ra in (self.ra_min, self.ra_max)
+            for corner_dec in (self.dec_min, self.dec_max)
+        )
+        return ra, dec, radius + 1e-6
+
+
+def _separation(ra0: float, dec0: float, ra1: float, dec1: float) -> float:
+    ra0, dec0, ra1, dec1 = map(math.radians, (ra0, dec0, ra1, dec1))
+    a = (
+        math.sin((dec1 - dec0) / 2) ** 2
+        + math.cos(dec0) * math.cos(dec1) * math.sin((ra1 - ra0) / 2) ** 2
+    )
+    return math.degrees(2 * math.asin(min(math.sqrt(a), 1.0)))
+
+
+def sky_tiles(
+    tile_size: float = DEFAULT_TILE_SIZE,
+    dec_min: float = -90.0,
+    dec_max: float = 90.0,
+) -> list[Tile]:
+    """
+    Split the sky, or the declination band between ``dec_min`` and
+    ``dec_max``, into tiles roughly ``tile_size`` degrees on a side.
+
+    Declination bands of height ``tile_size`` are divided in right
+    ascension so that tiles near the poles are not much narrower than
+    those at the equator.
+    """
+    if tile_size <= 0:
+        raise ValueError(f"tile_size must be positive, got {tile_size}")
+    if not -90 <= dec_min < dec_max <= 90:
+        raise ValueError(f"Invalid declination band {dec_min} to {dec_max}")
+
+    n_bands = math.ceil((dec_max - dec_min) / tile_size)
+    height = (dec_max - dec_min) / n_bands
+    tiles = []
+    for band in range(n_bands):
+        lower = dec_min + band * height
+        upper = dec_max if band == n_bands - 1 else lower + height
+        widest = 0.0 if lower <= 0 <= upper else min(abs(lower), abs(upper))
+        n_ra = max(
+            1, math.ceil(360 * math.cos(math.radians(widest)) / tile_size)
+        )
+        width = 360 / n_ra
+        for i in range(n_ra):
+            ra_max = 360.0 if i == n_ra - 1 else (i + 1) * width
+            tiles.append(Tile(lower, upper, i * width, ra_max))
+    return tiles
+
+
+def tile_statement(
+    tile: Tile,
+    *fields: str,
+    table: sa.Table,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    spatial_index: bool = True,
+    **keyword_filters,
+) -> sa.Select:
+    """
+    Build the statement selecting ``fields`` of the rows inside a tile.
+    Rows without a position are never inside a tile.
+    """
+    columns = [getattr(table.c, field) for field in fields]
+    filters = tile.predicates(table)
+    if spatial_index:
+        filters.append(
+            sa.func.q3c_radial_query(table.c.ra, table.c.dec, *tile.cone())
+        )
+    filters.extend(expression_filters or [])
+    return apply_filters(sa.select(*columns), table, filters, keyword_filters)
+
+
+class Checkpoint:
+    """
+    A JSON lines file recording the tiles of an extraction which were
+    completely consumed, along with their row counts.
+    """
+
+    def __init__(self, path: typing.Union[str, os.PathLike]):
+        self.path = path
+        self.completed: dict[tuple[float, ...], int] = {}
+        if os.path.exists(path):
+            with open(path) as fin:
+                for line in fin:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.completed[tuple(entry["tile"])] = entry["rows"]
+
+    def __contains__(self, tile: Tile) -> bool:
+        return tile.key in self.completed
+
+    def add(self, tile: Tile, rows: int):
+        with open(self.path, "a") as fout:
+            fout.write(json.dumps({"tile": tile.key, "rows": rows}) + "\n")
+            fout.flush()
+            os.fsync(fout.fileno())
+        self.completed[tile.key] = rows
+
+
+class ExtractionError(RuntimeError):
+    """
+    Raised once all other tiles were extracted when some tiles failed. The
+    failed tiles are available as ``tiles``.
+    """
+
+    def __init__(self, failures: typing.Sequence[tuple[Tile, BaseException]]):
+        self.failures = failures
+        self.tiles = [tile for tile, _ in failures]
+        super().__init__(
+            f"{len(failures)} tiles failed, the first with {failures[0][1]!r}"
+        )
+
+
+@instrument.instrumented
+@resolve_database
+def extract_tiles(
+    *fields: str,
+    database: Session,
+    table: sa.Table,
+    tiles: typing.Optional[typing.Sequence[Tile]] = None,
+    tile_size: float = DEFAULT_TILE_SIZE,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    output: str = arrays.ROWS,
+    workers: int = 4,
+    executor: str = parallel.THREAD,
+    checkpoint: typing.Optional[typing.Union[str, os.PathLike]] = None,
+    retries: int = DEFAULT_RETRIES,
+    spatial_index: bool = True,
+    **keyword_filters,
+) -> typing.Generator[tuple[Tile, typing.Any], None, None]:
+    """
+    Extract rows across the sky, tile by tile, over a pool of connections.
+
+    Yields ``(tile, result)`` pairs in the order tiles complete, where
+    ``result`` holds every matching row inside the tile in the requested
+    output format. At most ``workers`` tiles are extracted at once, so
+    memory is bounded by the size of the largest tiles rather than by the
+    size of the extraction.
+
+    Parameters
+    ----------
+    *fields: str
+        Names of columns to return.
+    tiles: sequence of Tile, optional
+        The tiles to extract, by default :func:`sky_tiles` of ``tile_size``.
+    tile_size: float
+        The approximate side of the default tiles in degrees. Smaller tiles
+        bound memory and retried work more tightly at the cost of more
+        statements.
+    expression_filters: list of BinaryExpressions
+        Additional filters to use.
+    output: str
+        One of ``"rows"``, ``"structured"``, ``"columns"`` or ``"arrow"``.
+        See :func:`pyticdb.query.query_by_id`.
+    workers: int
+        The number of tiles extracted concurrently, each over its own
+        connection.
+    executor: str
+        ``"thread"`` or ``"process"``, see
+        :func:`pyticdb.parallel.execute_statements`.
+    checkpoint: str or os.PathLike, optional
+        A file recording completed tiles. Tiles already recorded are
+        skipped, so re-running an interrupted extraction with the same
+        tiles and checkpoint resumes it. A tile is recorded once the
+        consumer requests the result following it, so results should be
+        persisted before moving on to the next tile.
+    retries: int
+        How many times a tile failing with an operational error is retried
+        before it is considered failed.
+    spatial_index: bool
+        Whether to add a ``q3c_radial_query`` around each tile so it is
+        answered using the Q3C index. Disable for tables without one.
+    keyword_filters:
+        Django like keywords, see :func:`pyticdb.query.query_by_id`.
+
+    Raises
+    ------
+    ExtractionError
+        After every other tile was yielded, if some tiles still failed.
+        With a checkpoint, re-running the extraction retries only them.
+
+    Examples
+    --------
+    >>> for tile, stars in extract_tiles(
+    ...     "id", "ra", "dec", "tmag",
+    ...     tmag__lt=16,
+    ...     output="arrow",
+    ...     checkpoint="tmag16.jsonl",
+    ... ):
+    ...     to_parquet([stars], f"tmag16/{tile.dec_min}_{tile.ra_min}.parquet")
+    """
+    arrays.validate_output(output)
+    if tiles is None:
+        tiles = sky_tiles(tile_size)
+    done = Checkpoint(checkpoint) if checkpoint is not None else None
+    todo = [tile for tile in tiles if done is None or tile not in done]
+    if done is not None and len(todo) < len(tiles):
+        logger.info(
+            f"Resuming extraction, {len(todo)} of {len(tiles)} tiles left"
+        )
+
+    statements = (
+        (
+            tile_statement(
+                tile,
+                *fields,
+                table=table,
+                expression_filters=expression_filters,
+                spatial_index=spatial_index,
+                **keyword_filters,
+            ),
+            None,
+            None,
+        )
+        for tile in todo
+    )
+    failures = []
+    for index, future in parallel.iter_completed(
+        database,
+        statements,
+        partial(execute_retrying, retries=retries),
+        output=arrays.part_format(output),
+        workers=workers,
+        executor=executor,
+    ):
+        tile = todo[index]
+        try:
+            result = future.result()
+        except sa.exc.SQLAlchemyError as e:
+            logger.error(f"Failed to extract {tile}: {e}")
+            failures.append((tile, e))
+            continue
+        yield tile, arrays.merge([result], output)
+        if done is not None:
+            done.add(tile, len(result))
+
+    if failures:
+        raise ExtractionError(failures)
@@ -0,0 +1,264 @@
+"""
+Lookups spanning several catalogs joined on cross-identifiers.
+
+Rows of the TIC reference other catalogs through identifier columns such as
+``gaia`` or ``twomass``. :func:`query_federated` looks up TIC ids in the
+primary catalog, gathers the cross-identifiers of the returned rows and
+queries every linked catalog concurrently, each through its own session.
+Linked rows are then joined to the primary rows with in-memory hash joins,
+so the latency of a lookup is that of the primary query followed by the
+slowest linked catalog rather than the sum of all of them.
+"""
+
+import dataclasses
+import numbers
+import typing
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from pyticdb import arrays, instrument, parallel
+from pyticdb.cache import row_type
+from pyticdb.conn import bound_engine
+from pyticdb.loader import resolve_table
+from pyticdb.query import (
+    INT_SCALAR_OR_LIST,
+    PARAMETER_LIMIT,
+    execute_query,
+    primary_key_column,
+    query_by_id,
+)
+from pyticdb.util import chunkify
+
+
+@dataclasses.dataclass(frozen=True)
+class Link:
+    """
+    A catalog joined to the primary catalog on a cross-identifier.
+
+    Parameters
+    ----------
+    column: str
+        The column of the primary table holding the cross-identifier, for
+        instance ``"gaia"``.
+    database: str or sessionmaker
+        The configured database of the linked catalog, or a sessionmaker
+        opening sessions to it.
+    table: str or Table
+        The table of the linked catalog.
+    fields: tuple of str
+        Names of the linked columns to return.
+    key: str, optional
+        The column of the linked table matched against the
+        cross-identifier. Defaults to its primary key.
+    prefix: str, optional
+        Prefix of the linked fields in returned rows, ``column`` by
+        default. Fields are named ``{prefix}_{field}``.
+    """
+
+    column: str
+    database: typing.Union[str, orm.sessionmaker]
+    table: typing.Union[str, sa.Table]
+    fields: tuple[str, ...]
+    key: typing.Optional[str] = None
+    prefix: typing.Optional[str] = None
+
+    @property
+    def names(self) -> list[str]:
+        prefix = self.column if self.prefix is None else self.prefix
+        return [f"{prefix}_{field}" for field in self.fields]
+
+
+def _coerce(column: sa.Column) -> typing.Callable[[typing.Any], typing.Any]:
+    # Cross-identifiers are often stored as text in the TIC
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return lambda value: value
+    if not issubclass(python_type, numbers.Number):
+        return python_type
+
+    def coerce(value):
+        coerced = python_type(value)
+        # int(3.7) would silently match the row of 3
+        if isinstance(value, numbers.Number) and coerced != value:
+            raise ValueError(
+                f"{value!r} is not exactly a {python_type.__name__}"
+            )
+        return coerced
+
+    return coerce
+
+
+def _link_query(
+    link: Link, identifiers: typing.Iterable[typing.Any]
+) -> tuple[orm.sessionmaker, sa.Select, dict[typing.Any, typing.Any]]:
+    """
+    The sessionmaker and statement of a link, along with the identifiers
+    coerced to the type of its key column. Identifiers which cannot be
+    coerced exactly are left out.
+    """
+    sessionmaker, table = resolve_table(link.database, link.table)
+    key = (
+        primary_key_column(table)
+        if link.key is None
+        else getattr(table.c, link.key)
+    )
+    coerce = _coerce(key)
+    coerced = {}
+    for identifier in identifiers:
+        try:
+            coerced[identifier] = coerce(identifier)
+        except (TypeError, ValueError, ArithmeticError):
+            continue
+
+    q = sa.select(key, *(getattr(table.c, field) for field in link.fields))
+    q = q.where(key.in_(sa.bindparam("keys", expanding=True)))
+    return sessionmaker, q, coerced
+
+
+def _match(
+    coerced: dict[typing.Any, typing.Any], rows: typing.Iterable[sa.Row]
+) -> dict[typing.Any, list[tuple]]:
+    matches: dict[typing.Any, list[tuple]] = {}
+    for row in rows:
+        matches.setdefault(row[0], []).append(tuple(row[1:]))
+    return {
+        identifier: matches[value]
+        for identifier, value in coerced.items()
+        if value in matches
+    }
+
+
+def query_link(
+    link: Link, identifiers: typing.Iterable[typing.Any]
+) -> dict[typing.Any, list[tuple]]:
+    """
+    Query the rows of a linked catalog matching the given
+    cross-identifiers.
+
+    Returns
+    -------
+    dict
+        The tuples of linked fields of each matched identifier. Identifiers
+        are matched once coerced to the type of the linked key column,
+        those which cannot be coerced exactly match nothing.
+    """
+    sessionmaker, q, coerced = _link_query(link, identifiers)
+    rows = []
+    for chunk in chunkify(list(set(coerced.values())), PARAMETER_LIMIT):
+        rows.extend(execute_query(sessionmaker(), q, params={"keys": chunk}))
+    return _match(coerced, rows)
+
+
+@instrument.instrumented
+def query_federated(
+    id: INT_SCALAR_OR_LIST,
+    *fields: str,
+    links: typing.Sequence[Link],
+    database: typing.Union[str, orm.sessionmaker, None] = None,
+    table: typing.Union[str, sa.Table, None] = None,
+    workers: typing.Optional[int] = None,
+    **keyword_filters,
+) -> list[tuple]:
+    """
+    Query primary keys of a catalog along with the rows of linked catalogs
+    matching their cross-identifiers.
+
+    Linked catalogs are left joined: primary rows without a cross-identifier
+    or without a match have ``None`` for the linked fields. A primary row
+    matching several rows of a linked catalog is repeated for each of them.
+
+    Parameters
+    ----------
+    id: integer or iterable of integers
+        The primary keys to look up.
+    *fields: str
+        Names of the primary columns to return.
+    links: sequence of Link
+        The catalogs to join.
+    database: str or sessionmaker, optional
+        The configured primary database, ``"tic_82"`` by default, or a
+        sessionmaker opening sessions to it.
+    table: str or Table, optional
+        The primary table, ``"ticentries"`` by default.
+    workers: int, optional
+        The maximum number of linked lookups executed concurrently, one per
+        linked catalog by default.
+    keyword_filters:
+        Django like keywords filtering the primary rows, see
+        :func:`pyticdb.query.query_by_id`.
+
+    Returns
+    -------
+    list of named tuples
+        Rows of ``fields`` followed by the fields of every link, named
+        ``{prefix}_{field}``.
+
+    Examples
+    --------
+    >>> gaia = Link("gaia", "gaia3", "gaia_source", ("phot_g_mean_mag",))
+    >>> twomass = Link("twomass", "twomass", "psc", ("j_m", "h_m", "k_m"))
+    >>> rows = query_federated(tic_ids, "id", "tmag", links=[gaia, twomass])
+    >>> rows[0].gaia_phot_g_mean_mag
+    """
+    sessionmaker, table = resolve_table(database, table)
+    columns = list(dict.fromkeys(link.column for link in links))
+    rows = query_by_id(
+        id,
+        *fields,
+        *columns,
+        database=sessionmaker(),
+        table=table,
+        **keyword_filters,
+    )
+    positions = {column: len(fields) + i for i, column in enumerate(columns)}
+
+    workers = workers or max(len(links), 1)
+    with parallel.make_executor(
+        bound_engine(sessionmaker()), workers, parallel.THREAD
+    ) as pool:
+        lookups = []
+        for link in links:
+            position = positions[link.column]
+            identifiers = {
+                row[position] for row in rows if row[position] is not None
+            }
+            link_sessionmaker, q, coerced = _link_query(link, identifiers)
+            engine = bound_engine(link_sessionmaker())
+            futures = [
+                parallel.submit(
+                    pool,
+                    engine,
+                    parallel.THREAD,
+                    execute_query,
+                    q,
+                    {"keys": chunk},
+                    arrays.ROWS,
+                    None,
+                )
+                for chunk in chunkify(
+                    list(set(coerced.values())), PARAMETER_LIMIT
+                )
+            ]
+            lookups.append((coerced, futures))
+        matches = [
+            _match(coerced, (row for f in futures for row in f.result()))
+            for coerced, futures in lookups
+        ]
+
+    names = list(fields)
+    for link in links:
+        names.extend(link.names)
+    make_row = row_type(names)._make
+
+    joined: list[tuple] = []
+    for row in rows:
+        combined = [tuple(row[: len(fields)])]
+        for link, found in zip(links, matches):
+            linked = found.get(row[positions[link.column]]) or [
+                (None,) * len(link.fields)
+            ]
+            combined = [head + tail for head in combined for tail in linked]
+        joined.extend(make_row(values) for values in combined)
+    return joined
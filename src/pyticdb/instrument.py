@@ -0,0 +1,318 @@
+"""
+Per call instrumentation of pyticdb queries.
+
+Public query functions record how long each call spent in the phases of a
+query:
+
+- ``reflect``: reflecting remote schemas.
+- ``connect``: establishing new DBAPI connections.
+- ``compile``: building and compiling SQL, from the start of
+  ``Connection.execute`` until the cursor executes.
+- ``execute``: the server executing statements, between the
+  ``before_cursor_execute`` and ``after_cursor_execute`` engine events.
+- ``fetch``: fetching and materializing rows on the client.
+
+Finished calls are passed to every registered sink and collected by any
+active :func:`profile`. Nothing is recorded while there are neither sinks
+nor profiles.
+
+Examples
+--------
+>>> from pyticdb import instrument
+>>> with instrument.profile() as prof:
+...     query_by_id(ids, "tmag")
+...     query_by_loc(120.0, -45.0, 0.2, "id")
+>>> prof.summary()["query_by_id"]["phases"]
+{'connect': 0.012, 'compile': 0.0004, 'execute': 0.084, 'fetch': 0.021}
+
+>>> instrument.add_sink(instrument.log_sink)
+"""
+
+import contextlib
+import contextvars
+import dataclasses
+import inspect
+import threading
+import time
+import typing
+from functools import wraps
+
+import sqlalchemy as sa
+from loguru import logger
+from sqlalchemy.engine.interfaces import CacheStats
+
+REFLECT = "reflect"
+CONNECT = "connect"
+COMPILE = "compile"
+EXECUTE = "execute"
+FETCH = "fetch"
+PHASES = (REFLECT, CONNECT, COMPILE, EXECUTE, FETCH)
+
+# Keys of Connection.info and ConnectionRecord.info holding phase start times
+_EXECUTE_START = "pyticdb_execute_start"
+_CURSOR_START = "pyticdb_cursor_start"
+_CONNECT_START = "pyticdb_connect_start"
+
+RT = typing.TypeVar("RT")
+
+
+@dataclasses.dataclass
+class CallRecord:
+    """
+    The instrumentation of a single call of a query function.
+
+    Attributes
+    ----------
+    name: str
+        The name of the instrumented function.
+    elapsed: float
+        Total wall time of the call in seconds.
+    phases: dict[str, float]
+        Seconds spent in each phase. Phases of statements executed
+        concurrently are summed and may exceed ``elapsed``.
+    rows: int
+        Number of rows fetched.
+    statements: int
+        Number of statements executed, such as the chunks of an id lookup.
+    compiled_cache_hits: int
+        Number of statements whose compiled form was served from the
+        SQLAlchemy compiled cache.
+    """
+
+    name: str
+    elapsed: float = 0.0
+    phases: dict[str, float] = dataclasses.field(default_factory=dict)
+    rows: int = 0
+    statements: int = 0
+    compiled_cache_hits: int = 0
+    _lock: threading.Lock = dataclasses.field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def add(self, phase: str, seconds: float, rows: int = 0):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+            self.rows += rows
+
+    def as_dict(self) -> dict[str, typing.Any]:
+        return {
+            "name": self.name,
+            "elapsed": self.elapsed,
+            "phases": dict(self.phases),
+            "rows": self.rows,
+            "statements": self.statements,
+            "compiled_cache_hits": self.compiled_cache_hits,
+        }
+
+
+class Profile:
+    """
+    The calls recorded within a :func:`profile` block.
+    """
+
+    def __init__(self):
+        self.calls: list[CallRecord] = []
+        self._lock = threading.Lock()
+
+    def append(self, record: CallRecord):
+        with self._lock:
+            self.calls.append(record)
+
+    def summary(self) -> dict[str, dict[str, typing.Any]]:
+        """
+        Aggregate the recorded calls by function name.
+        """
+        summary: dict[str, dict[str, typing.Any]] = {}
+        for record in self.calls:
+            entry = summary.setdefault(
+                record.name,
+                {
+                    "calls": 0,
+                    "elapsed": 0.0,
+                    "phases": {},
+                    "rows": 0,
+                    "statements": 0,
+                    "compiled_cache_hits": 0,
+                },
+            )
+            entry["calls"] += 1
+            entry["elapsed"] += record.elapsed
+            entry["rows"] += record.rows
+            entry["statements"] += record.statements
+            entry["compiled_cache_hits"] += record.compiled_cache_hits
+            for phase, seconds in record.phases.items():
+                entry["phases"][phase] = (
+                    entry["phases"].get(phase, 0.0) + seconds
+                )
+        return summary
+
+
+_current: contextvars.ContextVar[typing.Optional[CallRecord]] = (
+    contextvars.ContextVar("pyticdb_call", default=None)
+)
+_profiles: contextvars.ContextVar[tuple[Profile, ...]] = (
+    contextvars.ContextVar("pyticdb_profiles", default=())
+)
+_sinks: list[typing.Callable[[CallRecord], None]] = []
+
+
+def add_sink(sink: typing.Callable[[CallRecord], None]):
+    """
+    Register a callable receiving the ``CallRecord`` of every finished
+    call, for example to forward timings to a metrics system.
+    """
+    _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink: typing.Callable[[CallRecord], None]):
+    _sinks.remove(sink)
+
+
+def log_sink(record: CallRecord):
+    """
+    A sink logging each call through loguru at the debug level.
+    """
+    phases = ", ".join(
+        f"{phase}={seconds:.4f}s" for phase, seconds in record.phases.items()
+    )
+    logger.debug(
+        f"{record.name} took {record.elapsed:.4f}s ({phases}), "
+        f"{record.rows} rows over {record.statements} statements"
+    )
+
+
+@contextlib.contextmanager
+def profile() -> typing.Generator[Profile, None, None]:
+    """
+    Collect the calls made within the block, including calls made from
+    worker threads started by pyticdb. Calls executed in worker processes
+    are not collected.
+    """
+    prof = Profile()
+    token = _profiles.set((*_profiles.get(), prof))
+    try:
+        yield prof
+    finally:
+        _profiles.reset(token)
+
+
+def active() -> bool:
+    return bool(_sinks) or bool(_profiles.get())
+
+
+def record(phase: str, seconds: float, rows: int = 0):
+    """
+    Attribute time spent in a phase to the current call, if any.
+    """
+    current = _current.get()
+    if current is not None:
+        current.add(phase, seconds, rows=rows)
+
+
+def _finish(record: CallRecord):
+    for prof in _profiles.get():
+        prof.append(record)
+    for sink in list(_sinks):
+        sink(record)
+
+
+def instrumented(func: typing.Callable[..., RT]) -> typing.Callable[..., RT]:
+    """
+    Record calls of a query function. Calls made while another call is
+    already being recorded, such as a cache refill, are attributed to the
+    outer call. Generator functions are recorded until exhausted or closed,
+    only counting the time spent producing items.
+    """
+    if inspect.isgeneratorfunction(inspect.unwrap(func)):
+
+        @wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            if _current.get() is not None or not active():
+                yield from func(*args, **kwargs)
+                return
+
+            record_ = CallRecord(func.__name__)
+            generator = func(*args, **kwargs)
+            try:
+                while True:
+                    token = _current.set(record_)
+                    t0 = time.perf_counter()
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        record_.elapsed += time.perf_counter() - t0
+                        _current.reset(token)
+                    yield item
+            finally:
+                generator.close()
+                _finish(record_)
+
+        return generator_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current.get() is not None or not active():
+            return func(*args, **kwargs)
+
+        record_ = CallRecord(func.__name__)
+        token = _current.set(record_)
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_.elapsed = time.perf_counter() - t0
+            _current.reset(token)
+            _finish(record_)
+
+    return wrapper
+
+
+@sa.event.listens_for(sa.Engine, "do_connect")
+def _before_connect(dialect, connection_record, cargs, cparams):
+    if _current.get() is not None:
+        connection_record.info[_CONNECT_START] = time.perf_counter()
+
+
+@sa.event.listens_for(sa.Engine, "connect")
+def _after_connect(dbapi_connection, connection_record):
+    t0 = connection_record.info.pop(_CONNECT_START, None)
+    if t0 is not None:
+        record(CONNECT, time.perf_counter() - t0)
+
+
+@sa.event.listens_for(sa.Engine, "before_execute")
+def _before_execute(conn, clauseelement, multiparams, params, options):
+    if _current.get() is not None:
+        conn.info[_EXECUTE_START] = time.perf_counter()
+
+
+@sa.event.listens_for(sa.Engine, "before_cursor_execute")
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    current = _current.get()
+    if current is None:
+        return
+    now = time.perf_counter()
+    t0 = conn.info.pop(_EXECUTE_START, None)
+    if t0 is not None:
+        current.add(COMPILE, now - t0)
+    conn.info[_CURSOR_START] = now
+
+
+@sa.event.listens_for(sa.Engine, "after_cursor_execute")
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    current = _current.get()
+    t0 = conn.info.pop(_CURSOR_START, None)
+    if current is None or t0 is None:
+        return
+    current.add(EXECUTE, time.perf_counter() - t0)
+    with current._lock:
+        current.statements += 1
+        if getattr(context, "cache_hit", None) == CacheStats.CACHE_HIT:
+            current.compiled_cache_hits += 1
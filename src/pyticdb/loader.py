@@ -0,0 +1,223 @@
+"""
+Coalescing of concurrent single id lookups into batched queries.
+
+Services answering many small requests concurrently tend to call
+``query_by_id`` with one id per thread, paying a session and a round trip
+per id. A :class:`BatchLoader` instead holds each lookup for a short window
+and gathers the other lookups for the same table, fields and filters
+arriving meanwhile, querying them all with a single ``query_by_id`` call.
+"""
+
+import threading
+import typing
+from concurrent.futures import Future
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from pyticdb.cache import row_type
+from pyticdb.conn import Databases
+from pyticdb.query import composite_keys, primary_key_columns, query_by_id
+
+DEFAULT_MAX_BATCH_SIZE = 1_000
+DEFAULT_MAX_WAIT = 0.002
+
+GROUP_KEY = tuple[typing.Hashable, ...]
+
+
+class _Batch:
+    def __init__(self):
+        self.futures: dict[typing.Hashable, Future] = {}
+        self.full = threading.Event()
+
+
+class BatchLoader:
+    """
+    Gather concurrent lookups of single primary keys into batches.
+
+    The first lookup of a batch waits up to ``max_wait`` seconds, or until
+    ``max_batch_size`` distinct ids were requested, then queries every
+    gathered id at once on behalf of all waiting callers. Lookups are only
+    batched together when they share the database, table, fields and
+    keyword filters.
+
+    Parameters
+    ----------
+    max_batch_size: int
+        The maximum number of distinct ids queried per batch.
+    max_wait: float
+        The longest time, in seconds, a batch waits for further lookups.
+        This is added to the latency of the lookup opening a batch.
+
+    Examples
+    --------
+    >>> loader = BatchLoader(max_wait=0.005)
+    >>> # Called concurrently from many request handlers
+    >>> star = loader.load(tic_id, "ra", "dec", "tmag")
+    >>> loader.stats()
+    {'requests': 5000, 'batches': 61, 'ids': 4952, 'full_batches': 0,
+     'requests_per_batch': 81.97}
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+    ):
+        if max_batch_size < 1:
+            raise ValueError(
+                f"max_batch_size must be at least 1, got {max_batch_size}"
+            )
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = 0
+        self.batches = 0
+        self.ids = 0
+        self.full_batches = 0
+        self._open: dict[GROUP_KEY, _Batch] = {}
+        self._lock = threading.Lock()
+
+    def load(
+        self,
+        id: typing.Any,
+        *fields: str,
+        database: typing.Union[str, orm.sessionmaker, None] = None,
+        table: typing.Union[str, sa.Table, None] = None,
+        **keyword_filters,
+    ) -> typing.Optional[tuple]:
+        """
+        Look up the row of a single primary key, blocking until the batch it
+        joined was queried.
+
+        Parameters
+        ----------
+        id: int or tuple
+            The primary key, or a tuple of values for composite keys.
+        *fields: str
+            Names of columns to return.
+        database: str or sessionmaker, optional
+            The configured database, ``"tic_82"`` by default, or a
+            sessionmaker opening sessions to it.
+        table: str or Table, optional
+            The table to query, ``"ticentries"`` by default.
+        keyword_filters:
+            Django like keywords, see :func:`pyticdb.query.query_by_id`.
+            Values must be hashable.
+
+        Returns
+        -------
+        A named tuple of ``fields``, or None if no row matched.
+        """
+        sessionmaker, table = resolve_table(database, table)
+        pk_keys = tuple(column.key for column in primary_key_columns(table))
+        key = (
+            composite_keys(id, len(pk_keys))[0]
+            if len(pk_keys) > 1
+            else int(id)
+        )
+        group = (
+            sessionmaker,
+            table,
+            fields,
+            tuple(sorted(keyword_filters.items())),
+        )
+
+        with self._lock:
+            self.requests += 1
+            batch = self._open.get(group)
+            leader = batch is None
+            if batch is None:
+                batch = self._open[group] = _Batch()
+            future = batch.futures.get(key)
+            if future is None:
+                future = batch.futures[key] = Future()
+            if len(batch.futures) >= self.max_batch_size:
+                del self._open[group]
+                self.full_batches += 1
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.max_wait)
+            with self._lock:
+                if self._open.get(group) is batch:
+                    del self._open[group]
+                self.batches += 1
+                self.ids += len(batch.futures)
+            self._dispatch(
+                batch, sessionmaker, table, pk_keys, fields, keyword_filters
+            )
+        return future.result()
+
+    def _dispatch(
+        self,
+        batch: _Batch,
+        sessionmaker: orm.sessionmaker,
+        table: sa.Table,
+        pk_keys: tuple[str, ...],
+        fields: tuple[str, ...],
+        keyword_filters: dict[str, typing.Any],
+    ):
+        try:
+            rows = query_by_id(
+                list(batch.futures),
+                *pk_keys,
+                *fields,
+                database=sessionmaker(),
+                table=table,
+                **keyword_filters,
+            )
+        except BaseException as e:
+            for future in batch.futures.values():
+                future.set_exception(e)
+            raise
+
+        make_row = row_type(fields)._make
+        n_keys = len(pk_keys)
+        found = {}
+        for row in rows:
+            key = row[0] if n_keys == 1 else tuple(row[:n_keys])
+            found[key] = make_row(row[n_keys:])
+        for key, future in batch.futures.items():
+            future.set_result(found.get(key))
+
+    def stats(self) -> dict[str, typing.Union[int, float]]:
+        """
+        Counters of how well lookups were coalesced. ``requests`` lookups
+        were served by ``batches`` queries of ``ids`` distinct ids in
+        total, ``full_batches`` of which were dispatched early because they
+        reached ``max_batch_size``.
+        """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "ids": self.ids,
+                "full_batches": self.full_batches,
+                "requests_per_batch": (
+                    self.requests / self.batches if self.batches else 0.0
+                ),
+            }
+
+
+def resolve_table(
+    database: typing.Union[str, orm.sessionmaker, None],
+    table: typing.Union[str, sa.Table, None],
+) -> tuple[orm.sessionmaker, sa.Table]:
+    """
+    Resolve a configured database name, or sessionmaker, and a table name
+    into the sessionmaker and reflected table they reference. Defaults to
+    the ``ticentries`` table of ``tic_82``.
+    """
+    if database is None:
+        database = "tic_82"
+    if table is None:
+        table = "ticentries"
+    if isinstance(database, str):
+        metadata, sessionmaker = Databases[database]
+    else:
+        metadata, sessionmaker = None, database
+    if not isinstance(table, str):
+        return sessionmaker, table
+    if metadata is None:
+        raise ValueError("A Table is required when database is a sessionmaker")
+    return sessionmaker, metadata.tables[table]
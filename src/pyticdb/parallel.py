@@ -0,0 +1,188 @@
+"""
+Concurrent execution of independent statements over a worker pool.
+"""
+
+import contextvars
+import typing
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from pyticdb.conn import bound_engine, create_engine
+
+THREAD = "thread"
+PROCESS = "process"
+EXECUTORS = (THREAD, PROCESS)
+
+# Per worker process sessionmaker, populated by the pool initializer.
+_worker_sessionmaker: typing.Optional[orm.sessionmaker] = None
+
+
+def _init_process_worker(url: str):
+    """
+    Create the engine used by a process pool worker. Engines are not shared
+    with the parent process, the usual multiprocess guards are registered so
+    connections are never checked out across process boundaries.
+    """
+    global _worker_sessionmaker
+    engine = create_engine(url)
+    _worker_sessionmaker = orm.sessionmaker(bind=engine)
+
+
+def _execute_in_process(
+    execute: typing.Callable,
+    q,
+    params: typing.Optional[dict],
+    output: str,
+    size_hint: typing.Optional[int],
+):
+    if _worker_sessionmaker is None:
+        raise RuntimeError("Process pool worker was not initialized")
+    return execute(
+        _worker_sessionmaker(),
+        q,
+        output=output,
+        size_hint=size_hint,
+        params=params,
+    )
+
+
+def make_executor(engine: sa.Engine, workers: int, executor: str) -> Executor:
+    """
+    Create a pool of ``workers`` workers of the given executor type. Process
+    workers each create their own engine connected to ``engine``'s url.
+    """
+    if executor == THREAD:
+        return ThreadPoolExecutor(max_workers=workers)
+    if executor == PROCESS:
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_process_worker,
+            initargs=(engine.url.render_as_string(hide_password=False),),
+        )
+    raise ValueError(
+        f"Unknown executor {executor!r}, expected one of {EXECUTORS}"
+    )
+
+
+def execute_statements(
+    database: orm.Session,
+    statements: typing.Iterable[
+        tuple[sa.Select, typing.Optional[dict], typing.Optional[int]]
+    ],
+    execute: typing.Callable,
+    output: str,
+    workers: int,
+    executor: str = THREAD,
+) -> list:
+    """
+    Execute independent statements concurrently and return their results in
+    the order the statements were given.
+
+    Parameters
+    ----------
+    database: Session
+        A session whose bind is used to open one connection per concurrent
+        statement.
+    statements: iterable of (Select, params, size_hint) tuples
+        The statements to execute, as produced by ``id_statements``.
+    execute: callable
+        A module level function with the signature of
+        ``pyticdb.query.execute_query``.
+    output: str
+        The output format each statement result is returned in.
+    workers: int
+        The maximum number of statements executed at once.
+    executor: str
+        ``"thread"`` to share the session's engine across a thread pool or
+        ``"process"`` to execute in a process pool. Process workers create
+        their own engine and statements are pickled to them.
+    """
+    engine = bound_engine(database)
+    statements = list(statements)
+    with make_executor(engine, workers, executor) as pool:
+        futures = [
+            submit(pool, engine, executor, execute, q, params, output, hint)
+            for q, params, hint in statements
+        ]
+        return [future.result() for future in futures]
+
+
+def submit(
+    pool: Executor,
+    engine: sa.Engine,
+    executor: str,
+    execute: typing.Callable,
+    q,
+    params: typing.Optional[dict],
+    output: str,
+    size_hint: typing.Optional[int],
+) -> Future:
+    """
+    Submit a statement to a pool created by :func:`make_executor`. Thread
+    workers execute it in a new session bound to ``engine``, copying the
+    current context so instrumentation reaches the calling profile.
+    """
+    if executor == PROCESS:
+        return pool.submit(
+            _execute_in_process, execute, q, params, output, size_hint
+        )
+    return pool.submit(
+        contextvars.copy_context().run,
+        execute,
+        orm.Session(bind=engine),
+        q,
+        output=output,
+        size_hint=size_hint,
+        params=params,
+    )
+
+
+def iter_completed(
+    database: orm.Session,
+    statements: typing.Iterable[
+        tuple[sa.Select, typing.Optional[dict], typing.Optional[int]]
+    ],
+    execute: typing.Callable,
+    output: str,
+    workers: int,
+    executor: str = THREAD,
+) -> typing.Generator[tuple[int, Future], None, None]:
+    """
+    Execute independent statements concurrently, yielding the position of
+    each statement and its finished future in completion order.
+
+    At most ``workers`` statements are in flight, and statements are only
+    consumed from ``statements`` as workers free up, so the number of
+    results held at once stays bounded. Statements not yet started are
+    cancelled if the generator is closed early. See
+    :func:`execute_statements` for the parameters.
+    """
+    engine = bound_engine(database)
+    indexed = enumerate(statements)
+    pending: dict[Future, int] = {}
+    pool = make_executor(engine, workers, executor)
+    try:
+        while True:
+            for index, (q, params, hint) in indexed:
+                future = submit(
+                    pool, engine, executor, execute, q, params, output, hint
+                )
+                pending[future] = index
+                if len(pending) >= workers:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
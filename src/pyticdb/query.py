@@ -1,20 +1,27 @@
 import operator
+import time
 import typing
-from functools import wraps
+from functools import lru_cache, wraps
 from itertools import chain
 
 import sqlalchemy as sa
+from loguru import logger
+from sqlalchemy.dialects import postgresql as psql
 from sqlalchemy.orm import Session
 from sqlalchemy.sql.elements import BinaryExpression
 from collections.abc import Iterable as IIterable
 
+from pyticdb import arrays, instrument, parallel, pgcopy
+from pyticdb.cache import ResultCache, cache_prefix, cached_lookup
 from pyticdb.conn import Databases
+from pyticdb.diskcache import DiskCache
 from pyticdb.util import chunkify
 
 INT_SCALAR_OR_LIST = typing.Union[int, list[int], typing.Iterable[int]]
 _CMPR = typing.Union[BinaryExpression, sa.ColumnElement[bool]]
 FILTER_TYPE = typing.Union[None, _CMPR, typing.List[_CMPR]]
 RT = typing.TypeVar("RT")
+PARAMS = dict[str, typing.Any]
 
 
 def resolve_database(func: typing.Callable[..., RT]) -> typing.Callable[..., RT]:
@@ -67,15 +74,24 @@ def expression_from_kwarg(
     >>> expression_from_kwarg(tmag__ge=13.5)
     >>> # Equivalent to (TicEntry.tmag <= 13.5)
     """
-    col_name, op_name = kwarg.split("__")
+    col_name, op = parse_kwarg(kwarg)
     lhs = getattr(table.c, col_name)
-    op = getattr(operator, op_name)
 
     expression = op(lhs, rhs)
 
     return expression
 
 
+@lru_cache(maxsize=None)
+def parse_kwarg(kwarg: str) -> tuple[str, typing.Callable]:
+    """
+    Split a ``column__operator`` keyword into the column name and the
+    function of the ``operator`` module it refers to.
+    """
+    col_name, op_name = kwarg.split("__")
+    return col_name, getattr(operator, op_name)
+
+
 def apply_filters(
     q,
     table: sa.Table,
@@ -92,6 +108,377 @@ def apply_filters(
     return q
 
 
+PARAMETER_LIMIT = 65535
+BULK_ID_THRESHOLD = PARAMETER_LIMIT
+STATEMENT_CACHE_SIZE = 1024
+DEFAULT_RETRIES = 2
+
+# Criteria of statement templates
+ID_EQ = "id"
+ID_IN = "ids"
+ID_ANY = "id_array"
+CONE = "cone"
+
+
+def _criterion(table: sa.Table, criterion: str) -> _CMPR:
+    if criterion == CONE:
+        return sa.func.q3c_radial_query(
+            table.c.ra,
+            table.c.dec,
+            sa.bindparam("ra", type_=sa.Float),
+            sa.bindparam("dec", type_=sa.Float),
+            sa.bindparam("radius", type_=sa.Float),
+        )
+
+    pk_columns = primary_key_columns(table)
+    if len(pk_columns) > 1:
+        return _composite_criterion(pk_columns, criterion)
+    pk_column = pk_columns[0]
+    if criterion == ID_EQ:
+        return pk_column == sa.bindparam("id")
+    if criterion == ID_IN:
+        return pk_column.in_(sa.bindparam("ids", expanding=True))
+    if criterion == ID_ANY:
+        id_array = sa.cast(sa.bindparam("ids"), psql.ARRAY(sa.BigInteger))
+        return pk_column == sa.any_(id_array)
+    raise ValueError(f"Unknown criterion {criterion!r}")
+
+
+def _composite_criterion(pk_columns: list[sa.Column], criterion: str) -> _CMPR:
+    key = sa.tuple_(*pk_columns)
+    if criterion == ID_IN:
+        return key.in_(sa.bindparam("ids", expanding=True))
+    if criterion == ID_ANY:
+        # One array per key column, zipped back into rows by unnest
+        key_arrays = [
+            sa.cast(sa.bindparam(f"ids_{i}"), psql.ARRAY(column.type))
+            for i, column in enumerate(pk_columns)
+        ]
+        keys = (
+            sa.func.unnest(*key_arrays)
+            .table_valued(*[f"key_{i}" for i in range(len(pk_columns))])
+            .render_derived()
+        )
+        return key.in_(sa.select(*keys.c))
+    raise ValueError(f"Unknown criterion {criterion!r} for a composite key")
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def statement_template(
+    table: sa.Table,
+    fields: tuple[str, ...],
+    criterion: str,
+    filter_names: tuple[str, ...],
+) -> sa.Select:
+    """
+    Return the statement selecting ``fields`` of ``table`` restricted by
+    ``criterion`` and the keyword filters ``filter_names``. All values are
+    left as bind parameters, keyword filters are bound under their keyword.
+
+    Templates are cached by shape so repeated lookups reuse the same
+    statement object. SQLAlchemy memoizes the cache key of a statement
+    object, so executing a cached template skips both statement construction
+    and compilation. The SQL text is also stable, allowing psycopg to
+    prepare it server-side once it is executed repeatedly on a connection.
+    """
+    columns = [getattr(table.c, field) for field in fields]
+    q = sa.select(*columns).where(_criterion(table, criterion))
+    for kwarg in filter_names:
+        col_name, op = parse_kwarg(kwarg)
+        q = q.where(op(getattr(table.c, col_name), sa.bindparam(kwarg)))
+    return q
+
+
+def bind_statement(
+    table: sa.Table,
+    fields: typing.Sequence[str],
+    criterion: str,
+    expression_filters: typing.Optional[list[_CMPR]],
+    keyword_filters: typing.Dict[str, typing.Any],
+) -> tuple[sa.Select, PARAMS]:
+    """
+    Build a statement from the cached template of its shape along with the
+    parameters binding the keyword filter values. Keyword filters comparing
+    against SQL expressions or None, which compile to ``IS NULL`` and
+    ``IS NOT NULL``, and any ``expression_filters`` are applied on top of
+    the template.
+    """
+    params = {}
+    expressions = list(expression_filters or [])
+    for kwarg, value in keyword_filters.items():
+        if value is None or isinstance(value, sa.ClauseElement):
+            expressions.append(expression_from_kwarg(table, kwarg, value))
+        else:
+            params[kwarg] = value
+
+    q = statement_template(table, tuple(fields), criterion, tuple(params))
+    if expressions:
+        q = q.where(*expressions)
+    return q, params
+
+
+def execute_query(
+    database: Session,
+    q,
+    output: str = arrays.ROWS,
+    size_hint: typing.Optional[int] = None,
+    params: typing.Optional[PARAMS] = None,
+):
+    """
+    Execute the statement and return its results in the requested output
+    format.
+    """
+    with database as db:
+        result = db.execute(q, params)
+        t0 = time.perf_counter()
+        if output == arrays.ROWS:
+            decoded = list(result.fetchall())
+        else:
+            # Session.execute is typed as returning a plain Result
+            decoded = arrays.decode_result(
+                typing.cast(sa.CursorResult, result),
+                q.selected_columns,
+                output,
+                size_hint=size_hint,
+            )
+        instrument.record(
+            instrument.FETCH,
+            time.perf_counter() - t0,
+            rows=arrays.row_count(decoded),
+        )
+        return decoded
+
+
+def execute_retrying(
+    database: Session,
+    q,
+    output: str = arrays.ROWS,
+    size_hint: typing.Optional[int] = None,
+    params: typing.Optional[PARAMS] = None,
+    retries: int = DEFAULT_RETRIES,
+):
+    """
+    :func:`execute_query`, retrying statements which failed with an
+    operational error such as a dropped connection or a cancelled
+    statement. Used by long running jobs made of many short statements.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return execute_query(
+                database, q, output=output, size_hint=size_hint, params=params
+            )
+        except sa.exc.OperationalError as e:
+            if attempt == retries:
+                raise
+            logger.warning(f"Retrying after failed attempt {attempt + 1}: {e}")
+
+
+def stream_query(
+    database: Session,
+    q,
+    batch_size: int = arrays.DEFAULT_BATCH_SIZE,
+    output: str = arrays.ROWS,
+    params: typing.Optional[PARAMS] = None,
+) -> typing.Generator[typing.Any, None, None]:
+    """
+    Execute the statement using a server-side cursor and yield results in
+    batches of at most ``batch_size`` rows. Each batch is in the requested
+    output format, with ``"arrow"`` batches being Arrow record batches.
+    """
+    with database as db:
+        result = db.execute(
+            q, params, execution_options={"yield_per": batch_size}
+        )
+        decode = None
+        if output != arrays.ROWS:
+            # Textual statements have no selected columns to decode by
+            decode = arrays.batch_decoder(q.selected_columns, output)
+        partitions = result.partitions(batch_size)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                batch = next(partitions)
+                if decode is not None:
+                    batch = decode(batch)
+            except StopIteration:
+                return
+            instrument.record(
+                instrument.FETCH,
+                time.perf_counter() - t0,
+                rows=arrays.row_count(batch),
+            )
+            yield batch
+
+
+def primary_key_columns(table: sa.Table) -> list[sa.Column]:
+    """
+    Determine the primary key column(s) of the table. If no primary key
+    is reflected a column named 'id' is used instead.
+    """
+    pk_columns = list(table.primary_key)
+    if not pk_columns:
+        # Attempt to recover by using a field called 'id'
+        try:
+            pk_columns = [table.c.id]
+        except AttributeError:
+            raise RuntimeError(
+                f"No primary key is specified on {table}. Attempts"
+                " to use a field called 'id' failed as well."
+            )
+    return pk_columns
+
+
+def primary_key_column(table: sa.Table) -> sa.Column:
+    """
+    Determine the single primary key column of the table, see
+    :func:`primary_key_columns`.
+    """
+    pk_columns = primary_key_columns(table)
+    if len(pk_columns) > 1:
+        raise ValueError(
+            f"{table} has a composite primary key of "
+            f"{[column.key for column in pk_columns]} where a single key "
+            "column is required"
+        )
+    return pk_columns[0]
+
+
+def _is_collection(value: typing.Any) -> bool:
+    return isinstance(value, IIterable) and not isinstance(value, (str, bytes))
+
+
+def composite_keys(id: typing.Any, depth: int) -> list[tuple]:
+    """
+    Normalize a single composite key, or an iterable of them, into a list
+    of unique key tuples in the order they were first given.
+    """
+    if (
+        isinstance(id, tuple)
+        and len(id) == depth
+        and not any(_is_collection(value) for value in id)
+    ):
+        return [id]
+    keys = list(dict.fromkeys(tuple(key) for key in id))
+    for key in keys:
+        if len(key) != depth:
+            raise ValueError(
+                f"Expected keys of {depth} values for a composite primary "
+                f"key, got {key!r}"
+            )
+    return keys
+
+
+def bulk_threshold_for(
+    database: Session, bulk_threshold: typing.Optional[int]
+) -> typing.Optional[int]:
+    """
+    Return the effective bulk id threshold for the session. Array parameters
+    are only available on PostgreSQL, other dialects always chunk.
+    """
+    if database.get_bind().dialect.name != "postgresql":
+        return None
+    return bulk_threshold
+
+
+def id_statements(
+    id: INT_SCALAR_OR_LIST,
+    *fields: str,
+    table: sa.Table,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    bulk_threshold: typing.Optional[int] = None,
+    partitions: int = 1,
+    **keyword_filters,
+) -> typing.Generator[tuple[sa.Select, PARAMS, int], None, None]:
+    """
+    Build the statements needed to query the given primary key(s). Id lists
+    above the bind parameter limit are split into multiple statements.
+
+    If ``bulk_threshold`` is given, id lists larger than it are instead
+    bound as a single ``bigint[]`` parameter and matched using
+    ``= ANY(...)``. This produces one statement and one query plan
+    regardless of the number of ids, or ``partitions`` statements if the
+    ids are to be spread across concurrent workers.
+
+    Tables with a composite primary key are looked up by key tuples using
+    ``(k1, k2) IN ((...), ...)``, chunked so every statement binds fewer
+    parameters than the limit. Above ``bulk_threshold`` the key columns
+    are instead bound as one array each and matched against their
+    ``unnest``.
+
+    Statements are cached templates, see :func:`statement_template`, and
+    every chunk shares the same statement.
+
+    Yields
+    ------
+    tuple[Select, dict, int]
+        The statement, its parameters and the maximum number of rows it can
+        return.
+    """
+    depth = len(primary_key_columns(table))
+    id_params: list[tuple[PARAMS, int]]
+    if depth > 1:
+        keys = composite_keys(id, depth)
+        if bulk_threshold is not None and len(keys) > bulk_threshold:
+            criterion = ID_ANY
+            chunk_size = -(-len(keys) // max(partitions, 1))
+            id_params = []
+            for chunk in chunkify(keys, chunk_size):
+                columns = zip(*chunk)
+                id_params.append(
+                    (
+                        {f"ids_{i}": list(c) for i, c in enumerate(columns)},
+                        len(chunk),
+                    )
+                )
+        else:
+            # Every key binds one parameter per column
+            criterion = ID_IN
+            id_params = [
+                ({"ids": chunk}, len(chunk))
+                for chunk in chunkify(keys, PARAMETER_LIMIT // depth)
+            ] or [({"ids": []}, 0)]
+    elif isinstance(id, IIterable) and not isinstance(id, str):
+        ids = list(set(map(int, id)))
+        if bulk_threshold is not None and len(ids) > bulk_threshold:
+            criterion = ID_ANY
+            chunk_size = -(-len(ids) // max(partitions, 1))
+        else:
+            # Stay below the parameter limit, chunkify if needed
+            criterion = ID_IN
+            chunk_size = PARAMETER_LIMIT
+        id_params = [
+            ({"ids": chunk}, len(chunk)) for chunk in chunkify(ids, chunk_size)
+        ] or [({"ids": []}, 0)]
+    else:
+        criterion = ID_EQ
+        id_params = [({"id": int(id)}, 1)]
+
+    q, params = bind_statement(
+        table, fields, criterion, expression_filters, keyword_filters
+    )
+    for id_param, size_hint in id_params:
+        yield q, {**params, **id_param}, size_hint
+
+
+def loc_statement(
+    ra: float,
+    dec: float,
+    radius: float,
+    *fields: str,
+    table: sa.Table,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    **keyword_filters,
+) -> tuple[sa.Select, PARAMS]:
+    """
+    Build a radial query statement using Q3C, along with its parameters.
+    """
+    q, params = bind_statement(
+        table, fields, CONE, expression_filters, keyword_filters
+    )
+    return q, {**params, "ra": ra, "dec": dec, "radius": radius}
+
+
+@instrument.instrumented
 @resolve_database
 def query_by_id(
     id: INT_SCALAR_OR_LIST,
@@ -99,79 +486,180 @@ def query_by_id(
     database: Session,
     table: sa.Table,
     expression_filters: typing.Optional[list[_CMPR]] = None,
+    output: str = arrays.ROWS,
+    bulk_threshold: typing.Optional[int] = BULK_ID_THRESHOLD,
+    workers: int = 1,
+    executor: str = parallel.THREAD,
+    cache: typing.Optional[ResultCache] = None,
+    copy: bool = False,
+    disk_cache: typing.Optional[DiskCache] = None,
     **keyword_filters,
-) -> typing.List[typing.Tuple]:
+):
     """
     Get TIC parameters by querying from primary key(s).
 
     Parameters
     ----------
     id: integer or iterable of integers
-        The primary key values to restrict the query to.
+        The primary key values to restrict the query to. For tables with a
+        composite primary key, a tuple of key values or an iterable of
+        them, in the order of the key columns.
     *fields: str
         Names of columns to return.
     expression_filters: BinaryExpression or list of BinaryExpressions
         Additional filters to use.
+    output: str
+        One of ``"rows"`` (default, a list of rows), ``"structured"`` (a
+        NumPy structured array), ``"columns"`` (a dictionary of NumPy
+        arrays keyed by field name) or ``"arrow"`` (a ``pyarrow.Table``).
+        Array dtypes and Arrow schemas are derived from the reflected column
+        types and require numpy or pyarrow to be installed.
+    bulk_threshold: int, optional
+        On PostgreSQL, id lists larger than this are bound as a single array
+        parameter (``= ANY(...)``) instead of being split into multiple
+        ``IN`` queries. Pass ``None`` to always use ``IN`` chunks.
+    workers: int
+        The maximum number of id chunks queried concurrently. Values above 1
+        execute chunks over a pool of connections, each with its own
+        session. Chunk results are merged in submission order, as with
+        sequential execution. As with any ``IN`` query, row order within
+        the merged result does not follow the order of the given ids.
+    executor: str
+        ``"thread"`` (default) or ``"process"``, the kind of pool used when
+        ``workers`` is above 1.
+    cache: ResultCache, optional
+        Serve the lookup through an in-process cache. Only ids which are not
+        already cached are queried. Rows are returned as named tuples in the
+        order of the given ids. Lookups using ``expression_filters`` bypass
+        the cache.
+    copy: bool
+        Fetch results through binary ``COPY`` instead of a cursor, see
+        :mod:`pyticdb.pgcopy`. Much faster for large array or Arrow
+        results of numeric columns. PostgreSQL only.
+    disk_cache: DiskCache, optional
+        Serve each statement through a persistent cache shared with other
+        processes, see :mod:`pyticdb.diskcache`. Only statements which are
+        not cached are executed.
     keyword_filters:
         Django like keywords to provide easy filtering without imports of
         TicEntry. Usage is such: ``column__operator=value`` which is
         interpreted like ``column operator value``. Where `operator` is the
         property within the standard library ``operator`` module.
     """
-    columns = [getattr(table.c, field) for field in fields]
-    q = sa.select(*columns)
-
-    filters: list[_CMPR] = []
-
-    pk_columns = list(table.primary_key)
-    depth = len(pk_columns)
-    if depth == 0:
-        # Attempt to recover by using a field called 'id'
-        try:
-            pk_columns = [table.c.id]
-            depth = 1
-        except AttributeError:
-            raise RuntimeError(
-                f"No primary key is specified on {database}: {table}. Attempts"
-                " to use a field called 'id' failed as well."
+    arrays.validate_output(output)
+    prefix = None
+    if cache is not None and expression_filters is None:
+        prefix = cache_prefix(database, table, fields, keyword_filters)
+    if cache is not None and prefix is not None:
+        pk_keys = [column.key for column in primary_key_columns(table)]
+        ids: typing.Sequence[typing.Hashable]
+        if len(pk_keys) > 1:
+            ids = composite_keys(id, len(pk_keys))
+        elif isinstance(id, IIterable) and not isinstance(id, str):
+            ids = list(dict.fromkeys(map(int, id)))
+        else:
+            ids = [int(id)]
+
+        def fetch(missing: list):
+            return query_by_id(
+                missing,
+                *pk_keys,
+                *fields,
+                database=database,
+                table=table,
+                bulk_threshold=bulk_threshold,
+                workers=workers,
+                executor=executor,
+                copy=copy,
+                disk_cache=disk_cache,
+                **keyword_filters,
             )
 
-    if depth == 1:
-        if isinstance(id, IIterable) and not isinstance(id, str):
-            ids = set(map(int, id))
-            if len(ids) > 65535:
-                # We're above parameter limit, chunkify and recursively
-                # get results:
-                payload = []
-                for chunk in chunkify(ids, 65535):
-                    payload.extend(
-                        query_by_id(
-                            chunk,
-                            *fields,
-                            database=database,
-                            table=table,
-                            expression_filters=expression_filters,
-                            **keyword_filters,
-                        )
-                    )
-                return payload
-            filters.append(pk_columns[0].in_(ids))
-        else:
-            filters.append(pk_columns[0] == int(id))
+        columns = [getattr(table.c, field) for field in fields]
+        return cached_lookup(
+            cache, prefix, ids, columns, fetch, output, key_length=len(pk_keys)
+        )
+
+    execute = pgcopy.copy_query if copy else execute_query
+    if disk_cache is not None:
+        execute = disk_cache.wrap(execute)
+    part_output = arrays.part_format(output)
+    statements = id_statements(
+        id,
+        *fields,
+        table=table,
+        expression_filters=expression_filters,
+        bulk_threshold=bulk_threshold_for(database, bulk_threshold),
+        partitions=workers,
+        **keyword_filters,
+    )
+    if workers > 1:
+        parts = parallel.execute_statements(
+            database,
+            statements,
+            execute,
+            output=part_output,
+            workers=workers,
+            executor=executor,
+        )
     else:
-        # Handle composite primary key
-        print(f"Cannot handle composite key of length {depth}: {pk_columns}")
-        raise NotImplementedError
+        parts = [
+            execute(
+                database,
+                q,
+                output=part_output,
+                size_hint=size_hint,
+                params=params,
+            )
+            for q, params, size_hint in statements
+        ]
+    return arrays.merge(parts, output)
 
-    if expression_filters is not None:
-        filters.extend(expression_filters)
 
-    q = apply_filters(q, table, filters, keyword_filters)
+@instrument.instrumented
+@resolve_database
+def iter_by_id(
+    id: INT_SCALAR_OR_LIST,
+    *fields: str,
+    database: Session,
+    table: sa.Table,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    batch_size: int = arrays.DEFAULT_BATCH_SIZE,
+    output: str = arrays.ROWS,
+    bulk_threshold: typing.Optional[int] = BULK_ID_THRESHOLD,
+    **keyword_filters,
+) -> typing.Generator[typing.Any, None, None]:
+    """
+    Streaming counterpart of :func:`query_by_id`. Results are yielded in
+    batches of at most ``batch_size`` rows using a server-side cursor, each
+    parameter-limited chunk of ids is streamed out as soon as it is
+    executed.
 
-    with database as db:
-        return list(db.execute(q).fetchall())
+    With ``output="arrow"`` each batch is a ``pyarrow.RecordBatch`` which
+    may be streamed to disk with :func:`pyticdb.arrow.to_parquet`.
 
+    Parameters
+    ----------
+    batch_size: int
+        The maximum number of rows held by each yielded batch.
 
+    See :func:`query_by_id` for the remaining parameters.
+    """
+    arrays.validate_output(output)
+    for q, params, _ in id_statements(
+        id,
+        *fields,
+        table=table,
+        expression_filters=expression_filters,
+        bulk_threshold=bulk_threshold_for(database, bulk_threshold),
+        **keyword_filters,
+    ):
+        yield from stream_query(
+            database, q, batch_size=batch_size, output=output, params=params
+        )
+
+
+@instrument.instrumented
 @resolve_database
 def query_by_loc(
     ra: float,
@@ -181,8 +669,11 @@ def query_by_loc(
     database: Session,
     table: sa.Table,
     expression_filters: typing.Optional[list[_CMPR]] = None,
+    output: str = arrays.ROWS,
+    copy: bool = False,
+    disk_cache: typing.Optional[DiskCache] = None,
     **keyword_filters,
-) -> typing.List[typing.Tuple]:
+):
     """
     Get TIC parameters by a radial query.
 
@@ -198,38 +689,121 @@ def query_by_loc(
         Names of columns to return.
     expression_filters: BinaryExpression or list of BinaryExpressions
         Additional filters to use.
+    output: str
+        One of ``"rows"`` (default, a list of rows), ``"structured"`` (a
+        NumPy structured array), ``"columns"`` (a dictionary of NumPy
+        arrays keyed by field name) or ``"arrow"`` (a ``pyarrow.Table``).
+        Array dtypes and Arrow schemas are derived from the reflected column
+        types and require numpy or pyarrow to be installed.
+    copy: bool
+        Fetch results through binary ``COPY``, see :func:`query_by_id`.
+    disk_cache: DiskCache, optional
+        Serve the query through a persistent cache, see
+        :func:`query_by_id`.
     keyword_filters:
         Django like keywords to provide easy filtering without imports of
         TicEntry. Usage is such: ``column__operator=value`` which is
         interpreted like ``column operator value``. Where `operator` is the
         property within the standard library ``operator`` module.
     """
-    columns = [getattr(table.c, field) for field in fields]
-    q = sa.select(*columns)
-
-    filters: list[_CMPR] = [
-        sa.func.q3c_radial_query(table.c.ra, table.c.dec, ra, dec, radius)
-    ]
-
-    if expression_filters is not None:
-        filters.extend(expression_filters)
-
-    q = apply_filters(q, table, filters, keyword_filters)
+    arrays.validate_output(output)
+    q, params = loc_statement(
+        ra,
+        dec,
+        radius,
+        *fields,
+        table=table,
+        expression_filters=expression_filters,
+        **keyword_filters,
+    )
+    execute = pgcopy.copy_query if copy else execute_query
+    if disk_cache is not None:
+        execute = disk_cache.wrap(execute)
+    return execute(database, q, output=output, params=params)
+
+
+@instrument.instrumented
+@resolve_database
+def iter_by_loc(
+    ra: float,
+    dec: float,
+    radius: float,
+    *fields: str,
+    database: Session,
+    table: sa.Table,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    batch_size: int = arrays.DEFAULT_BATCH_SIZE,
+    output: str = arrays.ROWS,
+    **keyword_filters,
+) -> typing.Generator[typing.Any, None, None]:
+    """
+    Streaming counterpart of :func:`query_by_loc`. Results are yielded in
+    batches of at most ``batch_size`` rows using a server-side cursor so
+    large cones can be consumed in constant memory.
 
-    with database as db:
-        return list(db.execute(q).fetchall())
+    With ``output="arrow"`` each batch is a ``pyarrow.RecordBatch`` which
+    may be streamed to disk with :func:`pyticdb.arrow.to_parquet`.
 
+    Parameters
+    ----------
+    batch_size: int
+        The maximum number of rows held by each yielded batch.
 
+    See :func:`query_by_loc` for the remaining parameters.
+    """
+    arrays.validate_output(output)
+    q, params = loc_statement(
+        ra,
+        dec,
+        radius,
+        *fields,
+        table=table,
+        expression_filters=expression_filters,
+        **keyword_filters,
+    )
+    yield from stream_query(
+        database, q, batch_size=batch_size, output=output, params=params
+    )
+
+
+@instrument.instrumented
 @resolve_database
-def query_raw(sql, database: Session, table: sa.Table) -> typing.List[typing.Tuple]:
+def query_raw(
+    sql,
+    database: Session,
+    table: sa.Table,
+    copy: bool = False,
+    disk_cache: typing.Optional[DiskCache] = None,
+) -> typing.List[typing.Tuple]:
     """
     Pass a raw sql string to interpret. The provided text is assumed to be safe
     and no sanitization is performed! Use with caution!
+
+    With ``copy=True`` rows are fetched through binary ``COPY`` and with
+    ``disk_cache`` served through a persistent cache, see
+    :func:`query_by_id`.
     """
     q = sa.text(sql)
+    execute = pgcopy.copy_query if copy else execute_query
+    if disk_cache is not None:
+        execute = disk_cache.wrap(execute)
+    return execute(database, q)
 
-    with database as db:
-        return list(db.execute(q).fetchall())
+
+@instrument.instrumented
+@resolve_database
+def iter_raw(
+    sql,
+    database: Session,
+    table: sa.Table,
+    batch_size: int = arrays.DEFAULT_BATCH_SIZE,
+) -> typing.Generator[typing.List[typing.Tuple], None, None]:
+    """
+    Streaming counterpart of :func:`query_raw`, rows are yielded in batches
+    of at most ``batch_size`` using a server-side cursor. The provided text
+    is assumed to be safe and no sanitization is performed!
+    """
+    yield from stream_query(database, sa.text(sql), batch_size=batch_size)
 
 
 @resolve_database
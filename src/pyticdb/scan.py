@@ -0,0 +1,219 @@
+"""
+Full table scans paged by primary key.
+
+Each page is a short statement of the form
+``WHERE pk > :after AND pk <= :upper ORDER BY pk LIMIT :page_size`` which
+the server answers from the primary key index. Unlike ``OFFSET`` pages the
+cost of a page does not grow with its position, and unlike a single
+server-side cursor no statement or transaction stays open for the length of
+the scan, so scans may run for hours and survive dropped connections.
+"""
+
+import typing
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from pyticdb import arrays, instrument, parallel
+from pyticdb.conn import bound_engine
+from pyticdb.query import (
+    _CMPR,
+    DEFAULT_RETRIES,
+    PARAMS,
+    apply_filters,
+    execute_retrying,
+    primary_key_column,
+    resolve_database,
+)
+
+DEFAULT_PAGE_SIZE = 50_000
+
+
+def key_ranges(
+    lower: typing.Any, upper: typing.Any, partitions: int
+) -> list[tuple[typing.Any, typing.Any]]:
+    """
+    Split the inclusive key range between ``lower`` and ``upper`` into at
+    most ``partitions`` contiguous, inclusive ranges of equal width.
+    Non-integer keys cannot be split and are returned as a single range.
+    """
+    if not isinstance(lower, int) or not isinstance(upper, int):
+        return [(lower, upper)]
+    partitions = max(1, min(partitions, upper - lower + 1))
+    bounds = [
+        lower + (upper - lower + 1) * i // partitions
+        for i in range(partitions + 1)
+    ]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(partitions)]
+
+
+def page_statements(
+    *fields: str,
+    table: sa.Table,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    **keyword_filters,
+) -> tuple[sa.Select, sa.Select]:
+    """
+    Build the statements of the first and following pages of a key range.
+    The first page is bound by ``lower`` and ``upper``, following pages by
+    the last key of the previous page, ``after``, and ``upper``. Both
+    select the primary key first when it is not among ``fields``.
+    """
+    pk = primary_key_column(table)
+    columns = [getattr(table.c, field) for field in fields]
+    if not any(column is pk for column in columns):
+        columns.insert(0, pk)
+
+    q = sa.select(*columns).where(pk <= sa.bindparam("upper", type_=pk.type))
+    q = apply_filters(
+        q, table, list(expression_filters or []), keyword_filters
+    )
+    q = q.order_by(pk).limit(page_size)
+    first = q.where(pk >= sa.bindparam("lower", type_=pk.type))
+    following = q.where(pk > sa.bindparam("after", type_=pk.type))
+    return first, following
+
+
+def last_key(page, key: str, output: str) -> typing.Any:
+    """
+    The primary key of the last row of a non-empty page gathered in
+    ``arrays.part_format(output)``.
+    """
+    if output == arrays.ROWS:
+        return page[-1]._mapping[key]
+    if output == arrays.ARROW:
+        return page.column(key)[-1].as_py()
+    return page[key][-1].item()
+
+
+@instrument.instrumented
+@resolve_database
+def scan_table(
+    *fields: str,
+    database: Session,
+    table: sa.Table,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    output: str = arrays.ROWS,
+    workers: int = 1,
+    executor: str = parallel.THREAD,
+    lower: typing.Any = None,
+    upper: typing.Any = None,
+    retries: int = DEFAULT_RETRIES,
+    **keyword_filters,
+) -> typing.Generator[typing.Any, None, None]:
+    """
+    Scan a whole table, yielding pages of at most ``page_size`` rows in
+    primary key order using keyset pagination.
+
+    The primary key is discovered as in :func:`pyticdb.query.query_by_id`,
+    falling back to a column named ``id``, and is selected first if it is
+    not among ``fields``.
+
+    Parameters
+    ----------
+    *fields: str
+        Names of columns to return.
+    expression_filters: list of BinaryExpressions
+        Additional filters to use.
+    page_size: int
+        The maximum number of rows of each page.
+    output: str
+        One of ``"rows"``, ``"structured"``, ``"columns"`` or ``"arrow"``.
+        See :func:`pyticdb.query.query_by_id`.
+    workers: int
+        Split the key range into this many equal width ranges which are
+        paged through concurrently, each over its own connection. Pages are
+        then yielded in completion order rather than key order. Only
+        integer keys can be split.
+    executor: str
+        ``"thread"`` or ``"process"``, see
+        :func:`pyticdb.parallel.execute_statements`.
+    lower, upper: optional
+        Inclusive bounds of the keys to scan, by default the smallest and
+        largest key of the table. An interrupted scan with a single worker
+        can be resumed by passing the last key it yielded plus one.
+    retries: int
+        How many times a page failing with an operational error is retried.
+    keyword_filters:
+        Django like keywords, see :func:`pyticdb.query.query_by_id`.
+
+    Examples
+    --------
+    >>> for page in scan_table("id", "tmag", tmag__lt=16, workers=8):
+    ...     process(page)
+    """
+    arrays.validate_output(output)
+    pk = primary_key_column(table)
+    if lower is None or upper is None:
+        with database as db:
+            key_min, key_max = db.execute(
+                sa.select(sa.func.min(pk), sa.func.max(pk))
+            ).one()
+        lower = key_min if lower is None else lower
+        upper = key_max if upper is None else upper
+    if lower is None or upper is None or lower > upper:
+        return
+
+    first, following = page_statements(
+        *fields,
+        table=table,
+        page_size=page_size,
+        expression_filters=expression_filters,
+        **keyword_filters,
+    )
+    part_output = arrays.part_format(output)
+    execute = partial(execute_retrying, retries=retries)
+
+    def page_after(key_range, after=None) -> tuple[sa.Select, PARAMS]:
+        if after is None:
+            return first, {"lower": key_range[0], "upper": key_range[1]}
+        return following, {"after": after, "upper": key_range[1]}
+
+    ranges = key_ranges(lower, upper, workers)
+    if len(ranges) == 1:
+        q, params = page_after(ranges[0])
+        while True:
+            page = execute(database, q, output=part_output, params=params)
+            if len(page):
+                yield arrays.merge([page], output)
+            if len(page) < page_size:
+                return
+            q, params = page_after(ranges[0], last_key(page, pk.key, output))
+
+    engine = bound_engine(database)
+    pool = parallel.make_executor(engine, workers, executor)
+    try:
+        pending = {}
+        for key_range in ranges:
+            q, params = page_after(key_range)
+            future = parallel.submit(
+                pool, engine, executor, execute, q, params, part_output, None
+            )
+            pending[future] = key_range
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key_range = pending.pop(future)
+                page = future.result()
+                if len(page) == page_size:
+                    after = last_key(page, pk.key, output)
+                    q, params = page_after(key_range, after)
+                    future = parallel.submit(
+                        pool,
+                        engine,
+                        executor,
+                        execute,
+                        q,
+                        params,
+                        part_output,
+                        None,
+                    )
+                    pending[future] = key_range
+                if len(page):
+                    yield arrays.merge([page], output)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
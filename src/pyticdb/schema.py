@@ -0,0 +1,294 @@
+"""
+Persistent on-disk caching of reflected schemas.
+
+Reflecting a large catalog issues many queries against the server's system
+catalogs. The results rarely change, so reflected metadata is pickled to
+disk and reused by later processes as long as the schema fingerprint of the
+remote database still matches.
+"""
+
+import hashlib
+import os
+import pathlib
+import pickle
+import tempfile
+import threading
+import time
+import typing
+
+import sqlalchemy as sa
+from loguru import logger
+
+from pyticdb import instrument
+
+# Key of ``MetaData.info`` recording whether a cached schema is complete
+COMPLETE_SCHEMA = "pyticdb_complete_schema"
+
+_PG_FINGERPRINT = """
+    SELECT md5(
+        coalesce(
+            string_agg(
+                table_name || '.' || column_name || ':' || data_type
+                || ':' || is_nullable,
+                ',' ORDER BY table_name, ordinal_position
+            ),
+            ''
+        )
+    )
+    FROM information_schema.columns
+    WHERE table_schema = current_schema()
+"""
+
+
+def schema_fingerprint(
+    engine: sa.Engine, only: typing.Optional[typing.Sequence[str]] = None
+) -> str:
+    """
+    Compute a cheap fingerprint of the remote schema: the name, type and
+    nullability of every column. On PostgreSQL this is a single aggregate
+    over ``information_schema.columns``, other dialects fingerprint the
+    columns reported by the inspector.
+
+    Parameters
+    ----------
+    engine: Engine
+        The engine to fingerprint.
+    only: sequence of str, optional
+        Restrict the fingerprint to the given tables.
+    """
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            if only is None:
+                q = sa.text(_PG_FINGERPRINT)
+                return conn.execute(q).scalar_one()
+            q = sa.text(_PG_FINGERPRINT + "AND table_name = ANY(:only)")
+            return conn.execute(q, {"only": sorted(only)}).scalar_one()
+
+        inspector = sa.inspect(conn)
+        names = inspector.get_table_names()
+        if only is not None:
+            names = [name for name in names if name in only]
+        columns = (
+            inspector.get_multi_columns(filter_names=names) if names else {}
+        )
+        digest = hashlib.md5()
+        for (_, table), reflected in sorted(columns.items()):
+            for column in reflected:
+                digest.update(
+                    f"{table}.{column['name']}:{column['type']}:"
+                    f"{column['nullable']},".encode()
+                )
+        return digest.hexdigest()
+
+
+class SchemaCache:
+    """
+    Stores reflected ``MetaData`` as pickles within a directory, one file
+    per cache name.
+
+    Parameters
+    ----------
+    directory: pathlib.Path
+        Where cached schemas are written.
+    ttl: float, optional
+        Number of seconds a cached schema is trusted without verifying its
+        fingerprint against the server. By default the fingerprint is always
+        verified.
+    """
+
+    def __init__(
+        self, directory: pathlib.Path, ttl: typing.Optional[float] = None
+    ):
+        self.directory = pathlib.Path(directory)
+        self.ttl = ttl
+
+    def path_for(self, name: str) -> pathlib.Path:
+        digest = hashlib.sha1(name.encode()).hexdigest()[:16]
+        return self.directory / f"{digest}.pickle"
+
+    def load(
+        self,
+        name: str,
+        engine: sa.Engine,
+        only: typing.Optional[typing.Sequence[str]] = None,
+    ) -> typing.Optional[sa.MetaData]:
+        """
+        Return the cached metadata for ``name`` if it exists, covers the
+        requested tables and is still valid. Otherwise return None.
+        """
+        path = self.path_for(name)
+        try:
+            with open(path, "rb") as fin:
+                entry = pickle.load(fin)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning(f"Ignoring unreadable schema cache {path}")
+            return None
+
+        metadata: sa.MetaData = entry["metadata"]
+        metadata.info[COMPLETE_SCHEMA] = entry["complete"]
+        if only is None and not entry["complete"]:
+            return None
+        if only is not None and not set(only).issubset(metadata.tables):
+            return None
+
+        age = time.time() - entry["created"]
+        if self.ttl is not None and age < self.ttl:
+            logger.debug(f"Using schema cache {path} ({age:.0f}s old)")
+            return metadata
+
+        tables = None if entry["complete"] else list(metadata.tables)
+        if schema_fingerprint(engine, only=tables) != entry["fingerprint"]:
+            logger.debug(f"Schema cache {path} is stale")
+            return None
+
+        logger.debug(f"Using verified schema cache {path}")
+        return metadata
+
+    def save(
+        self,
+        name: str,
+        engine: sa.Engine,
+        metadata: sa.MetaData,
+        complete: bool,
+    ):
+        """
+        Persist the metadata for ``name``. ``complete`` indicates whether
+        the entire schema was reflected. The file is written atomically so
+        concurrent processes never observe a partial cache.
+        """
+        tables = None if complete else list(metadata.tables)
+        entry = {
+            "created": time.time(),
+            "complete": complete,
+            "fingerprint": schema_fingerprint(engine, only=tables),
+            "metadata": metadata,
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(name)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fout:
+                pickle.dump(entry, fout, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def invalidate(self, name: typing.Optional[str] = None):
+        """
+        Remove the cached schema for ``name``, or every cached schema if no
+        name is given.
+        """
+        if name is not None:
+            self.path_for(name).unlink(missing_ok=True)
+            return
+        for path in self.directory.glob("*.pickle"):
+            path.unlink(missing_ok=True)
+
+
+class LazyTables(typing.Mapping[str, sa.Table]):
+    """
+    Mapping of table names to tables which reflects a table the first time
+    it is requested. Iterating over the mapping reflects every table.
+    """
+
+    def __init__(self, lazy_metadata: "LazyMetaData"):
+        self._lazy = lazy_metadata
+
+    def __getitem__(self, name: str) -> sa.Table:
+        self._lazy.reflect(only=[name])
+        try:
+            return self._lazy.metadata.tables[name]
+        except KeyError:
+            raise KeyError(name)
+
+    def __contains__(self, name) -> bool:
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        self._lazy.reflect()
+        return iter(self._lazy.metadata.tables)
+
+    def __len__(self) -> int:
+        self._lazy.reflect()
+        return len(self._lazy.metadata.tables)
+
+
+class LazyMetaData:
+    """
+    A proxy of ``MetaData`` which reflects tables incrementally, only when
+    they are first accessed through ``tables``. Other attributes are
+    delegated to the underlying ``MetaData`` as reflected so far.
+
+    Parameters
+    ----------
+    engine: Engine
+        The engine used to reflect tables.
+    metadata: MetaData, optional
+        Previously reflected metadata to extend, such as one loaded from a
+        ``SchemaCache``.
+    complete: bool
+        Whether ``metadata`` already holds the entire schema.
+    on_reflect: callable, optional
+        Called with this proxy after new tables have been reflected.
+    """
+
+    def __init__(
+        self,
+        engine: sa.Engine,
+        metadata: typing.Optional[sa.MetaData] = None,
+        complete: bool = False,
+        on_reflect: typing.Optional[
+            typing.Callable[["LazyMetaData"], None]
+        ] = None,
+    ):
+        self.engine = engine
+        self.metadata = sa.MetaData() if metadata is None else metadata
+        self.complete = complete
+        self.on_reflect = on_reflect
+        self.reflection_time = 0.0
+        self._lock = threading.RLock()
+
+    @property
+    def tables(self) -> LazyTables:
+        return LazyTables(self)
+
+    def reflect(self, only: typing.Optional[typing.Sequence[str]] = None):
+        """
+        Reflect the given tables, or the entire schema, if they have not
+        been reflected already.
+        """
+        with self._lock:
+            if self.complete:
+                return
+            if only is not None:
+                only = [n for n in only if n not in self.metadata.tables]
+                if not only:
+                    return
+
+            t0 = time.perf_counter()
+            try:
+                self.metadata.reflect(bind=self.engine, only=only)
+            except sa.exc.InvalidRequestError:
+                # Requested tables do not exist
+                return
+            elapsed = time.perf_counter() - t0
+            self.reflection_time += elapsed
+            instrument.record(instrument.REFLECT, elapsed)
+            self.complete = only is None
+            logger.debug(
+                f"Reflected {'all tables' if only is None else only} of "
+                f"{self.engine.url.database} in {elapsed:.3f}s"
+            )
+
+        if self.on_reflect is not None:
+            self.on_reflect(self)
+
+    def __getattr__(self, name: str):
+        return getattr(self.metadata, name)
@@ -0,0 +1,198 @@
+"""
+Distribution of query results to worker processes through shared memory.
+
+Pools of workers processing the same slice of a catalog would otherwise
+each query it, and each hold a private copy of it. Instead the parent
+process queries the slice once with :func:`share_query`, which copies the
+structured array result into a ``multiprocessing.shared_memory`` segment
+and returns a small, picklable :class:`SharedArray` handle. Workers receive
+the handle and :meth:`SharedArray.attach` to the segment by name, mapping
+the result without copying it.
+
+Only fixed width dtypes can be placed in shared memory, text columns
+decoded as Python objects must be left out of shared queries. Segments
+registered by the publishing process are unlinked by it; workers must be
+started by that process, as multiprocessing pools are.
+"""
+
+import dataclasses
+import threading
+import typing
+from multiprocessing.shared_memory import SharedMemory
+
+from loguru import logger
+
+from pyticdb import arrays
+
+# Segments mapped by this process, kept open while arrays view them
+_SEGMENTS: dict[str, SharedMemory] = {}
+_LOCK = threading.Lock()
+
+
+def _segment(name: str) -> SharedMemory:
+    with _LOCK:
+        try:
+            return _SEGMENTS[name]
+        except KeyError:
+            segment = _SEGMENTS[name] = SharedMemory(name=name)
+            return segment
+
+
+@dataclasses.dataclass(frozen=True)
+class SharedArray:
+    """
+    A handle on a structured array published in shared memory. Handles are
+    cheap to pickle and may be sent to worker processes.
+
+    Used as a context manager the segment is unlinked on exit, once the
+    workers using it are done.
+
+    Examples
+    --------
+    >>> with share_query(query_by_loc, ra, dec, 12.0, "id", "tmag") as stars:
+    ...     with ProcessPoolExecutor() as pool:
+    ...         results = list(pool.map(work, [stars] * n_tasks, tasks))
+    >>> # In each worker
+    >>> def work(stars, task):
+    ...     tmag = stars.attach(output="columns")["tmag"]
+    """
+
+    name: str
+    dtype: "arrays.np.dtype"
+    shape: tuple[int, ...]
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, *exc):
+        self.unlink()
+
+    def attach(self, output: str = arrays.STRUCTURED):
+        """
+        Map the published array into this process without copying it. The
+        returned arrays are read-only views of the shared segment.
+
+        Parameters
+        ----------
+        output: str
+            ``"structured"`` (default) for the structured array or
+            ``"columns"`` for a dictionary of its fields.
+        """
+        if output not in (arrays.STRUCTURED, arrays.COLUMNS):
+            raise ValueError(
+                f"Shared arrays are attached as {arrays.STRUCTURED!r} or "
+                f"{arrays.COLUMNS!r}, got {output!r}"
+            )
+        segment = _segment(self.name)
+        array = arrays.np.ndarray(
+            self.shape, dtype=self.dtype, buffer=segment.buf
+        )
+        array.flags.writeable = False
+        return arrays.convert(array, output)
+
+    def unlink(self):
+        """
+        Free the segment once every process has closed it. Called by the
+        publishing process after the workers are done.
+
+        Arrays attached by this process stay valid, the segment is only
+        closed here if none of them remain.
+        """
+        segment = _segment(self.name)
+        segment.unlink()
+        with _LOCK:
+            try:
+                segment.close()
+            except BufferError:
+                logger.debug(
+                    f"Shared array {self.name} is still viewed, keeping it "
+                    "mapped"
+                )
+            else:
+                del _SEGMENTS[self.name]
+
+
+def _fill(
+    segment: SharedMemory,
+    dtype: "arrays.np.dtype",
+    shape: tuple[int, ...],
+    columns: dict[str, "arrays.np.ndarray"],
+):
+    shared = arrays.np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+    try:
+        for name, column in columns.items():
+            shared[name] = column
+    finally:
+        # The view must be released before the segment can be closed
+        del shared
+
+
+def share(result) -> SharedArray:
+    """
+    Copy a structured array, or a dictionary of equally long column arrays,
+    into a new shared memory segment.
+
+    Returns
+    -------
+    SharedArray
+        The picklable handle on the published array.
+    """
+    arrays.require_numpy()
+    np = arrays.np
+    if isinstance(result, dict):
+        dtype = np.dtype(
+            [(name, array.dtype) for name, array in result.items()]
+        )
+        columns = result
+        lengths = {name: len(array) for name, array in result.items()}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(
+                f"Columns must be equally long to be shared, got {lengths}"
+            )
+        shape = (next(iter(lengths.values()), 0),)
+    elif isinstance(result, np.ndarray) and result.dtype.names:
+        dtype = result.dtype
+        columns = {name: result[name] for name in dtype.names or ()}
+        shape = result.shape
+    else:
+        raise TypeError(
+            "Only structured arrays and dictionaries of columns can be "
+            f"shared, got {type(result).__name__}"
+        )
+    if dtype.hasobject:
+        objects = [name for name in dtype.names or () if dtype[name].hasobject]
+        raise ValueError(
+            f"Columns {objects} hold Python objects and cannot be placed in "
+            "shared memory"
+        )
+
+    # Segments cannot be empty
+    segment = SharedMemory(
+        create=True, size=max(dtype.itemsize * int(np.prod(shape)), 1)
+    )
+    with _LOCK:
+        _SEGMENTS[segment.name] = segment
+    try:
+        _fill(segment, dtype, shape, columns)
+    except BaseException:
+        with _LOCK:
+            del _SEGMENTS[segment.name]
+        segment.close()
+        segment.unlink()
+        raise
+    return SharedArray(segment.name, dtype, shape)
+
+
+def share_query(query: typing.Callable, *args, **kwargs) -> SharedArray:
+    """
+    Run a query once, such as :func:`pyticdb.query_by_loc`, and publish its
+    structured array result in shared memory.
+
+    Parameters
+    ----------
+    query: callable
+        A query function accepting ``output="structured"``.
+    *args, **kwargs:
+        Passed on to ``query``.
+    """
+    return share(query(*args, output=arrays.STRUCTURED, **kwargs))
@@ -0,0 +1,367 @@
+"""
+Local, memory-mapped, columnar snapshots of catalog tables.
+
+A snapshot is a directory holding one ``.npy`` file per exported column with
+rows sorted by primary key, along with a zone index for spatial queries. The
+sky is split into declination zones of fixed height and rows are ordered by
+zone then right ascension, so a cone search only inspects the few zones and
+right ascension ranges overlapping the cone.
+
+Snapshots are opened with ``numpy.load(mmap_mode="r")`` so many processes
+may share a single read-only copy, for example on a parallel filesystem,
+without loading it into memory or contacting the database.
+"""
+
+import datetime
+import json
+import operator
+import pathlib
+import typing
+
+import sqlalchemy as sa
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from pyticdb import arrays
+from pyticdb.arrays import np
+from pyticdb.cache import row_type
+from pyticdb.query import (
+    _CMPR,
+    INT_SCALAR_OR_LIST,
+    apply_filters,
+    primary_key_column,
+    resolve_database,
+    stream_query,
+)
+
+META_NAME = "snapshot.json"
+ZONE_ORDER = "_zone_order.npy"
+ZONE_RA = "_zone_ra.npy"
+ZONE_OFFSETS = "_zone_offsets.npy"
+DEFAULT_ZONE_HEIGHT = 0.1
+
+
+def _snapshot_dtype(
+    database: Session,
+    q: sa.Select,
+    columns: typing.Sequence[sa.ColumnElement],
+) -> "np.dtype":
+    """
+    Determine the on-disk dtype of the exported columns. Text columns are
+    stored as fixed width unicode sized by their longest value.
+    """
+    dtype = arrays.structured_dtype(columns)
+    text_columns = [
+        str(column.key)
+        for column in columns
+        if dtype[str(column.key)] == np.dtype(object)
+        and isinstance(column.type, sa.String)
+    ]
+    widths = {}
+    if text_columns:
+        subquery = q.subquery()
+        lengths = sa.select(
+            *[
+                sa.func.max(sa.func.length(subquery.c[name])).label(name)
+                for name in text_columns
+            ]
+        )
+        with database as db:
+            widths = db.execute(lengths).one()._asdict()
+
+    fields: list[tuple[str, typing.Union[str, np.dtype]]] = []
+    for name in dtype.names or ():
+        if name in widths:
+            fields.append((name, f"U{max(widths[name] or 0, 1)}"))
+        elif dtype[name] == np.dtype(object):
+            raise ValueError(
+                f"Column {name} of type {dtype[name]} cannot be stored in a "
+                "snapshot"
+            )
+        else:
+            fields.append((name, dtype[name]))
+    return np.dtype(fields)
+
+
+def build_zone_index(
+    ra: "np.ndarray", dec: "np.ndarray", zone_height: float
+) -> tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    Order rows by declination zone and right ascension.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        The row permutation in zone order, the right ascension of rows in
+        zone order and the offset of each zone within that order. Rows
+        without a position are placed after the last zone.
+    """
+    n_zones = int(np.ceil(180 / zone_height))
+    valid = np.isfinite(ra) & np.isfinite(dec)
+    zone = np.full(ra.shape, n_zones, dtype=np.int64)
+    zone[valid] = np.clip(
+        ((dec[valid] + 90) // zone_height).astype(np.int64), 0, n_zones - 1
+    )
+    order = np.lexsort((ra, zone))
+    offsets = np.searchsorted(zone[order], np.arange(n_zones + 1))
+    return order, np.asarray(ra)[order], offsets
+
+
+@resolve_database
+def export_snapshot(
+    path: typing.Union[str, pathlib.Path],
+    *fields: str,
+    database: Session,
+    table: sa.Table,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    zone_height: float = DEFAULT_ZONE_HEIGHT,
+    batch_size: int = arrays.DEFAULT_BATCH_SIZE,
+    **keyword_filters,
+) -> "Snapshot":
+    """
+    Export columns of a table to a local snapshot directory. The primary key
+    and ``ra``/``dec`` are always exported.
+
+    Rows are streamed from the server in primary key order and written
+    directly into memory-mapped column files, the zone index is built once
+    all rows are written.
+
+    Parameters
+    ----------
+    path: str or pathlib.Path
+        The directory to write the snapshot to.
+    *fields: str
+        Names of additional columns to export.
+    zone_height: float
+        The height, in degrees, of the declination zones of the spatial
+        index.
+    batch_size: int
+        The number of rows streamed per batch.
+    """
+    path = pathlib.Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    pk_column = primary_key_column(table)
+    names = list(dict.fromkeys([pk_column.key, "ra", "dec", *fields]))
+    columns = [getattr(table.c, name) for name in names]
+    filters = list(expression_filters or [])
+    q = apply_filters(sa.select(*columns), table, filters, keyword_filters)
+
+    dtype = _snapshot_dtype(database, q, columns)
+    with database as db:
+        count = db.execute(
+            sa.select(sa.func.count()).select_from(q.subquery())
+        ).scalar_one()
+
+    logger.info(f"Exporting {count} rows of {table} to {path}")
+    outputs = {
+        name: np.lib.format.open_memmap(
+            path / f"{name}.npy", mode="w+", dtype=dtype[name], shape=(count,)
+        )
+        for name in names
+    }
+    n_rows = 0
+    for batch in stream_query(
+        database,
+        q.order_by(pk_column),
+        batch_size=batch_size,
+        output=arrays.STRUCTURED,
+    ):
+        stop = n_rows + len(batch)
+        if stop > count:
+            raise RuntimeError(f"{table} changed while being exported")
+        for name, column in outputs.items():
+            column[n_rows:stop] = batch[name]
+        n_rows = stop
+
+    if n_rows != count:
+        raise RuntimeError(f"{table} changed while being exported")
+
+    for column in outputs.values():
+        column.flush()
+
+    order, zone_ra, offsets = build_zone_index(
+        outputs["ra"], outputs["dec"], zone_height
+    )
+    np.save(path / ZONE_ORDER, order)
+    np.save(path / ZONE_RA, zone_ra)
+    np.save(path / ZONE_OFFSETS, offsets)
+
+    meta = {
+        "table": table.fullname,
+        "key": pk_column.key,
+        "count": count,
+        "columns": names,
+        "zone_height": zone_height,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    with open(path / META_NAME, "w") as fout:
+        json.dump(meta, fout, indent=2)
+
+    return Snapshot(path)
+
+
+def angular_separation(
+    ra1: "np.ndarray", dec1: "np.ndarray", ra2: float, dec2: float
+) -> "np.ndarray":
+    """
+    Great circle separation in degrees using the haversine formula.
+    """
+    ra1, dec1 = np.radians(ra1), np.radians(dec1)
+    ra2, dec2 = np.radians(ra2), np.radians(dec2)
+    sin_ddec = np.sin((dec1 - dec2) / 2)
+    sin_dra = np.sin((ra1 - ra2) / 2)
+    a = sin_ddec**2 + np.cos(dec1) * np.cos(dec2) * sin_dra**2
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(a, 0, 1))))
+
+
+class Snapshot:
+    """
+    A read-only, memory-mapped, catalog snapshot created by
+    :func:`export_snapshot`.
+
+    Queries mirror :func:`pyticdb.query_by_id` and
+    :func:`pyticdb.query_by_loc` but are answered locally. Keyword filters
+    are supported, SQL expression filters are not.
+
+    Examples
+    --------
+    >>> snapshot = Snapshot("/scratch/tic_82")
+    >>> stars = snapshot.query_by_id(ids, "tmag", output="columns")
+    >>> nearby = snapshot.query_by_loc(120.0, -45.0, 0.2, "id", "tmag")
+    """
+
+    def __init__(self, path: typing.Union[str, pathlib.Path]):
+        arrays.require_numpy()
+        self.path = pathlib.Path(path)
+        with open(self.path / META_NAME) as fin:
+            self.meta = json.load(fin)
+        self.key = self.meta["key"]
+        self.zone_height = self.meta["zone_height"]
+        self.columns = {
+            name: np.load(self.path / f"{name}.npy", mmap_mode="r")
+            for name in self.meta["columns"]
+        }
+        self._zone_order = np.load(self.path / ZONE_ORDER, mmap_mode="r")
+        self._zone_ra = np.load(self.path / ZONE_RA, mmap_mode="r")
+        self._zone_offsets = np.load(self.path / ZONE_OFFSETS)
+
+    def __len__(self) -> int:
+        return self.meta["count"]
+
+    def _filter(
+        self, rows: "np.ndarray", keyword_filters: dict[str, typing.Any]
+    ) -> "np.ndarray":
+        for kwarg, value in keyword_filters.items():
+            col_name, op_name = kwarg.split("__")
+            op = getattr(operator, op_name)
+            column = self.columns[col_name][rows]
+            rows = rows[np.asarray(op(column, value), dtype=bool)]
+        return rows
+
+    def _result(
+        self, rows: "np.ndarray", fields: typing.Sequence[str], output: str
+    ):
+        arrays.validate_output(output)
+        if output == arrays.ROWS:
+            make_row = row_type(fields)._make
+            values = zip(
+                *[self.columns[name][rows].tolist() for name in fields]
+            )
+            return [make_row(value) for value in values]
+
+        dtype = np.dtype([(name, self.columns[name].dtype) for name in fields])
+        array = np.empty(len(rows), dtype=dtype)
+        for name in fields:
+            array[name] = self.columns[name][rows]
+        return arrays.convert(array, output)
+
+    def rows_by_id(self, id: INT_SCALAR_OR_LIST) -> "np.ndarray":
+        """
+        Return the row positions of the given primary keys, in the order
+        given. Unknown keys are skipped.
+        """
+        if isinstance(id, typing.Iterable) and not isinstance(id, np.ndarray):
+            # Also accepts sets and generators
+            ids = np.fromiter(id, dtype=np.int64)
+        else:
+            ids = np.atleast_1d(np.asarray(id, dtype=np.int64))
+        keys = self.columns[self.key]
+        positions = np.searchsorted(keys, ids)
+        positions = np.minimum(positions, len(keys) - 1)
+        return (
+            positions[keys[positions] == ids] if len(keys) else positions[:0]
+        )
+
+    def rows_by_loc(
+        self, ra: float, dec: float, radius: float
+    ) -> "np.ndarray":
+        """
+        Return the row positions within ``radius`` degrees of a position.
+        """
+        n_zones = len(self._zone_offsets) - 1
+        low = max(int((dec - radius + 90) // self.zone_height), 0)
+        high = min(int((dec + radius + 90) // self.zone_height), n_zones - 1)
+
+        max_dec = abs(dec) + radius
+        if max_dec >= 90:
+            windows = [(0.0, 360.0)]
+        else:
+            alpha = radius / np.cos(np.radians(max_dec))
+            if alpha >= 180:
+                windows = [(0.0, 360.0)]
+            else:
+                start, stop = (ra - alpha) % 360, (ra + alpha) % 360
+                if start <= stop:
+                    windows = [(start, stop)]
+                else:
+                    windows = [(start, 360.0), (0.0, stop)]
+
+        candidates = []
+        for zone in range(low, high + 1):
+            z_start, z_stop = self._zone_offsets[zone : zone + 2]
+            zone_ra = self._zone_ra[z_start:z_stop]
+            for ra_min, ra_max in windows:
+                lo = np.searchsorted(zone_ra, ra_min, side="left")
+                hi = np.searchsorted(zone_ra, ra_max, side="right")
+                candidates.append(
+                    self._zone_order[z_start + lo : z_start + hi]
+                )
+
+        if not candidates:
+            return np.empty(0, dtype=np.int64)
+        rows = np.sort(np.concatenate(candidates))
+        separation = angular_separation(
+            self.columns["ra"][rows], self.columns["dec"][rows], ra, dec
+        )
+        return rows[separation <= radius]
+
+    def query_by_id(
+        self,
+        id: INT_SCALAR_OR_LIST,
+        *fields: str,
+        output: str = arrays.ROWS,
+        **keyword_filters,
+    ):
+        """
+        Get rows by primary key(s), see :func:`pyticdb.query_by_id`. Rows
+        follow the order of the given ids.
+        """
+        rows = self._filter(self.rows_by_id(id), keyword_filters)
+        return self._result(rows, fields, output)
+
+    def query_by_loc(
+        self,
+        ra: float,
+        dec: float,
+        radius: float,
+        *fields: str,
+        output: str = arrays.ROWS,
+        **keyword_filters,
+    ):
+        """
+        Get rows within a radius, see :func:`pyticdb.query_by_loc`. Rows
+        are ordered by primary key.
+        """
+        rows = self._filter(self.rows_by_loc(ra, dec, radius), keyword_filters)
+        return self._result(rows, fields, output)
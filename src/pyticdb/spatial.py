@@ -0,0 +1,346 @@
+"""
+Set-based crossmatching of many target positions against a Q3C indexed
+catalog.
+"""
+
+import typing
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from pyticdb import arrays, instrument
+from pyticdb.query import (
+    _CMPR,
+    PARAMETER_LIMIT,
+    apply_filters,
+    execute_query,
+    resolve_database,
+    stream_query,
+)
+from pyticdb.util import chunkify
+
+FLOAT_SCALAR_OR_LIST = typing.Union[float, typing.Iterable[float]]
+
+TARGET_INDEX = "target_index"
+SEPARATION = "separation"
+# Each target binds its index, ra, dec and radius
+CROSSMATCH_CHUNK_SIZE = PARAMETER_LIMIT // 4
+
+
+def _is_scalar(value: FLOAT_SCALAR_OR_LIST) -> bool:
+    # Zero dimensional arrays are iterable in name only
+    return not isinstance(value, typing.Iterable) or not getattr(
+        value, "ndim", 1
+    )
+
+
+def _as_floats(values: FLOAT_SCALAR_OR_LIST) -> list[float]:
+    if _is_scalar(values):
+        return [float(typing.cast(float, values))]
+    return [float(v) for v in typing.cast(typing.Iterable[float], values)]
+
+
+def _broadcast_targets(
+    ra: FLOAT_SCALAR_OR_LIST,
+    dec: FLOAT_SCALAR_OR_LIST,
+    radius: FLOAT_SCALAR_OR_LIST,
+) -> list[tuple[int, float, float, float]]:
+    ras = _as_floats(ra)
+    decs = _as_floats(dec)
+    if len(ras) != len(decs):
+        raise ValueError(
+            f"Got {len(ras)} right ascensions but {len(decs)} declinations"
+        )
+
+    if _is_scalar(radius):
+        radii = _as_floats(radius) * len(ras)
+    else:
+        radii = _as_floats(radius)
+        if len(radii) != len(ras):
+            raise ValueError(f"Got {len(radii)} radii for {len(ras)} targets")
+
+    return list(zip(range(len(ras)), ras, decs, radii))
+
+
+def index_column() -> sa.Column:
+    """
+    The ``target_index`` column leading crossmatch results.
+    """
+    return sa.Column(TARGET_INDEX, sa.BigInteger, nullable=False)
+
+
+def targets_values(
+    targets: typing.Sequence[tuple[int, float, float, float]],
+) -> sa.Values:
+    """
+    Build a ``VALUES`` list of (target_index, ra, dec, radius) rows usable
+    as a selectable.
+    """
+    return sa.values(
+        index_column(),
+        sa.column("ra", sa.Float),
+        sa.column("dec", sa.Float),
+        sa.column("radius", sa.Float),
+        name="targets",
+    ).data(list(targets))
+
+
+def crossmatch_statements(
+    ra: FLOAT_SCALAR_OR_LIST,
+    dec: FLOAT_SCALAR_OR_LIST,
+    radius: FLOAT_SCALAR_OR_LIST,
+    *fields: str,
+    table: sa.Table,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    chunk_size: int = CROSSMATCH_CHUNK_SIZE,
+    **keyword_filters,
+) -> typing.Generator[sa.Select, None, None]:
+    """
+    Build the statements joining target positions against the catalog using
+    ``q3c_join``. Targets are split into chunks of at most ``chunk_size`` to
+    stay below the bind parameter limit.
+
+    Each statement selects the target index followed by ``fields``.
+    """
+    targets = _broadcast_targets(ra, dec, radius)
+    columns = [getattr(table.c, field) for field in fields]
+    for chunk in chunkify(targets, chunk_size):
+        values = targets_values(chunk)
+        q = sa.select(values.c[TARGET_INDEX], *columns).join_from(
+            values,
+            table,
+            sa.func.q3c_join(
+                values.c.ra,
+                values.c.dec,
+                table.c.ra,
+                table.c.dec,
+                values.c.radius,
+            ),
+        )
+        filters = list(expression_filters or [])
+        yield apply_filters(q, table, filters, keyword_filters)
+
+
+def nearest_statements(
+    ra: FLOAT_SCALAR_OR_LIST,
+    dec: FLOAT_SCALAR_OR_LIST,
+    radius: FLOAT_SCALAR_OR_LIST,
+    *fields: str,
+    table: sa.Table,
+    k: int = 1,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    chunk_size: int = CROSSMATCH_CHUNK_SIZE,
+    **keyword_filters,
+) -> typing.Generator[sa.Select, None, None]:
+    """
+    Build the statements selecting, for each target, the ``k`` closest
+    catalog sources within its radius. Each target probes the catalog
+    through a ``LATERAL`` subquery ordered by ``q3c_dist`` and limited to
+    ``k`` rows, so only the nearest sources leave the server.
+
+    Each statement selects the target index, ``fields`` and the separation
+    in degrees, ordered by target index and then separation.
+    """
+    if k < 1:
+        raise ValueError(f"k must be at least 1, got {k}")
+
+    targets = _broadcast_targets(ra, dec, radius)
+    columns = [getattr(table.c, field) for field in fields]
+    for chunk in chunkify(targets, chunk_size):
+        values = targets_values(chunk)
+        separation = sa.func.q3c_dist(
+            values.c.ra, values.c.dec, table.c.ra, table.c.dec, type_=sa.Float
+        ).label(SEPARATION)
+        filters: list[_CMPR] = [
+            sa.func.q3c_join(
+                values.c.ra,
+                values.c.dec,
+                table.c.ra,
+                table.c.dec,
+                values.c.radius,
+            )
+        ]
+        filters.extend(expression_filters or [])
+        candidates = apply_filters(
+            sa.select(*columns, separation), table, filters, keyword_filters
+        )
+        nearest = candidates.order_by(separation).limit(k).lateral("nearest")
+        yield (
+            sa.select(values.c[TARGET_INDEX], nearest)
+            .select_from(values)
+            .join(nearest, sa.true())
+            .order_by(values.c[TARGET_INDEX], nearest.c[SEPARATION])
+        )
+
+
+def _execute_statements(
+    database: Session,
+    statements: typing.Iterable[sa.Select],
+    empty_columns: list[sa.ColumnElement],
+    output: str,
+):
+    part_output = arrays.part_format(output)
+    parts = [
+        execute_query(database, q, output=part_output) for q in statements
+    ]
+    if not parts:
+        return arrays.empty(empty_columns, output)
+    return arrays.merge(parts, output)
+
+
+@instrument.instrumented
+@resolve_database
+def crossmatch(
+    ra: FLOAT_SCALAR_OR_LIST,
+    dec: FLOAT_SCALAR_OR_LIST,
+    radius: FLOAT_SCALAR_OR_LIST,
+    *fields: str,
+    database: Session,
+    table: sa.Table,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    output: str = arrays.ROWS,
+    chunk_size: int = CROSSMATCH_CHUNK_SIZE,
+    **keyword_filters,
+):
+    """
+    Radially match many positions against the catalog at once.
+
+    Every catalog source within ``radius`` of a target is returned, tagged
+    with the index of the target within the given arrays. A source within
+    range of several targets is returned once per target.
+
+    Parameters
+    ----------
+    ra: float or iterable of floats
+        The right ascensions of the targets.
+    dec: float or iterable of floats
+        The declinations of the targets.
+    radius: float or iterable of floats
+        The search radius in degrees, either shared or one per target.
+    *fields: str
+        Names of columns to return after ``target_index``.
+    expression_filters: BinaryExpression or list of BinaryExpressions
+        Additional filters to use.
+    output: str
+        One of ``"rows"``, ``"structured"`` or ``"columns"``. See
+        :func:`pyticdb.query.query_by_id`.
+    chunk_size: int
+        The maximum number of targets sent per statement.
+    keyword_filters:
+        Django like keywords, see :func:`pyticdb.query.query_by_id`.
+
+    Examples
+    --------
+    >>> rows = crossmatch(ras, decs, 21 / 3600, "id", "tmag")
+    >>> for target_index, tic_id, tmag in rows:
+    >>>     ...
+    """
+    arrays.validate_output(output)
+    statements = crossmatch_statements(
+        ra,
+        dec,
+        radius,
+        *fields,
+        table=table,
+        expression_filters=expression_filters,
+        chunk_size=chunk_size,
+        **keyword_filters,
+    )
+    columns = [getattr(table.c, field) for field in fields]
+    return _execute_statements(
+        database, statements, [index_column(), *columns], output
+    )
+
+
+@instrument.instrumented
+@resolve_database
+def crossmatch_nearest(
+    ra: FLOAT_SCALAR_OR_LIST,
+    dec: FLOAT_SCALAR_OR_LIST,
+    radius: FLOAT_SCALAR_OR_LIST,
+    *fields: str,
+    database: Session,
+    table: sa.Table,
+    k: int = 1,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    output: str = arrays.ROWS,
+    chunk_size: int = CROSSMATCH_CHUNK_SIZE,
+    **keyword_filters,
+):
+    """
+    Find the closest catalog source(s) to each target position.
+
+    For every target only the ``k`` nearest sources within ``radius`` are
+    returned along with their separation, as computed by ``q3c_dist``.
+    Targets without a source in range are omitted.
+
+    Parameters
+    ----------
+    k: int
+        The number of nearest sources returned per target, defaults to the
+        single best match.
+
+    Returns
+    -------
+    Rows of ``(target_index, *fields, separation)`` ordered by target index
+    and then increasing separation, where separation is in degrees. See
+    :func:`crossmatch` for the remaining parameters.
+
+    Examples
+    --------
+    >>> best = crossmatch_nearest(ras, decs, 21 / 3600, "id", "tmag")
+    >>> for target_index, tic_id, tmag, separation in best:
+    >>>     ...
+    """
+    arrays.validate_output(output)
+    statements = nearest_statements(
+        ra,
+        dec,
+        radius,
+        *fields,
+        table=table,
+        k=k,
+        expression_filters=expression_filters,
+        chunk_size=chunk_size,
+        **keyword_filters,
+    )
+    columns = [getattr(table.c, field) for field in fields]
+    separation = sa.literal_column(SEPARATION, sa.Float)
+    return _execute_statements(
+        database, statements, [index_column(), *columns, separation], output
+    )
+
+
+@instrument.instrumented
+@resolve_database
+def iter_crossmatch(
+    ra: FLOAT_SCALAR_OR_LIST,
+    dec: FLOAT_SCALAR_OR_LIST,
+    radius: FLOAT_SCALAR_OR_LIST,
+    *fields: str,
+    database: Session,
+    table: sa.Table,
+    expression_filters: typing.Optional[list[_CMPR]] = None,
+    batch_size: int = arrays.DEFAULT_BATCH_SIZE,
+    output: str = arrays.ROWS,
+    chunk_size: int = CROSSMATCH_CHUNK_SIZE,
+    **keyword_filters,
+) -> typing.Generator[typing.Any, None, None]:
+    """
+    Streaming counterpart of :func:`crossmatch`, yielding batches of at
+    most ``batch_size`` rows.
+    """
+    arrays.validate_output(output)
+    for q in crossmatch_statements(
+        ra,
+        dec,
+        radius,
+        *fields,
+        table=table,
+        expression_filters=expression_filters,
+        chunk_size=chunk_size,
+        **keyword_filters,
+    ):
+        yield from stream_query(
+            database, q, batch_size=batch_size, output=output
+        )
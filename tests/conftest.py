@@ -0,0 +1,42 @@
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from pyticdb.models import TICEntry
+
+TABLE = TICEntry.__table__
+
+
+@pytest.fixture
+def make_catalog(tmp_path):
+    """
+    Return a function creating a sqlite catalog holding ``rows`` of
+    ``table``, by default the TIC with 100 rows of ``tmag = id / 2``, and
+    returning its engine.
+    """
+    engines = []
+
+    def make(rows=None, table=TABLE, name="tic.db"):
+        if rows is None:
+            rows = [{"id": i, "tmag": i / 2} for i in range(100)]
+        engine = sa.create_engine(f"sqlite:///{tmp_path / name}")
+        engines.append(engine)
+        table.create(engine)
+        if rows:
+            with engine.begin() as conn:
+                conn.execute(sa.insert(table), rows)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def tic_engine(make_catalog):
+    return make_catalog()
+
+
+@pytest.fixture
+def tic_sessionmaker(tic_engine):
+    return orm.sessionmaker(bind=tic_engine)
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from pyticdb.models import TICEntry
+
+pytest.importorskip("aiosqlite")
+aio = pytest.importorskip("pyticdb.aio")
+
+TABLE = TICEntry.__table__
+
+
+@pytest.fixture
+def sessionmaker(tmp_path):
+    path = tmp_path / "tic.db"
+    engine = sa.create_engine(f"sqlite:///{path}")
+    TABLE.create(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            sa.insert(TABLE),
+            [{"id": i, "tmag": i / 2, "ra": i, "dec": 0} for i in range(100)],
+        )
+    engine.dispose()
+    async_engine = aio.create_async_engine(
+        f"sqlite+aiosqlite:///{path}", pool_size=2
+    )
+    yield async_sessionmaker(async_engine, expire_on_commit=False)
+    asyncio.run(async_engine.dispose())
+
+
+def test_concurrent_lookups_share_pooled_connections(sessionmaker):
+    async def lookup():
+        return await asyncio.gather(
+            *[
+                aio.aquery_by_id(
+                    i, "id", "tmag", database=sessionmaker(), table=TABLE
+                )
+                for i in range(50)
+            ]
+        )
+
+    results = asyncio.run(lookup())
+
+    assert [tuple(rows[0]) for rows in results] == [
+        (i, i / 2) for i in range(50)
+    ]
+    assert sessionmaker.kw["bind"].pool.checkedout() == 0
+
+
+def test_aquery_by_id_columns_output(sessionmaker):
+    result = asyncio.run(
+        aio.aquery_by_id(
+            range(10),
+            "id",
+            database=sessionmaker(),
+            table=TABLE,
+            output="columns",
+            tmag__ge=3,
+        )
+    )
+
+    assert sorted(result["id"].tolist()) == [6, 7, 8, 9]
+
+
+def test_reflection_cache_creates_one_engine_per_key(tmp_path, monkeypatch):
+    cache = aio.AsyncTableReflectionCache(reflection_cache=None)
+    created = []
+
+    def create(key):
+        time.sleep(0.1)
+        engine = aio.create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'tic.db'}"
+        )
+        created.append(engine)
+        return sa.MetaData(), async_sessionmaker(engine)
+
+    monkeypatch.setattr(cache, "_create", create)
+
+    async def run():
+        results = await asyncio.gather(*[cache.get("tic") for _ in range(4)])
+        await cache.dispose("unknown")
+        await cache.dispose()
+        return results
+
+    results = asyncio.run(run())
+
+    assert len(created) == 1
+    assert all(result[1] is results[0][1] for result in results)
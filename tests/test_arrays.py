@@ -0,0 +1,46 @@
+import numpy as np
+import sqlalchemy as sa
+
+from pyticdb import arrays
+from pyticdb.models import TICEntry
+
+
+def test_column_dtype_from_reflected_types():
+    table = TICEntry.__table__
+    assert arrays.column_dtype(table.c.id) == np.int64
+    assert arrays.column_dtype(table.c.hip) == np.float64
+    assert arrays.column_dtype(table.c.ra) == np.float64
+    assert arrays.column_dtype(table.c.tmag) == np.float64
+    assert arrays.column_dtype(table.c.gaia) == np.dtype(object)
+
+
+def test_fill_structured_grows_past_size_hint():
+    dtype = np.dtype([("id", np.int64), ("tmag", np.float64)])
+    batches = [[(1, 10.0), (2, None)], [(3, 12.5)]]
+
+    result = arrays.fill_structured(batches, dtype, size_hint=1)
+
+    np.testing.assert_array_equal(result["id"], [1, 2, 3])
+    assert np.isnan(result["tmag"][1])
+
+
+def test_decode_result_matches_rows():
+    engine = sa.create_engine("sqlite://")
+    table = TICEntry.__table__
+    with engine.begin() as conn:
+        table.create(conn, checkfirst=True)
+        conn.execute(
+            sa.insert(table),
+            [{"id": i, "tmag": i / 2, "gaia": str(i)} for i in range(100)],
+        )
+
+    q = sa.select(table.c.id, table.c.tmag, table.c.gaia).order_by(table.c.id)
+    with engine.connect() as conn:
+        rows = conn.execute(q).fetchall()
+        columns = arrays.decode_result(
+            conn.execute(q), q.selected_columns, arrays.COLUMNS
+        )
+
+    assert columns["id"].tolist() == [row.id for row in rows]
+    assert columns["tmag"].tolist() == [row.tmag for row in rows]
+    assert columns["gaia"].tolist() == [row.gaia for row in rows]
@@ -0,0 +1,91 @@
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from pyticdb.arrow import arrow_schema, from_batches, iter_batches, to_parquet
+from pyticdb.models import TICEntry
+from pyticdb.query import iter_by_id, query_by_id
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+TABLE = TICEntry.__table__
+
+
+def test_arrow_schema_keeps_nullable_integers():
+    schema = arrow_schema(
+        [TABLE.c.id, TABLE.c.hip, TABLE.c.tmag, TABLE.c.gaia]
+    )
+
+    assert schema.types == [pa.int64(), pa.int64(), pa.float64(), pa.string()]
+
+
+def test_to_parquet_streams_batches(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'tic.db'}")
+    TABLE.create(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            sa.insert(TABLE),
+            [{"id": i, "hip": i if i % 2 else None} for i in range(250)],
+        )
+    sessionmaker = orm.sessionmaker(bind=engine)
+
+    batches = iter_by_id(
+        range(250),
+        "id",
+        "hip",
+        database=sessionmaker(),
+        table=TABLE,
+        batch_size=100,
+        output="arrow",
+    )
+    n_rows = to_parquet(batches, tmp_path / "out.parquet")
+    written = pq.read_table(tmp_path / "out.parquet")
+    table = query_by_id(
+        range(250),
+        "id",
+        "hip",
+        database=sessionmaker(),
+        table=TABLE,
+        output="arrow",
+    )
+
+    assert n_rows == written.num_rows == 250
+    assert pq.ParquetFile(tmp_path / "out.parquet").num_row_groups == 3
+    assert written.column("hip").null_count == 125
+    assert table.sort_by("id").equals(written.sort_by("id"))
+
+
+def test_batches_share_one_schema(tmp_path):
+    schema = arrow_schema([sa.column("flux", sa.Numeric()), sa.column("tag")])
+    batches = [[(None, None)], [(1.5, "a")], [(None, "b")]]
+
+    decoded = list(iter_batches(batches, schema))
+    table = from_batches(batches, schema)
+    n_rows = to_parquet(
+        (batch.select(["flux"]) for batch in decoded), tmp_path / "out.pq"
+    )
+
+    assert [batch.schema.types[0] for batch in decoded] == [pa.float64()] * 3
+    assert decoded[1].schema == decoded[2].schema
+    assert table.schema.types == [pa.float64(), pa.string()]
+    assert table.column("tag").to_pylist() == [None, "a", "b"]
+    assert n_rows == pq.read_table(tmp_path / "out.pq").num_rows == 3
+
+
+def test_to_parquet_writes_batches_into_the_given_schema(tmp_path):
+    schema = arrow_schema([TABLE.c.id, TABLE.c.hip])
+    batches = iter_batches(
+        [[(1, None)], [(2, 7)]],
+        pa.schema([("id", pa.int64()), ("hip", pa.null())]),
+    )
+
+    n_rows = to_parquet(batches, tmp_path / "out.parquet", schema=schema)
+    n_empty = to_parquet([], tmp_path / "empty.parquet", schema=schema)
+
+    assert n_rows == 2
+    assert pq.read_table(tmp_path / "out.parquet").schema == schema
+    assert n_empty == pq.read_table(tmp_path / "empty.parquet").num_rows == 0
+    assert pq.read_schema(tmp_path / "empty.parquet") == schema
+    with pytest.raises(ValueError):
+        to_parquet([], tmp_path / "unknown.parquet")
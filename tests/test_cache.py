@@ -0,0 +1,50 @@
+from pyticdb import arrays
+from pyticdb.cache import ResultCache, cached_lookup
+from pyticdb.models import TICEntry
+
+TABLE = TICEntry.__table__
+PREFIX = ("sqlite://", "ticentries", ("tmag",), ())
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(maxsize=2)
+    cache.put_many(PREFIX, {1: (1.0,), 2: (2.0,)})
+    cache.get_many(PREFIX, [1])
+    cache.put_many(PREFIX, {3: (3.0,)})
+
+    found, missing = cache.get_many(PREFIX, [1, 2, 3])
+
+    assert found == {1: (1.0,), 3: (3.0,)}
+    assert missing == [2]
+    assert cache.stats() == {"hits": 3, "misses": 1, "evictions": 1, "size": 2}
+
+
+def test_cached_lookup_only_fetches_missing_ids():
+    cache = ResultCache()
+    fetched = []
+
+    def fetch(ids):
+        fetched.append(sorted(ids))
+        return [(id_, id_ / 2) for id_ in ids if id_ < 10]
+
+    columns = [TABLE.c.tmag]
+    first = cached_lookup(cache, PREFIX, [1, 2, 20], columns, fetch, "rows")
+    second = cached_lookup(cache, PREFIX, [2, 3, 20], columns, fetch, "rows")
+
+    assert fetched == [[1, 2, 20], [3]]
+    assert [row.tmag for row in first] == [0.5, 1.0]
+    assert [row.tmag for row in second] == [1.0, 1.5]
+
+
+def test_cached_lookup_array_output():
+    cache = ResultCache()
+    result = cached_lookup(
+        cache,
+        PREFIX,
+        [4, 5],
+        [TABLE.c.tmag],
+        lambda ids: [(id_, float(id_)) for id_ in ids],
+        arrays.COLUMNS,
+    )
+
+    assert result["tmag"].tolist() == [4.0, 5.0]
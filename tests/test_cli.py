@@ -0,0 +1,160 @@
+import csv
+import io
+
+import numpy as np
+import pytest
+import sqlalchemy as sa
+from click.testing import CliRunner
+from sqlalchemy import orm
+
+from pyticdb.cli import main
+from pyticdb.conn import Databases
+from pyticdb.models import TICEntry
+from pyticdb.schema import LazyMetaData
+
+TABLE = TICEntry.__table__
+
+
+@pytest.fixture
+def database(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'tic.db'}")
+    TABLE.create(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            sa.insert(TABLE),
+            [
+                {"id": i, "ra": i / 10, "dec": i - 50, "tmag": i / 2}
+                for i in range(100)
+            ],
+        )
+    Databases["cli_test"] = LazyMetaData(engine), orm.sessionmaker(engine)
+    yield "cli_test"
+    Databases._cache.pop("cli_test")
+
+
+def test_ids_writes_filtered_csv(database):
+    result = CliRunner().invoke(
+        main,
+        [
+            "ids",
+            "-",
+            "--database",
+            database,
+            "--fields",
+            "id,tmag",
+            "--filter",
+            "tmag__lt=2",
+            "-q",
+        ],
+        input="1 2 3\n4 50\n",
+    )
+
+    assert result.exit_code == 0, result.output
+    rows = list(csv.reader(io.StringIO(result.output)))
+    assert rows[0] == ["id", "tmag"]
+    assert sorted(int(row[0]) for row in rows[1:]) == [1, 2, 3]
+
+
+def test_ids_writes_npy(database, tmp_path):
+    path = tmp_path / "ids.npy"
+    result = CliRunner().invoke(
+        main,
+        ["ids", "-", "--database", database, "-o", str(path), "-q"],
+        input=" ".join(map(str, range(0, 100, 3))),
+        catch_exceptions=False,
+    )
+
+    assert result.exit_code == 0
+    array = np.load(path)
+    assert array.dtype.names == ("id", "ra", "dec", "tmag")
+    assert sorted(array["id"]) == list(range(0, 100, 3))
+
+
+@pytest.mark.parametrize("suffix", ["npy", "parquet"])
+def test_empty_results_write_empty_files(database, tmp_path, suffix):
+    pytest.importorskip("pyarrow")
+    runner = CliRunner()
+    ids = tmp_path / f"ids.{suffix}"
+    matches = tmp_path / f"matches.{suffix}"
+
+    by_id = runner.invoke(
+        main,
+        ["ids", "-", "--database", database, "-o", str(ids), "-q"],
+        input="500 600",
+        catch_exceptions=False,
+    )
+    crossmatched = runner.invoke(
+        main,
+        [
+            "crossmatch",
+            "-",
+            "--radius",
+            "0.1",
+            "--database",
+            database,
+            "--fields",
+            "id,tmag",
+            "-o",
+            str(matches),
+            "-q",
+        ],
+        input="ra,dec\n",
+        catch_exceptions=False,
+    )
+
+    assert by_id.exit_code == 0 and crossmatched.exit_code == 0
+    if suffix == "npy":
+        assert np.load(ids).dtype.names == ("id", "ra", "dec", "tmag")
+        empty = np.load(matches)
+        assert empty.dtype.names == ("target_index", "id", "tmag")
+    else:
+        import pyarrow.parquet as pq
+
+        assert pq.read_table(ids).column_names == ["id", "ra", "dec", "tmag"]
+        empty = pq.read_table(matches)
+        assert empty.column_names == ["target_index", "id", "tmag"]
+    assert len(empty) == 0
+
+
+def test_raw_and_schema(database):
+    runner = CliRunner()
+    raw = runner.invoke(
+        main,
+        [
+            "raw",
+            "SELECT id, tmag FROM ticentries WHERE id < 3 ORDER BY id",
+            "--database",
+            database,
+            "-q",
+        ],
+    )
+    schema = runner.invoke(main, ["schema", "--database", database])
+
+    assert raw.exit_code == 0 and schema.exit_code == 0
+    assert raw.output.splitlines() == ["id,tmag", "0,0.0", "1,0.5", "2,1.0"]
+    assert "id\tBIGINT\tFalse\tTrue" in schema.output.splitlines()
+
+
+def test_extract_writes_one_file_per_tile(database, tmp_path):
+    directory = tmp_path / "extract"
+    args = [
+        "extract",
+        str(directory),
+        "--database",
+        database,
+        "--format",
+        "npy",
+        "--tile-size",
+        "90",
+        "--no-spatial-index",
+        "-q",
+    ]
+
+    result = CliRunner().invoke(main, args, catch_exceptions=False)
+    rerun = CliRunner().invoke(main, args, catch_exceptions=False)
+
+    assert result.exit_code == 0 and rerun.exit_code == 0
+    arrays = [np.load(path) for path in directory.glob("*.npy")]
+    ids = np.concatenate([array["id"] for array in arrays])
+    assert sorted(ids) == list(range(100))
+    assert len((directory / "checkpoint.jsonl").read_text().splitlines()) == 8
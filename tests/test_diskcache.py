@@ -0,0 +1,107 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from pyticdb.diskcache import DiskCache
+from pyticdb.models import TICEntry
+from pyticdb.query import query_by_id, query_raw
+
+TABLE = TICEntry.__table__
+
+
+def test_results_persist_across_instances(
+    tmp_path, tic_engine, tic_sessionmaker
+):
+    cache = DiskCache(tmp_path / "cache")
+
+    def lookup(cache, **kwargs):
+        return query_by_id(
+            [1, 2, 3],
+            "id",
+            "tmag",
+            database=tic_sessionmaker(),
+            table=TABLE,
+            disk_cache=cache,
+            **kwargs,
+        )
+
+    rows = lookup(cache)
+    columns = lookup(cache, output="columns")
+    table = lookup(cache, output="arrow")
+    with tic_engine.begin() as conn:
+        conn.execute(sa.delete(TABLE))
+
+    reopened = DiskCache(tmp_path / "cache")
+    assert sorted(lookup(reopened)) == sorted(rows)
+    assert lookup(reopened)[0]._fields == ("id", "tmag")
+    assert lookup(reopened, output="columns")["tmag"].tolist() == (
+        columns["tmag"].tolist()
+    )
+    assert lookup(reopened, output="arrow").equals(table)
+    assert lookup(reopened, tmag__lt=1) == []
+    assert cache.stats()["misses"] == 3
+    assert reopened.stats()["hits"] == 4
+    assert reopened.stats()["entries"] == 4
+
+
+def test_raw_queries_are_keyed_by_statement(tmp_path, tic_sessionmaker):
+    cache = DiskCache(tmp_path / "cache")
+
+    def raw(sql):
+        return query_raw(
+            sql, database=tic_sessionmaker(), table=TABLE, disk_cache=cache
+        )
+
+    assert raw("SELECT count(*) FROM ticentries") == [(100,)]
+    assert raw("SELECT max(id) FROM ticentries") == [(99,)]
+    assert raw("SELECT count(*) FROM ticentries") == [(100,)]
+    assert cache.stats()["hits"] == 1
+
+
+def test_sessions_bound_to_a_connection_share_keys(
+    tmp_path, tic_engine, tic_sessionmaker
+):
+    cache = DiskCache(tmp_path / "cache")
+    q = sa.select(TABLE.c.id).where(TABLE.c.id < 3)
+
+    with tic_engine.connect() as connection:
+        key = cache.key(orm.Session(bind=connection), q)
+
+    assert key == cache.key(tic_sessionmaker(), q)
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    cache = DiskCache(tmp_path / "cache", max_bytes=2000)
+
+    for i in range(3):
+        cache.put(f"key_{i}", [(i, "x" * 500)])
+    cache.get("key_0")
+    cache.put("key_3", [(3, "x" * 500)])
+    cache.put("huge", [(4, "x" * 5000)])
+
+    assert cache.get("key_1") is None
+    assert cache.get("huge") is None
+    assert cache.get("key_0") == [(0, "x" * 500)]
+    assert cache.get("key_3") == [(3, "x" * 500)]
+    assert cache.stats()["bytes"] <= 2000
+    assert cache.evictions == 1
+
+
+def _put(cache: DiskCache, i: int):
+    cache.put(f"key_{i}", [(i,)] * 100)
+    return cache.get(f"key_{i}") == [(i,)] * 100
+
+
+def test_concurrent_processes_share_the_cache(tmp_path):
+    cache = DiskCache(tmp_path / "cache")
+    cache.put("parent", [(0,)])
+
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        written = list(pool.map(_put, [cache] * 16, range(16)))
+
+    assert all(written)
+    assert pickle.loads(pickle.dumps(cache)).get("parent") == [(0,)]
+    assert cache.stats()["entries"] == 17
+    assert all(cache.get(f"key_{i}") == [(i,)] * 100 for i in range(16))
@@ -0,0 +1,138 @@
+import math
+import random
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from pyticdb.extract import (
+    ExtractionError,
+    Tile,
+    _separation,
+    extract_tiles,
+    sky_tiles,
+)
+from pyticdb.models import TICEntry
+
+TABLE = TICEntry.__table__
+
+
+def _q3c_radial_query(ra, dec, ra0, dec0, radius):
+    return ra is not None and _separation(ra, dec, ra0, dec0) <= radius
+
+
+def make_sessionmaker(tmp_path, n_rows=2000):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'tic.db'}")
+    sa.event.listen(
+        engine,
+        "connect",
+        lambda conn, _: conn.create_function(
+            "q3c_radial_query", 5, _q3c_radial_query
+        ),
+    )
+    rng = random.Random(0)
+    rows = [
+        {
+            "id": i,
+            "ra": rng.uniform(0, 360),
+            "dec": math.degrees(math.asin(rng.uniform(-1, 1))),
+            "tmag": rng.uniform(4, 20),
+        }
+        for i in range(n_rows)
+    ]
+    # Positions on tile edges and poles
+    rows.append({"id": n_rows, "ra": 0.0, "dec": 90.0, "tmag": 5.0})
+    rows.append({"id": n_rows + 1, "ra": 360.0, "dec": -90.0, "tmag": 5.0})
+    rows.append({"id": n_rows + 2, "ra": 30.0, "dec": 0.0, "tmag": 5.0})
+    TABLE.create(engine)
+    with engine.begin() as conn:
+        conn.execute(sa.insert(TABLE), rows)
+    return orm.sessionmaker(bind=engine)
+
+
+def test_sky_tiles_cover_the_sky():
+    tiles = sky_tiles(10.0)
+
+    area = sum(
+        math.radians(t.ra_max - t.ra_min)
+        * (
+            math.sin(math.radians(t.dec_max))
+            - math.sin(math.radians(t.dec_min))
+        )
+        for t in tiles
+    )
+    assert area == pytest.approx(4 * math.pi)
+    assert all(t.cone()[2] < 15 for t in tiles)
+
+
+def test_extract_tiles_partitions_rows(tmp_path):
+    sessionmaker = make_sessionmaker(tmp_path)
+
+    results = list(
+        extract_tiles(
+            "id",
+            database=sessionmaker(),
+            table=TABLE,
+            tile_size=20.0,
+            tmag__lt=16,
+        )
+    )
+
+    ids = [row.id for _, rows in results for row in rows]
+    with sessionmaker() as db:
+        expected = db.scalars(
+            sa.select(TABLE.c.id).where(TABLE.c.tmag < 16)
+        ).all()
+    assert len(ids) == len(set(ids))
+    assert sorted(ids) == sorted(expected)
+
+
+def test_extract_tiles_resumes_from_checkpoint(tmp_path):
+    sessionmaker = make_sessionmaker(tmp_path)
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    tiles = sky_tiles(30.0)
+
+    extraction = extract_tiles(
+        "id",
+        database=sessionmaker(),
+        table=TABLE,
+        tiles=tiles,
+        workers=2,
+        checkpoint=checkpoint,
+    )
+    first = [next(extraction) for _ in range(3)]
+    extraction.close()
+    resumed = list(
+        extract_tiles(
+            "id",
+            database=sessionmaker(),
+            table=TABLE,
+            tiles=tiles,
+            checkpoint=checkpoint,
+        )
+    )
+
+    # The last tile was never followed by a request for the next result
+    resumed_tiles = {tile for tile, _ in resumed}
+    assert len(resumed) == len(tiles) - 2
+    assert first[-1][0] in resumed_tiles
+    assert {tile for tile, _ in first[:-1]}.isdisjoint(resumed_tiles)
+
+
+def test_extract_tiles_reports_failed_tiles(tmp_path):
+    sessionmaker = make_sessionmaker(tmp_path)
+    tiles = [Tile(-90, 0, 0, 360), Tile(0, 90, 0, 360)]
+
+    extraction = extract_tiles(
+        "id",
+        database=sessionmaker(),
+        table=TABLE,
+        tiles=tiles,
+        spatial_index=False,
+        expression_filters=[sa.func.missing_function(TABLE.c.id) > 0],
+        retries=0,
+    )
+    with pytest.raises(ExtractionError) as e:
+        list(extraction)
+
+    assert sorted(e.value.tiles, key=lambda t: t.dec_min) == tiles
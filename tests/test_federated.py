@@ -0,0 +1,170 @@
+import time
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from pyticdb import instrument
+from pyticdb.federated import Link, query_federated, query_link
+from pyticdb.models import TICEntry
+
+TABLE = TICEntry.__table__
+
+GAIA = sa.Table(
+    "gaia_source",
+    sa.MetaData(),
+    sa.Column("source_id", sa.BigInteger, primary_key=True),
+    sa.Column("phot_g_mean_mag", sa.Float),
+)
+
+PSC = sa.Table(
+    "psc",
+    sa.MetaData(),
+    sa.Column("designation", sa.Text, primary_key=True),
+    sa.Column("j_m", sa.Float),
+)
+
+
+def test_query_federated_joins_linked_catalogs(make_catalog):
+    tic = orm.sessionmaker(
+        make_catalog(
+            [
+                {
+                    "id": i,
+                    "tmag": i / 2,
+                    "gaia": None if i == 3 else str(1000 + i),
+                    "twomass": f"J{i % 4}",
+                }
+                for i in range(10)
+            ]
+        )
+    )
+    gaia = orm.sessionmaker(
+        make_catalog(
+            [
+                {"source_id": 1000 + i, "phot_g_mean_mag": i + 0.1}
+                for i in range(5)
+            ],
+            table=GAIA,
+            name="gaia.db",
+        )
+    )
+    twomass = orm.sessionmaker(
+        make_catalog(
+            [
+                {"designation": "J1", "j_m": 11.0},
+                {"designation": "J2", "j_m": 12.0},
+            ],
+            table=PSC,
+            name="twomass.db",
+        )
+    )
+    links = [
+        Link("gaia", gaia, GAIA, ("phot_g_mean_mag",)),
+        Link("twomass", twomass, PSC, ("j_m",), prefix="tmass"),
+    ]
+
+    rows = query_federated(
+        [1, 2, 3, 6, 42],
+        "id",
+        "tmag",
+        "gaia",
+        links=links,
+        database=tic,
+        table=TABLE,
+    )
+
+    assert sorted(rows) == [
+        (1, 0.5, "1001", 1.1, 11.0),
+        (2, 1.0, "1002", 2.1, 12.0),
+        (3, 1.5, None, None, None),
+        (6, 3.0, "1006", None, 12.0),
+    ]
+    assert rows[0]._fields == (
+        "id",
+        "tmag",
+        "gaia",
+        "gaia_phot_g_mean_mag",
+        "tmass_j_m",
+    )
+
+
+def test_query_federated_queries_links_concurrently(make_catalog, monkeypatch):
+    from pyticdb import federated
+
+    tic = orm.sessionmaker(make_catalog([{"id": 1, "gaia": "1000"}]))
+    gaia = orm.sessionmaker(
+        make_catalog(
+            [{"source_id": 1000, "phot_g_mean_mag": 9.0}],
+            table=GAIA,
+            name="gaia.db",
+        )
+    )
+    execute_query = federated.execute_query
+
+    def slow_execute_query(*args, **kwargs):
+        time.sleep(0.3)
+        return execute_query(*args, **kwargs)
+
+    monkeypatch.setattr(federated, "execute_query", slow_execute_query)
+    links = [
+        Link("gaia", gaia, GAIA, ("phot_g_mean_mag",), prefix=f"g{i}")
+        for i in range(4)
+    ]
+
+    t0 = time.perf_counter()
+    (row,) = query_federated(1, "id", links=links, database=tic, table=TABLE)
+
+    assert time.perf_counter() - t0 < 0.9
+    assert row == (1, 9.0, 9.0, 9.0, 9.0)
+
+
+def test_query_link_skips_identifiers_failing_coercion(make_catalog):
+    gaia = orm.sessionmaker(
+        make_catalog(
+            [{"source_id": 1000, "phot_g_mean_mag": 9.0}],
+            table=GAIA,
+            name="gaia.db",
+        )
+    )
+    link = Link("gaia", gaia, GAIA, ("phot_g_mean_mag",))
+
+    matches = query_link(link, ["", "1000", "DR3 1001"])
+
+    assert matches == {"1000": [(9.0,)]}
+
+
+def test_query_federated_profiles_linked_lookups(make_catalog):
+    tic = orm.sessionmaker(
+        make_catalog([{"id": i, "gaia": str(1000 + i)} for i in range(5)])
+    )
+    gaia = orm.sessionmaker(
+        make_catalog(
+            [{"source_id": 1000 + i, "phot_g_mean_mag": i} for i in range(3)],
+            table=GAIA,
+            name="gaia.db",
+        )
+    )
+    links = [Link("gaia", gaia, GAIA, ("phot_g_mean_mag",))]
+
+    with instrument.profile() as prof:
+        query_federated(range(5), "id", links=links, database=tic, table=TABLE)
+
+    (call,) = prof.calls
+    assert call.name == "query_federated"
+    assert call.statements == 2
+    assert call.rows == 5 + 3
+
+
+def test_query_link_rejects_inexact_identifiers(make_catalog):
+    gaia = orm.sessionmaker(
+        make_catalog(
+            [{"source_id": 3, "phot_g_mean_mag": 9.0}],
+            table=GAIA,
+            name="gaia.db",
+        )
+    )
+    link = Link("gaia", gaia, GAIA, ("phot_g_mean_mag",))
+
+    assert query_link(link, [3.7, Decimal("3.2")]) == {}
+    assert query_link(link, [3.0]) == {3.0: [(9.0,)]}
@@ -0,0 +1,61 @@
+from pyticdb import instrument
+from pyticdb.models import TICEntry
+from pyticdb.query import iter_by_id, query_by_id
+
+TABLE = TICEntry.__table__
+
+
+def test_profile_records_phases_rows_and_statements(tic_sessionmaker):
+    with instrument.profile() as prof:
+        query_by_id(range(50), "id", database=tic_sessionmaker(), table=TABLE)
+        batches = list(
+            iter_by_id(
+                range(100), "id", database=tic_sessionmaker(), table=TABLE
+            )
+        )
+
+    by_id, by_iter = prof.calls
+    assert by_id.name == "query_by_id" and by_iter.name == "iter_by_id"
+    assert by_id.rows == 50 and by_id.statements == 1
+    assert by_iter.rows == sum(len(batch) for batch in batches) == 100
+    assert {"compile", "execute", "fetch"} <= set(by_id.phases)
+    assert prof.summary()["query_by_id"]["calls"] == 1
+
+
+def test_profile_counts_rows_of_columns_output(tic_sessionmaker):
+    with instrument.profile() as prof:
+        columns = query_by_id(
+            range(50),
+            "id",
+            "tmag",
+            database=tic_sessionmaker(),
+            table=TABLE,
+            output="columns",
+        )
+        batches = list(
+            iter_by_id(
+                range(100),
+                "id",
+                "tmag",
+                database=tic_sessionmaker(),
+                table=TABLE,
+                output="columns",
+            )
+        )
+
+    by_id, by_iter = prof.calls
+    assert len(columns["id"]) == by_id.rows == 50
+    assert sum(len(batch["id"]) for batch in batches) == by_iter.rows == 100
+
+
+def test_sinks_receive_calls_only_while_registered(tic_sessionmaker):
+    records = []
+
+    instrument.add_sink(records.append)
+    try:
+        query_by_id(1, "id", database=tic_sessionmaker(), table=TABLE)
+    finally:
+        instrument.remove_sink(records.append)
+    query_by_id(1, "id", database=tic_sessionmaker(), table=TABLE)
+
+    assert [record.name for record in records] == ["query_by_id"]
@@ -0,0 +1,43 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pyticdb.loader import BatchLoader
+from pyticdb.models import TICEntry
+
+TABLE = TICEntry.__table__
+
+
+def load_concurrently(loader, ids, **kwargs):
+    barrier = threading.Barrier(len(ids))
+
+    def load(id_):
+        barrier.wait()
+        return loader.load(id_, "tmag", table=TABLE, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=len(ids)) as pool:
+        return list(pool.map(load, ids))
+
+
+def test_concurrent_loads_are_coalesced(tic_sessionmaker):
+    loader = BatchLoader(max_wait=0.2)
+    ids = [1, 2, 3, 3, 150, *range(40, 60)]
+
+    rows = load_concurrently(loader, ids, database=tic_sessionmaker)
+
+    assert rows[:5] == [(0.5,), (1.0,), (1.5,), (1.5,), None]
+    assert [row.tmag for row in rows[5:]] == [i / 2 for i in range(40, 60)]
+    stats = loader.stats()
+    assert stats["requests"] == len(ids)
+    assert stats["batches"] < len(ids) // 2
+    assert stats["ids"] < len(ids)
+
+
+def test_full_batches_dispatch_early(tic_sessionmaker):
+    loader = BatchLoader(max_batch_size=4, max_wait=5.0)
+
+    rows = load_concurrently(
+        loader, list(range(8)), database=tic_sessionmaker, tmag__lt=2
+    )
+
+    assert rows == [(0.0,), (0.5,), (1.0,), (1.5,), None, None, None, None]
+    assert loader.stats()["full_batches"] == 2
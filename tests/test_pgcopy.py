@@ -0,0 +1,148 @@
+import contextlib
+import struct
+import types
+
+import numpy as np
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from pyticdb import arrays, pgcopy
+from pyticdb.models import TICEntry
+
+FORMATS = [">i8", ">f8", "?"]
+
+
+def _encode(rows, formats=FORMATS):
+    buffer = bytearray(pgcopy.SIGNATURE + struct.pack(">ii", 0, 0))
+    for row in rows:
+        buffer += struct.pack(">h", len(row))
+        for fmt, value in zip(formats, row):
+            if value is None:
+                buffer += struct.pack(">i", -1)
+            else:
+                buffer += struct.pack(">i", np.dtype(fmt).itemsize)
+                buffer += np.array(value, dtype=fmt).tobytes()
+    return bytes(buffer + struct.pack(">h", -1))
+
+
+def _rows(n):
+    return [
+        (
+            i,
+            None if i % 97 == 5 else i / 4,
+            None if i % 251 == 0 else bool(i % 2),
+        )
+        for i in range(n)
+    ]
+
+
+def test_decode_fixed_null_layout_runs(monkeypatch):
+    monkeypatch.setattr(pgcopy, "WINDOW", 64)
+    rows = _rows(1000)
+
+    (ids, values, flags), (id_mask, value_mask, flag_mask) = (
+        pgcopy.decode_fixed(_encode(rows), FORMATS)
+    )
+
+    assert ids.dtype == np.dtype("=i8")
+    assert ids.tolist() == list(range(1000))
+    assert not id_mask.any()
+    assert value_mask.tolist() == [row[1] is None for row in rows]
+    assert values[~value_mask].tolist() == [
+        row[1] for row in rows if row[1] is not None
+    ]
+    assert flag_mask.tolist() == [row[2] is None for row in rows]
+    assert flags[~flag_mask].tolist() == [
+        row[2] for row in rows if row[2] is not None
+    ]
+
+
+def test_decode_fixed_empty_and_malformed():
+    (ids, _, _), (mask, _, _) = pgcopy.decode_fixed(_encode([]), FORMATS)
+    assert len(ids) == len(mask) == 0
+
+    with pytest.raises(ValueError):
+        pgcopy.decode_fixed(_encode(_rows(3))[:-2], FORMATS)
+    with pytest.raises(ValueError):
+        pgcopy.decode_fixed(_encode([(1, 2.0)], FORMATS[:2]), FORMATS)
+
+
+def test_assemble_array_outputs():
+    columns = [TICEntry.id, TICEntry.tmag]
+    values, masks = pgcopy.decode_fixed(
+        _encode([(1, 9.5), (2, None)], FORMATS[:2]), FORMATS[:2]
+    )
+
+    structured = pgcopy.assemble(columns, values, masks, arrays.STRUCTURED)
+    table = pgcopy.assemble(columns, values, masks, arrays.ARROW)
+
+    assert structured["id"].tolist() == [1, 2]
+    assert structured["tmag"][0] == 9.5 and np.isnan(structured["tmag"][1])
+    assert table.column("tmag").to_pylist() == [9.5, None]
+
+
+def test_render_expands_in_parameters():
+    q = sa.select(TICEntry.id).where(TICEntry.id.in_([3, 5, 7]))
+
+    sql, params = pgcopy.render(q, postgresql.psycopg.dialect())
+
+    assert "IN (%(id_1_1)s::BIGINT, %(id_1_2)s::BIGINT" in sql
+    assert list(params.values()) == [3, 5, 7]
+
+
+def test_render_strips_trailing_semicolons():
+    q = sa.text("SELECT id FROM ticentries WHERE id = :id ; \n")
+
+    sql, params = pgcopy.render(q, postgresql.psycopg.dialect(), {"id": 3})
+
+    assert sql == "SELECT id FROM ticentries WHERE id = %(id)s"
+    assert params == {"id": 3}
+
+
+class FakeCursor:
+    description = [
+        types.SimpleNamespace(name="id", type_code=20),
+        types.SimpleNamespace(name="tmag", type_code=701),
+    ]
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params):
+        self.executed.append(sql)
+
+    @contextlib.contextmanager
+    def copy(self, statement, params):
+        self.executed.append(statement)
+        yield types.SimpleNamespace(
+            set_types=lambda oids: None, rows=lambda: iter(self.rows)
+        )
+
+
+def test_copy_query_returns_named_rows(monkeypatch):
+    cursor = FakeCursor([(1, 9.5), (2, None)])
+    connection = types.SimpleNamespace(dialect=postgresql.psycopg.dialect())
+    driver_connection = types.SimpleNamespace(cursor=lambda: cursor)
+    monkeypatch.setattr(
+        pgcopy,
+        "_driver_connection",
+        lambda db: (connection, driver_connection),
+    )
+    q = sa.text("SELECT id, tmag FROM ticentries;")
+
+    rows = pgcopy.copy_query(contextlib.nullcontext(), q)
+
+    assert rows == [(1, 9.5), (2, None)]
+    assert rows[1]._fields == ("id", "tmag") and rows[0].tmag == 9.5
+    assert cursor.executed == [
+        "SELECT * FROM (SELECT id, tmag FROM ticentries) AS q LIMIT 0",
+        "COPY (SELECT id, tmag FROM ticentries) TO STDOUT (FORMAT BINARY)",
+    ]
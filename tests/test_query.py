@@ -0,0 +1,210 @@
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import orm
+from sqlalchemy.dialects import postgresql
+
+from pyticdb import query
+from pyticdb.cache import ResultCache
+from pyticdb.models import TICEntry
+from pyticdb.query import (
+    PARAMETER_LIMIT,
+    id_statements,
+    iter_raw,
+    primary_key_column,
+    query_by_id,
+)
+
+TABLE = TICEntry.__table__
+
+
+def _compile(q):
+    return str(q.compile(dialect=postgresql.psycopg.dialect()))
+
+
+def test_id_statements_chunk_above_parameter_limit():
+    ids = range(PARAMETER_LIMIT + 1)
+    statements = list(id_statements(ids, "id", table=TABLE))
+
+    assert [size for _, _, size in statements] == [PARAMETER_LIMIT, 1]
+    assert all(" IN " in _compile(q) for q, _, _ in statements)
+
+
+def test_id_statements_bulk_binds_single_array():
+    ids = range(PARAMETER_LIMIT + 1)
+    statements = list(
+        id_statements(ids, "id", table=TABLE, bulk_threshold=PARAMETER_LIMIT)
+    )
+
+    assert len(statements) == 1
+    q, params, size = statements[0]
+    assert size == PARAMETER_LIMIT + 1
+    assert "= ANY (CAST(" in _compile(q)
+    assert len(q.compile().params) == 1
+    assert len(params["ids"]) == PARAMETER_LIMIT + 1
+
+
+def test_id_statements_bulk_partitions_for_workers():
+    ids = range(PARAMETER_LIMIT + 1)
+    statements = list(
+        id_statements(
+            ids,
+            "id",
+            table=TABLE,
+            bulk_threshold=PARAMETER_LIMIT,
+            partitions=4,
+        )
+    )
+
+    assert len(statements) == 4
+    assert sum(size for _, _, size in statements) == PARAMETER_LIMIT + 1
+
+
+def test_id_statements_reuse_cached_template():
+    ((first, first_params, _),) = id_statements(
+        3, "id", table=TABLE, tmag__lt=9
+    )
+    ((second, second_params, _),) = id_statements(
+        5, "id", table=TABLE, tmag__lt=12
+    )
+
+    assert first is second
+    assert first_params == {"tmag__lt": 9, "id": 3}
+    assert second_params == {"tmag__lt": 12, "id": 5}
+
+
+EPOCHS = sa.Table(
+    "epochs",
+    sa.MetaData(),
+    sa.Column("source_id", sa.BigInteger, primary_key=True),
+    sa.Column("epoch", sa.Integer, primary_key=True),
+    sa.Column("flux", sa.Float),
+)
+
+
+def test_id_statements_chunk_composite_keys():
+    keys = [(i, i % 7) for i in range(PARAMETER_LIMIT // 2 + 1)]
+    statements = list(id_statements(keys, "flux", table=EPOCHS))
+
+    assert [size for _, _, size in statements] == [PARAMETER_LIMIT // 2, 1]
+    assert "(epochs.source_id, epochs.epoch) IN" in _compile(statements[0][0])
+
+
+def test_id_statements_bulk_composite_keys_unnest_arrays():
+    keys = [(i, i % 7) for i in range(10)]
+    ((q, params, size),) = id_statements(
+        keys, "flux", table=EPOCHS, bulk_threshold=5
+    )
+
+    assert size == 10
+    assert "AS anon_1(key_0, key_1)" in _compile(q)
+    assert params["ids_0"] == list(range(10))
+    assert params["ids_1"] == [i % 7 for i in range(10)]
+
+
+def test_query_by_id_composite_keys(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'epochs.db'}")
+    EPOCHS.create(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            sa.insert(EPOCHS),
+            [
+                {"source_id": i, "epoch": e, "flux": i + e / 10}
+                for i in range(20)
+                for e in range(3)
+            ],
+        )
+    sessionmaker = orm.sessionmaker(bind=engine)
+    cache = ResultCache()
+
+    single = query_by_id((4, 2), "flux", database=sessionmaker(), table=EPOCHS)
+    rows = query_by_id(
+        [(1, 0), (3, 2), (3, 9)],
+        "source_id",
+        "epoch",
+        database=sessionmaker(),
+        table=EPOCHS,
+    )
+    cached = [
+        query_by_id(
+            [(5, 1), (6, 2), (5, 1)],
+            "flux",
+            database=sessionmaker(),
+            table=EPOCHS,
+            cache=cache,
+        )
+        for _ in range(2)
+    ]
+
+    assert single == [(4.2,)]
+    assert sorted(rows) == [(1, 0), (3, 2)]
+    assert cached[0] == cached[1] == [(5.1,), (6.2,)]
+    assert cache.stats()["hits"] == 2
+    with pytest.raises(ValueError):
+        primary_key_column(EPOCHS)
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_query_by_id_workers_match_serial(tmp_path, monkeypatch, executor):
+    # Split the ids into several statements executed by the workers
+    monkeypatch.setattr(query, "PARAMETER_LIMIT", 40)
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'tic.db'}")
+    TABLE.create(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            sa.insert(TABLE), [{"id": i, "tmag": i / 2} for i in range(500)]
+        )
+    sessionmaker = orm.sessionmaker(bind=engine)
+    ids = list(range(0, 600, 3))
+
+    def lookup(**kwargs):
+        return query_by_id(
+            ids,
+            "id",
+            "tmag",
+            database=sessionmaker(),
+            table=TABLE,
+            bulk_threshold=None,
+            **kwargs,
+        )
+
+    serial = lookup()
+    parallel = lookup(workers=3, executor=executor)
+
+    assert len(serial) == len(range(0, 500, 3))
+    assert sorted(parallel) == sorted(serial)
+
+
+def test_iter_raw_yields_ordered_batches(tic_sessionmaker):
+    batches = list(
+        iter_raw(
+            "SELECT id, tmag FROM ticentries WHERE id >= 25 ORDER BY id DESC",
+            database=tic_sessionmaker(),
+            table=TABLE,
+            batch_size=20,
+        )
+    )
+
+    assert [len(batch) for batch in batches] == [20, 20, 20, 15]
+    rows = [row for batch in batches for row in batch]
+    assert rows == [(i, i / 2) for i in range(99, 24, -1)]
+    assert rows[0]._fields == ("id", "tmag")
+
+
+def test_keyword_filters_compare_none_as_null(make_catalog):
+    engine = make_catalog(
+        [{"id": i, "tmag": None if i % 4 == 0 else i} for i in range(20)]
+    )
+    sessionmaker = orm.sessionmaker(bind=engine)
+
+    def lookup(**keyword_filters):
+        rows = query_by_id(
+            range(20),
+            "id",
+            database=sessionmaker(),
+            table=TABLE,
+            **keyword_filters,
+        )
+        return sorted(id_ for id_, in rows)
+
+    assert lookup(tmag__eq=None) == [0, 4, 8, 12, 16]
+    assert lookup(tmag__ne=None) == [i for i in range(20) if i % 4]
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from sqlalchemy import orm
+
+from pyticdb.models import TICEntry
+from pyticdb.scan import key_ranges, scan_table
+
+TABLE = TICEntry.__table__
+
+
+@pytest.fixture
+def sessionmaker(make_catalog):
+    engine = make_catalog(
+        [{"id": i * 3, "tmag": i % 20} for i in range(1, 1001)]
+    )
+    return orm.sessionmaker(bind=engine)
+
+
+def test_key_ranges_cover_keys():
+    ranges = key_ranges(3, 3000, 7)
+
+    keys = [k for lower, upper in ranges for k in range(lower, upper + 1)]
+    assert keys == list(range(3, 3001))
+    assert key_ranges(1, 2, 8) == [(1, 1), (2, 2)]
+    assert key_ranges("a", "z", 4) == [("a", "z")]
+
+
+def test_scan_table_pages_in_key_order(sessionmaker):
+    pages = list(
+        scan_table(
+            "id",
+            "tmag",
+            database=sessionmaker(),
+            table=TABLE,
+            page_size=64,
+            tmag__lt=10,
+        )
+    )
+
+    ids = [row.id for page in pages for row in page]
+    assert all(len(page) <= 64 for page in pages)
+    assert ids == [i * 3 for i in range(1, 1001) if i % 20 < 10]
+
+
+def test_scan_table_workers_select_primary_key(sessionmaker):
+    pages = list(
+        scan_table(
+            "tmag",
+            database=sessionmaker(),
+            table=TABLE,
+            page_size=50,
+            workers=4,
+            output="structured",
+        )
+    )
+
+    scanned = np.concatenate(pages)
+    assert scanned.dtype.names == ("id", "tmag")
+    assert sorted(scanned["id"]) == [i * 3 for i in range(1, 1001)]
@@ -0,0 +1,83 @@
+import sqlalchemy as sa
+
+from pyticdb.models import Base
+from pyticdb.schema import LazyMetaData, SchemaCache
+
+
+def _engine(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def test_schema_cache_roundtrip(tmp_path):
+    engine = _engine(tmp_path)
+    cache = SchemaCache(tmp_path / "cache")
+    metadata = sa.MetaData()
+    metadata.reflect(bind=engine)
+
+    cache.save("tic", engine, metadata, complete=True)
+    loaded = cache.load("tic", engine)
+
+    assert loaded is not None
+    assert set(loaded.tables["ticentries"].c.keys()) == set(
+        metadata.tables["ticentries"].c.keys()
+    )
+    assert cache.load("tic", engine, only=["missing"]) is None
+
+
+def test_schema_cache_detects_schema_change(tmp_path):
+    engine = _engine(tmp_path)
+    cache = SchemaCache(tmp_path / "cache")
+    metadata = sa.MetaData()
+    metadata.reflect(bind=engine)
+    cache.save("tic", engine, metadata, complete=True)
+
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE gaia (id INTEGER PRIMARY KEY)"))
+
+    assert cache.load("tic", engine) is None
+    assert SchemaCache(tmp_path / "cache", ttl=3600).load("tic", engine)
+
+
+def test_schema_cache_detects_column_change(tmp_path):
+    engine = _engine(tmp_path)
+    cache = SchemaCache(tmp_path / "cache")
+    metadata = sa.MetaData()
+    metadata.reflect(bind=engine)
+    cache.save("tic", engine, metadata, complete=True)
+    assert cache.load("tic", engine) is not None
+
+    with engine.begin() as conn:
+        conn.execute(sa.text("ALTER TABLE ticentries ADD COLUMN epoch REAL"))
+
+    assert cache.load("tic", engine) is None
+
+
+def test_schema_cache_invalidate(tmp_path):
+    engine = _engine(tmp_path)
+    cache = SchemaCache(tmp_path / "cache")
+    metadata = sa.MetaData()
+    metadata.reflect(bind=engine)
+    cache.save("tic", engine, metadata, complete=True)
+
+    cache.invalidate("tic")
+
+    assert cache.load("tic", engine) is None
+
+
+def test_lazy_metadata_reflects_on_access(tmp_path):
+    engine = _engine(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE gaia (id INTEGER PRIMARY KEY)"))
+    reflected = []
+    metadata = LazyMetaData(engine, on_reflect=reflected.append)
+
+    assert not metadata.metadata.tables
+    assert metadata.tables["ticentries"].c.id.primary_key
+    assert list(metadata.metadata.tables) == ["ticentries"]
+    assert "missing" not in metadata.tables
+
+    assert sorted(metadata.tables) == ["gaia", "ticentries"]
+    assert metadata.complete
+    assert len(reflected) == 2
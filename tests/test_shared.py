@@ -0,0 +1,82 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+from pyticdb import shared
+from pyticdb.models import TICEntry
+from pyticdb.query import query_by_id
+from pyticdb.shared import SharedArray, share, share_query
+
+TABLE = TICEntry.__table__
+
+
+def _sum_tmag(stars: SharedArray, lower: int) -> float:
+    columns = stars.attach(output="columns")
+    return float(columns["tmag"][columns["id"] >= lower].sum())
+
+
+def test_workers_attach_to_a_shared_query(tic_sessionmaker):
+    with share_query(
+        query_by_id,
+        range(100),
+        "id",
+        "tmag",
+        database=tic_sessionmaker(),
+        table=TABLE,
+    ) as stars:
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            sums = list(pool.map(_sum_tmag, [stars] * 3, [0, 50, 99]))
+        local = stars.attach()
+
+    assert sums == [
+        sum(i / 2 for i in range(lower, 100)) for lower in (0, 50, 99)
+    ]
+    assert len(local) == 100 and not local.flags.writeable
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=stars.name)
+
+
+def test_share_columns_and_rejects_objects():
+    columns = {
+        "id": np.arange(5),
+        "flag": np.array([True, False] * 2 + [True]),
+    }
+
+    with share(columns) as shared:
+        array = shared.attach()
+        assert array["id"].tolist() == [0, 1, 2, 3, 4]
+        assert array["flag"].tolist() == columns["flag"].tolist()
+        with pytest.raises(ValueError):
+            array["id"][0] = 10
+
+    with share({"id": np.arange(0)}) as empty:
+        assert len(empty.attach()) == 0
+    with pytest.raises(ValueError):
+        share({"gaia": np.array(["1", "2"], dtype=object)})
+    with pytest.raises(TypeError):
+        share([(1, 2.0)])
+
+
+def test_share_leaves_no_segment_behind_on_failure(monkeypatch):
+    created = []
+
+    class RecordedSharedMemory(SharedMemory):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self.name)
+
+    monkeypatch.setattr(shared, "SharedMemory", RecordedSharedMemory)
+
+    with pytest.raises(ValueError, match="equally long"):
+        share({"a": np.arange(5), "b": np.arange(3)})
+    assert created == []
+
+    # A two dimensional column cannot be copied into a scalar field
+    with pytest.raises(ValueError):
+        share({"a": np.arange(3), "b": np.zeros((3, 2))})
+    (name,) = created
+    assert name not in shared._SEGMENTS
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=name)
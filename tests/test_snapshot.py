@@ -0,0 +1,61 @@
+import json
+
+import numpy as np
+
+from pyticdb import snapshot
+
+
+def write_snapshot(path, ra, dec, zone_height=1.0):
+    ids = np.arange(len(ra), dtype=np.int64) * 2
+    tmag = np.linspace(5, 15, len(ra))
+    for name, values in {
+        "id": ids,
+        "ra": ra,
+        "dec": dec,
+        "tmag": tmag,
+    }.items():
+        np.save(path / f"{name}.npy", values)
+    order, zone_ra, offsets = snapshot.build_zone_index(ra, dec, zone_height)
+    np.save(path / snapshot.ZONE_ORDER, order)
+    np.save(path / snapshot.ZONE_RA, zone_ra)
+    np.save(path / snapshot.ZONE_OFFSETS, offsets)
+    meta = {
+        "key": "id",
+        "count": len(ra),
+        "columns": ["id", "ra", "dec", "tmag"],
+        "zone_height": zone_height,
+    }
+    (path / snapshot.META_NAME).write_text(json.dumps(meta))
+    return snapshot.Snapshot(path)
+
+
+def test_rows_by_loc_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(0)
+    ra = rng.uniform(0, 360, 5000)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, 5000)))
+    snap = write_snapshot(tmp_path, ra, dec)
+
+    for cone in [(0.1, 0, 5), (359.9, 30, 5), (10, 88, 4), (200, -60, 20)]:
+        expected = np.flatnonzero(
+            snapshot.angular_separation(ra, dec, cone[0], cone[1]) <= cone[2]
+        )
+        np.testing.assert_array_equal(snap.rows_by_loc(*cone), expected)
+
+
+def test_query_by_id_preserves_order_and_filters(tmp_path):
+    snap = write_snapshot(tmp_path, np.arange(10.0), np.zeros(10))
+
+    rows = snap.query_by_id([8, 3, 2, 18], "id", "ra")
+    filtered = snap.query_by_id([8, 2], "id", tmag__gt=7, output="columns")
+
+    assert [tuple(row) for row in rows] == [(8, 4.0), (2, 1.0), (18, 9.0)]
+    assert filtered["id"].tolist() == [8]
+
+
+def test_rows_by_id_accepts_any_iterable(tmp_path):
+    snap = write_snapshot(tmp_path, np.arange(10.0), np.zeros(10))
+
+    assert sorted(snap.rows_by_id({8, 2, 5})) == [1, 4]
+    assert snap.rows_by_id(i for i in (6, 0)).tolist() == [3, 0]
+    assert snap.rows_by_id(np.int64(4)).tolist() == [2]
+    assert snap.query_by_id({4}, "ra") == [(2.0,)]
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from pyticdb import spatial
+from pyticdb.models import TICEntry
+from pyticdb.spatial import crossmatch_statements, nearest_statements
+
+TABLE = TICEntry.__table__
+
+
+def test_crossmatch_statements_chunk_targets():
+    statements = list(
+        crossmatch_statements(
+            range(10), range(10), 0.1, "id", table=TABLE, chunk_size=4
+        )
+    )
+
+    assert len(statements) == 3
+    assert list(statements[0].selected_columns.keys()) == [
+        "target_index",
+        "id",
+    ]
+    assert len(statements[-1].compile().params) == 2 * 4
+
+
+def test_crossmatch_statements_radius_mismatch():
+    with pytest.raises(ValueError):
+        list(crossmatch_statements([1, 2], [3, 4], [0.1], table=TABLE))
+
+
+def test_nearest_statements_limit_per_target():
+    q = next(nearest_statements([1, 2], [3, 4], 0.1, "id", table=TABLE, k=3))
+
+    assert list(q.selected_columns.keys()) == [
+        "target_index",
+        "id",
+        "separation",
+    ]
+    assert "LATERAL" in str(q)
+    assert 3 in q.compile().params.values()
+
+
+def test_nearest_statements_require_positive_k():
+    with pytest.raises(ValueError):
+        list(nearest_statements([1], [3], 0.1, table=TABLE, k=0))
+
+
+@pytest.mark.parametrize(
+    "ra, dec", [(10.5, -3.0), (np.float64(10.5), np.array(-3.0))]
+)
+def test_single_target_crossmatch(monkeypatch, ra, dec):
+    executed = []
+
+    def execute_query(database, q, output):
+        executed.append(q.compile().params)
+        return []
+
+    monkeypatch.setattr(spatial, "execute_query", execute_query)
+    options = {"database": object(), "table": TABLE}
+
+    assert spatial.crossmatch(ra, dec, 0.1, "id", **options) == []
+    assert spatial.crossmatch_nearest(ra, dec, 0.1, "id", **options) == []
+    assert len(executed) == 2
+    for params in executed:
+        assert {0, 10.5, -3.0, 0.1} <= set(params.values())